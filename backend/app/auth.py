@@ -1,28 +1,133 @@
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.session import make_transient_to_detached
+from collections import defaultdict
+from typing import Dict, Optional, Set, Tuple
+import threading
+import time
+from app.database import get_async_db
 from app.models import User
+from app.core import metrics
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.services.sessions import revocation_list
 
 security = HTTPBearer()
 
-def get_current_user(token: str = Depends(security), db: Session = Depends(get_db)):
+class PrincipalCache:
+    """Verified token -> user snapshot cache.
+
+    Entries never outlive the token's `exp` claim and are dropped for a user
+    whenever their profile changes (see `invalidate_principal`). Each entry
+    keeps the token's session id so sign-outs are honoured on a hit.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._tokens = TTLCache(maxsize=maxsize, ttl=ttl, on_evict=self._forget)
+        self._tokens_by_user: Dict[int, Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Tuple[dict, Optional[str]]]:
+        return self._tokens.get(token)
+
+    def set(self, token: str, snapshot: dict, expires_at: float, session_id: Optional[str] = None) -> None:
+        self._tokens.set(token, (snapshot, session_id), ttl=expires_at - time.time())
+        with self._lock:
+            self._tokens_by_user[snapshot["id"]].add(token)
+
+    def drop(self, token: str) -> None:
+        entry = self._tokens.pop(token)
+        if entry is not None:
+            self._forget(token, entry)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            tokens = self._tokens_by_user.pop(user_id, set())
+        for token in tokens:
+            self._tokens.pop(token)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tokens_by_user.clear()
+        self._tokens.clear()
+
+    def stats(self) -> dict:
+        return self._tokens.stats()
+
+    def _forget(self, token: str, entry: tuple) -> None:
+        snapshot = entry[0]
+        with self._lock:
+            tokens = self._tokens_by_user.get(snapshot["id"])
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_by_user[snapshot["id"]]
+
+principal_cache = PrincipalCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+metrics.register("principal_cache", principal_cache.stats)
+
+def invalidate_principal(user_id: int) -> None:
+    """Drop cached principals for a user after their row changes."""
+    principal_cache.invalidate_user(user_id)
+
+def _snapshot_user(user: User) -> dict:
+    return {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+async def _attach_user(db: AsyncSession, snapshot: dict) -> User:
+    # Rebuild the row as if it had been loaded, then attach it to this
+    # request's session without a SELECT so routes can still modify it.
+    user = User()
+    for key, value in snapshot.items():
+        set_committed_value(user, key, value)
+    make_transient_to_detached(user)
+    return await db.merge(user, load=False)
+
+async def get_current_user(token: str = Depends(security), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    cached = principal_cache.get(token.credentials)
+    if cached is not None:
+        snapshot, session_id = cached
+        if session_id is None or not revocation_list.might_be_revoked(session_id):
+            return await _attach_user(db, snapshot)
+
     try:
         payload = jwt.decode(token.credentials, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        if email is None or payload.get("typ") == "refresh":
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
+    session_id = payload.get("sid")
+    if session_id is not None and await revocation_list.is_revoked(db, session_id):
+        principal_cache.drop(token.credentials)
+        raise credentials_exception
+
+    result = await db.execute(select(User).where(User.email == email))
+    user = result.scalars().first()
     if user is None:
         raise credentials_exception
+    if payload.get("exp") is not None:
+        principal_cache.set(token.credentials, _snapshot_user(user), expires_at=payload["exp"], session_id=session_id)
     return user
+
+def is_admin(user: User) -> bool:
+    admins = {email.strip().lower() for email in settings.ADMIN_EMAILS.split(",") if email.strip()}
+    return user.email.lower() in admins
+
+async def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+    """Require a staff principal (an email listed in `ADMIN_EMAILS`)."""
+    if not is_admin(current_user):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Administrator access required")
+    return current_user
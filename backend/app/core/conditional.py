@@ -0,0 +1,93 @@
+"""
+Conditional GET support
+
+Read routes compute validators (an ETag and/or Last-Modified) from cheap
+metadata such as `updated_at` or an index watermark, before loading or
+rendering anything, and call `check_conditional`. When the request's
+`If-None-Match` (or, failing that, `If-Modified-Since`) shows the client
+already holds the current representation, it raises `NotModified`, which
+the handler installed by `install_conditional_get` turns into a bodiless
+304 carrying the same validators and `Cache-Control`.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request, Response
+
+class NotModified(Exception):
+    """The client's cached copy is current; answered with 304."""
+
+    def __init__(self, headers: Dict[str, str]):
+        self.headers = headers
+
+def make_etag(*parts) -> str:
+    """Weak ETag over the given validator parts (ids, timestamps, versions, query)."""
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value covers `etag` (weak comparison)."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+def _as_utc(value: datetime) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        # Naive timestamps in this database are UTC
+        value = value.replace(tzinfo=timezone.utc)
+    # HTTP dates have one-second resolution
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+def _not_modified_since(if_modified_since: Optional[str], last_modified: datetime) -> bool:
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified <= since
+
+def check_conditional(
+    request: Request,
+    response: Optional[Response] = None,
+    etag: Optional[str] = None,
+    last_modified: Optional[datetime] = None,
+    cache_control: str = "no-cache",
+) -> Dict[str, str]:
+    """Attach validators to `response` and raise `NotModified` if the client is current.
+
+    Returns the headers, for routes that build their own Response.
+    """
+    headers = {"Cache-Control": cache_control}
+    if etag is not None:
+        headers["ETag"] = etag
+    if last_modified is not None:
+        last_modified = _as_utc(last_modified)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    if response is not None:
+        response.headers.update(headers)
+
+    if request.method in ("GET", "HEAD"):
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            # If-None-Match takes precedence over If-Modified-Since
+            if etag is not None and etag_matches(if_none_match, etag):
+                raise NotModified(headers)
+        elif last_modified is not None and _not_modified_since(request.headers.get("if-modified-since"), last_modified):
+            raise NotModified(headers)
+    return headers
+
+async def _not_modified_handler(request: Request, exc: NotModified) -> Response:
+    return Response(status_code=304, headers=exc.headers)
+
+def install_conditional_get(app: FastAPI) -> None:
+    """Answer `NotModified` raised by any route with a 304."""
+    app.add_exception_handler(NotModified, _not_modified_handler)
@@ -10,6 +10,18 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS: float = 5.0
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 300
+    # Comma separated emails allowed to use staff-only endpoints (metrics, bulk imports, exports)
+    ADMIN_EMAILS: str = ""
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14
+    REVOCATION_FILTER_CAPACITY: int = 100000
+    REVOCATION_FILTER_ERROR_RATE: float = 0.01
+    REVOCATION_REFRESH_SECONDS: float = 30.0
     
     # CORS - Handle Vercel environment
     ALLOWED_ORIGINS: List[str] = [
@@ -24,9 +36,50 @@ class Settings(BaseSettings):
     # Content
     CONTENT_BASE_URL: str = "http://localhost:8000/static/content"
     MAX_FILE_SIZE: int = 100 * 1024 * 1024  # 100MB
+    CATALOG_REFRESH_SECONDS: float = 5.0
+    RANKING_POPULARITY_REFRESH_SECONDS: float = 60.0
+    SIMILARITY_TOP_K: int = 20
+    SIMILARITY_REFRESH_SECONDS: float = 30.0
+    SIMILARITY_INDEX_PATH: str = "./item_similarity.npz"
+    RECOMMENDATION_CACHE_SIZE: int = 10000
+    RECOMMENDATION_CACHE_TTL_SECONDS: int = 300
+    RECOMMENDATION_STALE_SECONDS: int = 600
+    RECOMMENDATION_CACHE_DEPTH: int = 50
+    
+    # Interaction ingestion (buffered, group-committed writes)
+    # Off on serverless platforms, where a frozen instance would lose the queue
+    INTERACTION_BUFFER_ENABLED: bool = not (os.getenv("VERCEL") or os.getenv("NETLIFY"))
+    INTERACTION_QUEUE_SIZE: int = 10000
+    INTERACTION_BATCH_SIZE: int = 500
+    INTERACTION_FLUSH_INTERVAL_MS: int = 200
+    INTERACTION_ENQUEUE_TIMEOUT_SECONDS: float = 1.0
+    INTERACTION_FLUSH_ATTEMPTS: int = 3
+    INTERACTION_FLUSH_RETRY_SECONDS: float = 0.2
+    
+    # Progress heartbeats (optional write-behind coalescing)
+    PROGRESS_COALESCE_ENABLED: bool = False
+    PROGRESS_FLUSH_INTERVAL_SECONDS: float = 2.0
+    
+    # Daily activity rollups
+    ROLLUP_COMPACT_INTERVAL_SECONDS: float = 30.0
+    
+    # Raw interaction retention (0 keeps everything)
+    INTERACTION_RETENTION_DAYS: int = 0
+    INTERACTION_RETENTION_INTERVAL_SECONDS: float = 6 * 3600
+    
+    # Columnar event store for analytics
+    EVENT_STORE_PATH: str = "./event_store"
+    EVENT_STORE_REFRESH_SECONDS: float = 30.0
+    
+    # Shared response cache (set RESPONSE_CACHE_PATH to share it between workers)
+    RESPONSE_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    RESPONSE_CACHE_TTL_SECONDS: float = 300.0
+    RESPONSE_CACHE_PATH: str = ""
+    RESPONSE_CACHE_DISK_MAX_BYTES: int = 256 * 1024 * 1024
     
     # Assessment
     ASSESSMENT_QUESTIONS_COUNT: int = 10
+    ASSESSMENT_BUNDLE_REFRESH_SECONDS: float = 300.0
     LEARNING_STYLES: List[str] = ["visual", "auditory", "kinesthetic"]
     
     class Config:
@@ -0,0 +1,16 @@
+"""
+Process-local metrics registry
+
+Components register a callable returning a dict of their current
+counters; `/metrics` reports a snapshot of every registered source.
+"""
+
+from typing import Callable, Dict
+
+_sources: Dict[str, Callable[[], dict]] = {}
+
+def register(name: str, source: Callable[[], dict]) -> None:
+    _sources[name] = source
+
+def snapshot() -> Dict[str, dict]:
+    return {name: source() for name, source in _sources.items()}
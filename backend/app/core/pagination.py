@@ -0,0 +1,30 @@
+"""
+Keyset pagination helpers
+"""
+
+import base64
+import bisect
+from typing import List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+def encode_cursor(last_id: int) -> str:
+    """Opaque cursor pointing just past `last_id`."""
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def paginate_ids(sorted_ids: Sequence[int], cursor: Optional[str], limit: int) -> Tuple[List[int], Optional[str]]:
+    """Slice an ascending id sequence after `cursor`; returns the page and the next cursor."""
+    after = decode_cursor(cursor)
+    start = 0 if after is None else bisect.bisect_right(sorted_ids, after)
+    page = list(sorted_ids[start:start + limit])
+    has_more = start + limit < len(sorted_ids)
+    return page, encode_cursor(page[-1]) if has_more and page else None
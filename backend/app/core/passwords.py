@@ -0,0 +1,136 @@
+"""
+Password hashing
+
+Passwords are hashed with bcrypt. Hashing and verifying take tens of
+milliseconds of CPU, so the API runs them on a bounded thread pool (bcrypt
+releases the GIL) instead of the event loop: at most
+`PASSWORD_HASH_MAX_PENDING` operations may be running or queued, and a
+caller that cannot get a slot within `PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS`
+gets `PasswordHashingBusy` (surfaced as 503) instead of piling up.
+
+Accounts created before bcrypt hold unsalted SHA-256 hex digests; those
+still verify, and `needs_rehash` tells login to replace them.
+
+bcrypt is used directly: passlib 1.7.4 cannot read the version of
+bcrypt >= 4.1 and trips over the 72-byte limit enforced by bcrypt 5.
+Passwords are truncated to 72 bytes, as bcrypt always did implicitly.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import bcrypt
+
+from app.core import metrics
+from app.core.config import settings
+
+BCRYPT_MAX_BYTES = 72
+
+# Passwords per pool task for bulk hashing, so logins can interleave
+BULK_TASK_SIZE = 8
+
+class PasswordHashingBusy(Exception):
+    """No hashing slot freed up within the queue timeout."""
+
+def _secret(password: str) -> bytes:
+    return password.encode()[:BCRYPT_MAX_BYTES]
+
+def _is_legacy(hashed_password: str) -> bool:
+    return not hashed_password.startswith("$2")
+
+def get_password_hash(password: str) -> str:
+    """bcrypt hash of `password` (blocking; scripts and the worker pool)."""
+    return bcrypt.hashpw(_secret(password), bcrypt.gensalt(rounds=settings.PASSWORD_BCRYPT_ROUNDS)).decode()
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Check a password against a bcrypt or legacy SHA-256 hash (blocking)."""
+    if _is_legacy(hashed_password):
+        digest = hashlib.sha256(plain_password.encode()).hexdigest()
+        return hmac.compare_digest(digest, hashed_password)
+    try:
+        return bcrypt.checkpw(_secret(plain_password), hashed_password.encode())
+    except ValueError:
+        return False
+
+def needs_rehash(hashed_password: str) -> bool:
+    """Legacy hashes, and bcrypt hashes below the configured cost, are upgraded on login."""
+    if _is_legacy(hashed_password):
+        return True
+    try:
+        return int(hashed_password.split("$")[2]) < settings.PASSWORD_BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+class PasswordHasher:
+    """Runs hashing on a bounded worker pool with a cap on waiting callers."""
+
+    def __init__(self, workers: int, max_pending: int, queue_timeout: float):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = asyncio.Semaphore(max_pending)
+        # Bulk imports leave at least one worker free for logins
+        self._bulk_slots = asyncio.Semaphore(max(1, workers // 2))
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    async def _run(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise PasswordHashingBusy()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            self._slots.release()
+            waited = (time.perf_counter() - started) * 1000
+            self.completed += 1
+            self.total_wait_ms += waited
+            self.max_wait_ms = max(self.max_wait_ms, waited)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        if _is_legacy(hashed_password):
+            # A single SHA-256 is cheap enough for the event loop
+            return verify_password(plain_password, hashed_password)
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        """Hash many passwords in small pool tasks, preserving order."""
+        async def task(chunk: List[str]) -> List[str]:
+            async with self._bulk_slots:
+                return await asyncio.get_running_loop().run_in_executor(
+                    self._pool, lambda: [get_password_hash(password) for password in chunk]
+                )
+
+        chunks = await asyncio.gather(*(
+            task(passwords[i:i + BULK_TASK_SIZE]) for i in range(0, len(passwords), BULK_TASK_SIZE)
+        ))
+        return [hashed for chunk in chunks for hashed in chunk]
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_ms / self.completed, 3) if self.completed else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+        }
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    queue_timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS,
+)
+
+metrics.register("password_hashing", password_hasher.stats)
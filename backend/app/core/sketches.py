@@ -0,0 +1,177 @@
+"""
+Mergeable approximate-aggregate sketches
+
+`HyperLogLog` estimates distinct counts and `KLLSketch` estimates
+quantiles, both in fixed space regardless of how many values were added.
+Two sketches of the same kind merge into one summarizing both inputs, and
+both serialize to compact (zlib-compressed) bytes for storage.
+`BloomFilter` answers set membership with no false negatives.
+"""
+
+import hashlib
+import math
+import random
+import struct
+import zlib
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+def _hash64(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: well-mixed 64-bit hashes of integers."""
+    with np.errstate(over="ignore"):
+        z = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+class HyperLogLog:
+    """Distinct-count sketch over integer ids; ~1.04/sqrt(2**p) relative error."""
+
+    def __init__(self, p: int = 11, registers: Optional[np.ndarray] = None):
+        self.p = p
+        self.registers = registers if registers is not None else np.zeros(1 << p, dtype=np.uint8)
+
+    def add(self, values: Iterable[int]) -> None:
+        values = np.fromiter(values, dtype=np.int64)
+        if not len(values):
+            return
+        hashes = _hash64(values)
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        # Rank = leading zeros + 1 of the next 52 bits (exact in float64)
+        rest = ((hashes << np.uint64(self.p)) >> np.uint64(12)).astype(np.float64)
+        _, exponent = np.frexp(rest)
+        rank = np.where(rest > 0, 53 - exponent, 53).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.p != self.p:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return bytes([self.p]) + zlib.compress(self.registers.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes], p: int = 11) -> "HyperLogLog":
+        if not data:
+            return cls(p)
+        registers = np.frombuffer(zlib.decompress(data[1:]), dtype=np.uint8).copy()
+        return cls(data[0], registers)
+
+class KLLSketch:
+    """Quantile sketch (KLL): items are kept in levels of compactors, an
+    item at level h standing for 2**h inputs. Rank error is ~1.7/k."""
+
+    def __init__(self, k: int = 200):
+        self.k = k
+        self.n = 0
+        self.levels: List[List[float]] = [[]]
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def add(self, values: Iterable[float]) -> None:
+        values = [float(value) for value in values]
+        self.levels[0].extend(values)
+        self.n += len(values)
+        self._compress()
+
+    def merge(self, other: "KLLSketch") -> None:
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self._compress()
+
+    def _compress(self) -> None:
+        while sum(map(len, self.levels)) >= sum(self._capacity(h) for h in range(len(self.levels))):
+            for level, items in enumerate(self.levels):
+                if len(items) < self._capacity(level):
+                    continue
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items.sort()
+                # An odd item out stays behind so weights stay exact
+                keep = [items.pop()] if len(items) % 2 else []
+                self.levels[level + 1].extend(items[random.getrandbits(1)::2])
+                self.levels[level] = keep
+                break
+            else:
+                break
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.n:
+            return None
+        weighted = sorted((value, 1 << level) for level, items in enumerate(self.levels) for value in items)
+        target = q * sum(weight for _, weight in weighted)
+        cumulative = 0
+        for value, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return weighted[-1][0]
+
+    def to_bytes(self) -> bytes:
+        sizes = [len(items) for items in self.levels]
+        header = struct.pack(f"<HQH{len(sizes)}I", self.k, self.n, len(sizes), *sizes)
+        values = np.asarray([value for items in self.levels for value in items], dtype=np.float64)
+        return zlib.compress(header + values.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes], k: int = 200) -> "KLLSketch":
+        if not data:
+            return cls(k)
+        raw = zlib.decompress(data)
+        k, n, depth = struct.unpack_from("<HQH", raw)
+        offset = struct.calcsize("<HQH")
+        sizes = struct.unpack_from(f"<{depth}I", raw, offset)
+        values = np.frombuffer(raw, dtype=np.float64, offset=offset + 4 * depth).tolist()
+        sketch = cls(k)
+        sketch.n = n
+        sketch.levels, start = [], 0
+        for size in sizes:
+            sketch.levels.append(values[start:start + size])
+            start += size
+        return sketch
+
+class BloomFilter:
+    """Set membership over strings in a fixed bit array. `might_contain`
+    never misses an added key; other keys collide with ~`error_rate`."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(64, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    def _positions(self, key: str) -> List[int]:
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = struct.unpack("<QQ", digest)
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def might_contain(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def __contains__(self, key: str) -> bool:
+        return self.might_contain(key)
@@ -0,0 +1,153 @@
+"""
+Incremental record parsing for streamed request bodies
+
+Accepts NDJSON (one object per line), a single JSON array, or CSV with a
+header row, and yields records as soon as they are complete, so the whole
+body is never held in memory.
+"""
+
+import codecs
+import csv
+import json
+import re
+from typing import Any, AsyncIterator, Optional, Tuple
+
+# Largest single record we are willing to buffer while waiting for its end
+MAX_RECORD_BYTES = 1024 * 1024
+
+class RecordError(ValueError):
+    """A record in the stream could not be parsed."""
+
+_decoder = json.JSONDecoder()
+_SEPARATORS = re.compile(r"[\s,]*")
+
+async def iter_json_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (record number, parsed object or RecordError) pairs.
+
+    Record numbers are 1-based line numbers for NDJSON and item positions
+    for a JSON array. A RecordError is yielded in place of an unparseable
+    record; parsing then continues with the next record where possible.
+    """
+    text = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    mode = None  # "ndjson" or "array"
+    number = 0
+    array_done = False
+
+    async def more():
+        async for chunk in chunks:
+            yield text.decode(chunk), False
+        yield text.decode(b"", final=True), True
+
+    async for piece, final in more():
+        buffer += piece
+        if mode is None:
+            stripped = buffer.lstrip()
+            if not stripped:
+                continue
+            if stripped[0] == "[":
+                mode = "array"
+                buffer = stripped[1:]
+            else:
+                mode = "ndjson"
+
+        if mode == "ndjson":
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                number += 1
+                if line.strip():
+                    yield number, _parse_line(line)
+            if len(buffer) > MAX_RECORD_BYTES:
+                number += 1
+                yield number, RecordError("Record too large")
+                buffer = ""
+            continue
+
+        # JSON array: peel off complete values one at a time
+        pos = 0
+        while not array_done:
+            pos = _SEPARATORS.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            if buffer[pos] == "]":
+                array_done = True
+                break
+            try:
+                value, pos = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as exc:
+                if not final and len(buffer) - pos <= MAX_RECORD_BYTES:
+                    break  # most likely an incomplete value; wait for more data
+                number += 1
+                yield number, RecordError(f"Invalid JSON: {exc.msg}")
+                return
+            number += 1
+            yield number, value
+        buffer = "" if array_done else buffer[pos:]
+
+    if mode == "ndjson" and buffer.strip():
+        number += 1
+        yield number, _parse_line(buffer)
+    elif mode == "array" and not array_done:
+        number += 1
+        yield number, RecordError("Unterminated JSON array")
+
+def _parse_line(line: str):
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as exc:
+        return RecordError(f"Invalid JSON: {exc.msg}")
+
+async def iter_csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (line number, row dict or RecordError) pairs from a CSV body.
+
+    The first line is the header. Line numbers count the header, so they
+    match what a spreadsheet shows; quoted fields may span lines.
+    """
+    text = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    record, record_line, line_number = "", 0, 0
+    header = None
+
+    def parse(line: str):
+        nonlocal header
+        values = next(csv.reader([line]), [])
+        if header is None:
+            header = [name.strip() for name in values]
+            return None
+        if not any(value.strip() for value in values):
+            return None
+        if len(values) > len(header):
+            return RecordError(f"Expected {len(header)} columns, got {len(values)}")
+        return dict(zip(header, values))
+
+    async def more():
+        async for chunk in chunks:
+            yield text.decode(chunk)
+        yield text.decode(b"", final=True) + "\n"
+
+    async for piece in more():
+        buffer += piece
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            line_number += 1
+            if not record:
+                record_line = line_number
+            record += line + "\n"
+            if record.count('"') % 2:
+                # Inside a quoted field that continues on the next line
+                if len(record) > MAX_RECORD_BYTES:
+                    yield record_line, RecordError("Record too large")
+                    record = ""
+                continue
+            row = parse(record.rstrip("\r\n"))
+            record = ""
+            if row is not None:
+                yield record_line, row
+    if record.strip():
+        yield record_line, RecordError("Unterminated quoted field")
+
+def iter_request_records(content_type: Optional[str], chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """CSV records for `text/csv` bodies, JSON records (NDJSON or array) otherwise."""
+    if content_type and content_type.split(";")[0].strip().lower() == "text/csv":
+        return iter_csv_records(chunks)
+    return iter_json_records(chunks)
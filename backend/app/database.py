@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
@@ -7,7 +9,20 @@ import os
 # Handle Vercel serverless environment
 DATABASE_URL = os.getenv("DATABASE_URL", settings.DATABASE_URL)
 
+def get_async_database_url(url: str) -> str:
+    """Map a sync database URL onto its async driver (aiosqlite / asyncpg)."""
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+", 1)[0]
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+ASYNC_DATABASE_URL = get_async_database_url(DATABASE_URL)
+
 # Create engine with connection pooling for serverless
+# The sync engine is kept for table creation, scripts and migrations.
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
@@ -15,8 +30,24 @@ engine = create_engine(
     connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
 )
 
+# Async engine used by the API so queries don't block the event loop
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_recycle=300,
+)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# expire_on_commit=False: attributes stay loaded after commit, so response
+# serialization never triggers an implicit (sync) lazy load
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 Base = declarative_base()
 
 def get_db():
@@ -25,3 +56,13 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def dialect_insert(model):
+    """INSERT construct for the configured dialect, supporting ON CONFLICT upserts."""
+    if async_engine.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
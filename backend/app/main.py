@@ -3,14 +3,25 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 from sqlalchemy.orm import Session
 import uvicorn
+import logging
 
 from app.database import get_db, engine
-from app.models import Base
+from app.models import Base, User, ensure_version_columns
 from app.routers import users, assessment, content, analytics
+from app.services.lifecycle import start_background_services, stop_background_services
+from app.services.progress import has_progress_unique_index
+from app.services.assessment import seed_assessment_questions
+from app.auth import get_admin_user
+from app.core import metrics
+from app.core.conditional import install_conditional_get
 from app.core.config import settings
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+ensure_version_columns(engine)
+seed_assessment_questions(engine)
+if not has_progress_unique_index(engine):
+    logging.getLogger(__name__).warning("progress_records is missing its (user, content) unique index; run scripts/init_db.py")
 
 app = FastAPI(
     title="IAEF - Inegben Adaptive EdTech Framework",
@@ -25,14 +36,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag"],
 )
 
+# 304 answers for routes that raise NotModified
+install_conditional_get(app)
+
 # Include routers
 app.include_router(users.router, prefix="/api/v1/users", tags=["users"])
 app.include_router(assessment.router, prefix="/api/v1/assessment", tags=["assessment"])
 app.include_router(content.router, prefix="/api/v1/content", tags=["content"])
 app.include_router(analytics.router, prefix="/api/v1/analytics", tags=["analytics"])
 
+@app.on_event("startup")
+async def startup():
+    await start_background_services()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_background_services()
+
 @app.get("/")
 async def root():
     return {
@@ -45,6 +68,10 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "IAEF Backend"}
 
+@app.get("/metrics")
+async def get_metrics(admin: User = Depends(get_admin_user)):
+    return metrics.snapshot()
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -1,8 +1,28 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, Text, Float, ForeignKey, JSON, Index, LargeBinary
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import func, literal_column
 from app.database import Base
 
+def row_version_column():
+    """Change counter bumped by every UPDATE, so validators move even when
+    two changes land within one timestamp tick."""
+    return Column(Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("version + 1"))
+
+def ensure_version_columns(bind: Engine) -> None:
+    """Add row version counters to tables created before they existed.
+
+    `create_all` never alters existing tables, so this runs right after it
+    at startup; it is a no-op once the columns are there.
+    """
+    for model in (User, Content):
+        table = model.__tablename__
+        if "version" in {column["name"] for column in inspect(bind).get_columns(table)}:
+            continue
+        with bind.begin() as connection:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
 class User(Base):
     __tablename__ = "users"
     
@@ -13,6 +33,7 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    version = row_version_column()
     
     # Learning profile
     learning_style = Column(String, default=None)  # visual, auditory, kinesthetic
@@ -23,6 +44,18 @@ class User(Base):
     progress_records = relationship("ProgressRecord", back_populates="user")
     content_interactions = relationship("ContentInteraction", back_populates="user")
 
+class RefreshToken(Base):
+    """One issued refresh token; tokens of a sign-in share a `session_id`."""
+    __tablename__ = "refresh_tokens"
+    
+    jti = Column(String, primary_key=True)
+    session_id = Column(String, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    issued_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    used_at = Column(DateTime(timezone=True), nullable=True)  # rotated into a newer token
+    revoked_at = Column(DateTime(timezone=True), nullable=True, index=True)  # session signed out
+
 class AssessmentQuestion(Base):
     __tablename__ = "assessment_questions"
     
@@ -57,6 +90,7 @@ class Content(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    version = row_version_column()
     
     # Relationships
     progress_records = relationship("ProgressRecord", back_populates="content")
@@ -64,6 +98,10 @@ class Content(Base):
 
 class ProgressRecord(Base):
     __tablename__ = "progress_records"
+    __table_args__ = (
+        # One row per user and content; progress writes upsert against it
+        Index("ux_progress_user_content", "user_id", "content_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -103,3 +141,108 @@ class ContentInteraction(Base):
     # Relationships
     user = relationship("User", back_populates="content_interactions")
     content = relationship("Content", back_populates="content_interactions")
+
+class ContentFormatCount(Base):
+    """Materialized interaction count per (user, content, format)."""
+    __tablename__ = "content_format_counts"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    content_id = Column(Integer, ForeignKey("content.id"), primary_key=True)
+    format_used = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class UserFormatCount(Base):
+    """Materialized interaction count per (user, format) across all content."""
+    __tablename__ = "user_format_counts"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    format_used = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class UserDailyActivity(Base):
+    """Per-user daily rollup of progress and interaction activity."""
+    __tablename__ = "user_daily_activity"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    activities = Column(Integer, nullable=False, default=0)  # content items progressed that day
+    minutes = Column(Integer, nullable=False, default=0)
+    completions = Column(Integer, nullable=False, default=0)
+    completion_sum = Column(Float, nullable=False, default=0.0)  # latest completion % per item that day
+    interactions = Column(Integer, nullable=False, default=0)
+    video_interactions = Column(Integer, nullable=False, default=0)
+    audio_interactions = Column(Integer, nullable=False, default=0)
+    text_interactions = Column(Integer, nullable=False, default=0)
+    interactive_interactions = Column(Integer, nullable=False, default=0)
+
+class ContentDailyActivity(Base):
+    """Per-content daily rollup of progress and interaction activity."""
+    __tablename__ = "content_daily_activity"
+    
+    content_id = Column(Integer, ForeignKey("content.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    activities = Column(Integer, nullable=False, default=0)  # learners progressing that day
+    minutes = Column(Integer, nullable=False, default=0)
+    completions = Column(Integer, nullable=False, default=0)
+    completion_sum = Column(Float, nullable=False, default=0.0)
+    interactions = Column(Integer, nullable=False, default=0)
+    video_interactions = Column(Integer, nullable=False, default=0)
+    audio_interactions = Column(Integer, nullable=False, default=0)
+    text_interactions = Column(Integer, nullable=False, default=0)
+    interactive_interactions = Column(Integer, nullable=False, default=0)
+
+class ProgressRollupSnapshot(Base):
+    """Last progress state folded into the daily rollups, per (user, content)."""
+    __tablename__ = "progress_rollup_snapshots"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    content_id = Column(Integer, ForeignKey("content.id"), primary_key=True)
+    day = Column(Date, nullable=False)
+    completion_percentage = Column(Float, nullable=False, default=0.0)
+    time_spent_minutes = Column(Integer, nullable=False, default=0)
+    is_completed = Column(Boolean, nullable=False, default=False)
+    quiz_score = Column(Float, nullable=True)
+
+class InteractionMonthlySummary(Base):
+    """Raw interactions past the retention horizon, compacted per month."""
+    __tablename__ = "interaction_monthly_summaries"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    content_id = Column(Integer, ForeignKey("content.id"), primary_key=True)
+    month = Column(Date, primary_key=True)  # first day of the month
+    format_used = Column(String, primary_key=True)
+    interaction_type = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    duration_seconds = Column(Integer, nullable=False, default=0)
+
+class ContentSketch(Base):
+    """Serialized approximate aggregates per content (see app.core.sketches)."""
+    __tablename__ = "content_sketches"
+    
+    content_id = Column(Integer, ForeignKey("content.id"), primary_key=True)
+    learners = Column(LargeBinary, nullable=True)  # HyperLogLog of user ids
+    quiz_scores = Column(LargeBinary, nullable=True)  # KLL of submitted quiz scores
+    completion_minutes = Column(LargeBinary, nullable=True)  # KLL of time spent when completed
+
+class ContentDailySketch(Base):
+    """Per-content daily HyperLogLog of learners."""
+    __tablename__ = "content_daily_sketches"
+    
+    content_id = Column(Integer, ForeignKey("content.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    learners = Column(LargeBinary, nullable=False)
+
+class RollupWatermark(Base):
+    """How far each source table has been folded into the rollups."""
+    __tablename__ = "rollup_watermarks"
+    
+    name = Column(String, primary_key=True)
+    last_id = Column(Integer, nullable=True)
+    last_changed_at = Column(DateTime(timezone=True), nullable=True)
+
+class RollupPendingId(Base):
+    """Source ids below a rollup watermark that had not committed when it advanced."""
+    __tablename__ = "rollup_pending_ids"
+    
+    name = Column(String, primary_key=True)
+    source_id = Column(Integer, primary_key=True)
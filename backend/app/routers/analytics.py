@@ -1,79 +1,91 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from typing import List, Dict, Any
-from datetime import datetime, timedelta
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import select, func, case, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, Any, Optional
+from datetime import date, datetime, timedelta
 
-from app.database import get_db
-from app.models import User, Content, ProgressRecord, ContentInteraction
+from app.database import get_async_db
+from app.models import (
+    User, Content, ProgressRecord, ContentInteraction, UserDailyActivity, ContentDailyActivity,
+    InteractionMonthlySummary
+)
 from app.schemas import UserAnalytics, ContentAnalytics
-from app.auth import get_current_user
+from app.auth import get_current_user, get_admin_user, is_admin
+from app.core.conditional import check_conditional, make_etag
+from app.services.format_counts import get_user_format_counts
+from app.services.rollups import FORMAT_COUNTERS
+from app.services.export import DATASETS, EXPORT_FORMATS, stream_export
+from app.services.columnar import event_store, GROUP_KEYS
+from app.services.content_sketches import get_content_sketch_summary, get_daily_unique_learners
+from app.services.response_cache import response_cache
+from app.services.catalog import catalog_index
 
 router = APIRouter()
 
+async def _progress_totals(db: AsyncSession, user_id: int):
+    """Overall progress figures for a user from one scan of their progress rows."""
+    return (await db.execute(select(
+        func.coalesce(func.sum(ProgressRecord.time_spent_minutes), 0).label('time_spent'),
+        func.count(case((ProgressRecord.is_completed == True, 1))).label('completed'),
+        func.count(case((
+            (ProgressRecord.is_completed == False) & (ProgressRecord.completion_percentage > 0), 1
+        ))).label('in_progress'),
+        func.avg(ProgressRecord.engagement_score).label('avg_engagement')
+    ).where(
+        ProgressRecord.user_id == user_id
+    ))).one()
+
+async def _daily_activity(db: AsyncSession, model, owner_column, owner_id: int, days: int, newest_first: bool = False):
+    """Daily rollup rows for the last `days` days (only days with activity have rows).
+
+    Reads what the background compactor has folded so far; requests never compact.
+    """
+    since = (datetime.utcnow() - timedelta(days=days)).date()
+    order = desc(model.day) if newest_first else model.day
+    return (await db.scalars(select(model).where(
+        owner_column == owner_id,
+        model.day >= since
+    ).order_by(order))).all()
+
 @router.get("/user/{user_id}", response_model=UserAnalytics)
 async def get_user_analytics(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get comprehensive analytics for a specific user."""
-    user = db.query(User).filter(User.id == user_id).first()
+    """Get comprehensive analytics for a specific user.
+    
+    `progress_trend` comes from the daily rollups, which trail writes by up
+    to `ROLLUP_COMPACT_INTERVAL_SECONDS` (30s by default).
+    """
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Calculate total time spent
-    total_time = db.query(func.sum(ProgressRecord.time_spent_minutes)).filter(
-        ProgressRecord.user_id == user_id
-    ).scalar() or 0
-    
-    # Count completed content
-    completed_content = db.query(func.count(ProgressRecord.id)).filter(
-        ProgressRecord.user_id == user_id,
-        ProgressRecord.is_completed == True
-    ).scalar() or 0
+    totals = await _progress_totals(db, user_id)
     
-    # Calculate average engagement
-    avg_engagement = db.query(func.avg(ProgressRecord.engagement_score)).filter(
-        ProgressRecord.user_id == user_id
-    ).scalar() or 0.0
-    
-    # Get preferred format from interactions
-    format_preferences = db.query(
-        ContentInteraction.format_used,
-        func.count(ContentInteraction.id).label('count')
-    ).filter(
-        ContentInteraction.user_id == user_id
-    ).group_by(ContentInteraction.format_used).all()
-    
-    preferred_format = "video"  # default
-    if format_preferences:
-        preferred_format = max(format_preferences, key=lambda x: x.count).format_used
-    
-    # Get progress trend (last 30 days)
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    progress_trend = db.query(
-        func.date(ProgressRecord.updated_at).label('date'),
-        func.count(ProgressRecord.id).label('activities'),
-        func.avg(ProgressRecord.completion_percentage).label('avg_completion')
-    ).filter(
-        ProgressRecord.user_id == user_id,
-        ProgressRecord.updated_at >= thirty_days_ago
-    ).group_by(func.date(ProgressRecord.updated_at)).order_by('date').all()
+    # Preferred format from the materialized per-user counters
+    format_counts = await get_user_format_counts(db, user_id)
+    preferred_format = max(format_counts, key=format_counts.get) if format_counts else "video"
     
+    # Progress trend (last 30 days) from the daily rollups
+    trend = await _daily_activity(db, UserDailyActivity, UserDailyActivity.user_id, user_id, days=30)
     trend_data = [
         {
-            "date": str(record.date),
-            "activities": record.activities,
-            "avg_completion": float(record.avg_completion or 0)
+            "date": str(day.day),
+            "activities": day.activities,
+            "avg_completion": day.completion_sum / day.activities if day.activities else 0.0
         }
-        for record in progress_trend
+        for day in trend if day.activities
     ]
     
     return UserAnalytics(
         user_id=user_id,
-        total_time_spent=total_time,
-        content_completed=completed_content,
-        average_engagement=float(avg_engagement),
+        total_time_spent=totals.time_spent,
+        content_completed=totals.completed,
+        average_engagement=float(totals.avg_engagement or 0.0),
         preferred_format=preferred_format,
         learning_style=user.learning_style or "unknown",
         progress_trend=trend_data
@@ -82,60 +94,77 @@ async def get_user_analytics(
 @router.get("/content/{content_id}", response_model=ContentAnalytics)
 async def get_content_analytics(
     content_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get comprehensive analytics for specific content."""
-    content = db.query(Content).filter(Content.id == content_id).first()
-    if not content:
-        raise HTTPException(status_code=404, detail="Content not found")
+    """Get comprehensive analytics for specific content.
     
-    # Count total views
-    total_views = db.query(func.count(ContentInteraction.id)).filter(
-        ContentInteraction.content_id == content_id,
-        ContentInteraction.interaction_type == "view"
-    ).scalar() or 0
+    `unique_learners` and the percentiles come from the per-content
+    sketches, which trail writes by up to `ROLLUP_COMPACT_INTERVAL_SECONDS`
+    (30s by default).
     
-    # Calculate completion rate
-    total_started = db.query(func.count(ProgressRecord.id)).filter(
-        ProgressRecord.content_id == content_id
-    ).scalar() or 0
-    
-    total_completed = db.query(func.count(ProgressRecord.id)).filter(
-        ProgressRecord.content_id == content_id,
-        ProgressRecord.is_completed == True
-    ).scalar() or 0
+    Served from the shared response cache until the content, or activity
+    on it, changes. Content edits reach the cache through the catalog
+    index, so catch it up first.
+    """
+    await catalog_index.refresh(db)
     
-    completion_rate = (total_completed / total_started * 100) if total_started > 0 else 0
+    async def build():
+        return JSONResponse(content=jsonable_encoder(await _content_analytics(db, content_id)))
     
-    # Calculate average engagement
-    avg_engagement = db.query(func.avg(ProgressRecord.engagement_score)).filter(
-        ProgressRecord.content_id == content_id
-    ).scalar() or 0.0
+    return await response_cache.get_or_build(
+        f"content-analytics:{content_id}",
+        [f"content:{content_id}", f"content-activity:{content_id}"],
+        build
+    )
+
+async def _content_analytics(db: AsyncSession, content_id: int) -> ContentAnalytics:
+    content = await db.get(Content, content_id)
+    if not content:
+        raise HTTPException(status_code=404, detail="Content not found")
     
-    # Get format preferences
-    format_preferences = db.query(
+    # Views and format preferences in one pass over interactions
+    formats = (await db.execute(select(
         ContentInteraction.format_used,
-        func.count(ContentInteraction.id).label('count')
-    ).filter(
+        func.count(ContentInteraction.id).label('count'),
+        func.count(case((ContentInteraction.interaction_type == "view", 1))).label('views')
+    ).where(
         ContentInteraction.content_id == content_id
-    ).group_by(ContentInteraction.format_used).all()
+    ).group_by(ContentInteraction.format_used))).all()
+    # Plus history compacted out of the raw table by the retention job
+    archived = (await db.execute(select(
+        InteractionMonthlySummary.format_used,
+        func.sum(InteractionMonthlySummary.count).label('count'),
+        func.sum(case((
+            InteractionMonthlySummary.interaction_type == "view", InteractionMonthlySummary.count
+        ), else_=0)).label('views')
+    ).where(
+        InteractionMonthlySummary.content_id == content_id
+    ).group_by(InteractionMonthlySummary.format_used))).all()
     
-    format_prefs = {fp.format_used: fp.count for fp in format_preferences}
+    total_views = sum(fp.views for fp in formats) + sum(int(fp.views) for fp in archived)
+    format_prefs = {fp.format_used: fp.count for fp in formats}
+    for fp in archived:
+        format_prefs[fp.format_used] = format_prefs.get(fp.format_used, 0) + int(fp.count)
     
-    # Get user feedback (quiz scores)
-    quiz_scores = db.query(ProgressRecord.quiz_score).filter(
-        ProgressRecord.content_id == content_id,
-        ProgressRecord.quiz_score.isnot(None)
-    ).all()
+    # Completion, engagement and quiz figures in one pass over progress records
+    progress = (await db.execute(select(
+        func.count(ProgressRecord.id).label('started'),
+        func.count(case((ProgressRecord.is_completed == True, 1))).label('completed'),
+        func.avg(ProgressRecord.engagement_score).label('avg_engagement'),
+        func.avg(ProgressRecord.quiz_score).label('avg_quiz_score'),
+        func.count(ProgressRecord.quiz_score).label('quiz_attempts')
+    ).where(
+        ProgressRecord.content_id == content_id
+    ))).one()
+    
+    completion_rate = (progress.completed / progress.started * 100) if progress.started > 0 else 0
     
-    avg_quiz_score = 0
-    if quiz_scores:
-        scores = [score[0] for score in quiz_scores if score[0] is not None]
-        avg_quiz_score = sum(scores) / len(scores) if scores else 0
+    # Distinct learners and percentiles from the sketches
+    sketch = await get_content_sketch_summary(db, content_id)
     
     feedback_data = {
-        "average_quiz_score": avg_quiz_score,
-        "total_quiz_attempts": len(quiz_scores),
+        "average_quiz_score": float(progress.avg_quiz_score) if progress.avg_quiz_score is not None else 0,
+        "total_quiz_attempts": progress.quiz_attempts,
         "completion_rate": completion_rate
     }
     
@@ -143,93 +172,198 @@ async def get_content_analytics(
         content_id=content_id,
         total_views=total_views,
         completion_rate=completion_rate,
-        average_engagement=float(avg_engagement),
+        average_engagement=float(progress.avg_engagement or 0.0),
         format_preferences=format_prefs,
-        user_feedback=feedback_data
+        user_feedback=feedback_data,
+        **sketch
     )
 
+@router.get("/content/{content_id}/trend")
+async def get_content_trend(
+    content_id: int,
+    days: int = Query(30, ge=1, le=365, description="Number of days"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get daily activity for specific content from the daily rollups.
+    
+    Rollups and sketches trail writes by up to `ROLLUP_COMPACT_INTERVAL_SECONDS`
+    (30s by default).
+    """
+    content = await db.get(Content, content_id)
+    if not content:
+        raise HTTPException(status_code=404, detail="Content not found")
+    
+    trend = await _daily_activity(db, ContentDailyActivity, ContentDailyActivity.content_id, content_id, days=days)
+    unique_learners = await get_daily_unique_learners(db, content_id, trend[0].day) if trend else {}
+    return {
+        "content_id": content_id,
+        "trend": [
+            {
+                "date": str(day.day),
+                "learners": day.activities,
+                "unique_learners": unique_learners.get(day.day, 0),
+                "minutes": day.minutes,
+                "completions": day.completions,
+                "avg_completion": day.completion_sum / day.activities if day.activities else 0.0,
+                "interactions": day.interactions,
+                "format_usage": {
+                    fmt: getattr(day, column) for fmt, column in FORMAT_COUNTERS.items() if getattr(day, column)
+                }
+            }
+            for day in trend
+        ]
+    }
+
 @router.get("/dashboard/overview")
 async def get_dashboard_overview(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get overview analytics for the current user's dashboard."""
+    """Get overview analytics for the current user's dashboard.
+    
+    `recent_activity` comes from the daily rollups, which trail writes by up
+    to `ROLLUP_COMPACT_INTERVAL_SECONDS` (30s by default).
+    """
     user_id = current_user.id
     
     # Basic stats
-    total_time = db.query(func.sum(ProgressRecord.time_spent_minutes)).filter(
-        ProgressRecord.user_id == user_id
-    ).scalar() or 0
-    
-    completed_content = db.query(func.count(ProgressRecord.id)).filter(
-        ProgressRecord.user_id == user_id,
-        ProgressRecord.is_completed == True
-    ).scalar() or 0
-    
-    in_progress = db.query(func.count(ProgressRecord.id)).filter(
-        ProgressRecord.user_id == user_id,
-        ProgressRecord.is_completed == False,
-        ProgressRecord.completion_percentage > 0
-    ).scalar() or 0
-    
-    # Recent activity (last 7 days)
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    recent_activity = db.query(
-        func.date(ProgressRecord.updated_at).label('date'),
-        func.count(ProgressRecord.id).label('activities')
-    ).filter(
-        ProgressRecord.user_id == user_id,
-        ProgressRecord.updated_at >= seven_days_ago
-    ).group_by(func.date(ProgressRecord.updated_at)).order_by(desc('date')).limit(7).all()
+    totals = await _progress_totals(db, user_id)
+    
+    # Recent activity (last 7 days) from the daily rollups
+    recent_activity = await _daily_activity(
+        db, UserDailyActivity, UserDailyActivity.user_id, user_id, days=7, newest_first=True
+    )
     
     # Learning style distribution (if user has completed assessment)
     learning_style = current_user.learning_style
     
     # Format usage statistics
-    format_usage = db.query(
-        ContentInteraction.format_used,
-        func.count(ContentInteraction.id).label('count')
-    ).filter(
-        ContentInteraction.user_id == user_id
-    ).group_by(ContentInteraction.format_used).all()
-    
-    format_stats = {fu.format_used: fu.count for fu in format_usage}
+    format_stats = await get_user_format_counts(db, user_id)
     
     return {
         "user_id": user_id,
         "learning_style": learning_style,
-        "total_time_minutes": total_time,
-        "content_completed": completed_content,
-        "content_in_progress": in_progress,
+        "total_time_minutes": totals.time_spent,
+        "content_completed": totals.completed,
+        "content_in_progress": totals.in_progress,
         "recent_activity": [
             {
-                "date": str(activity.date),
+                "date": str(activity.day),
                 "activities": activity.activities
             }
-            for activity in recent_activity
-        ],
+            for activity in recent_activity if activity.activities
+        ][:7],
         "format_usage": format_stats,
         "assessment_completed": current_user.assessment_completed
     }
 
-@router.get("/learning-styles/distribution")
-async def get_learning_style_distribution(db: Session = Depends(get_db)):
-    """Get distribution of learning styles across all users."""
-    distribution = db.query(
-        User.learning_style,
-        func.count(User.id).label('count')
-    ).filter(
-        User.learning_style.isnot(None),
-        User.assessment_completed == True
-    ).group_by(User.learning_style).all()
+@router.get("/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = Query("ndjson", description="csv or ndjson"),
+    gzip: bool = Query(False, description="Gzip the stream"),
+    user_id: Optional[int] = Query(None, description="Only this user's rows"),
+    since: Optional[datetime] = Query(None, description="Rows at or after this time"),
+    until: Optional[datetime] = Query(None, description="Rows before this time"),
+    admin: User = Depends(get_admin_user)
+):
+    """Stream a full dump of interactions or progress records. Staff only.
+    
+    Rows are read with a server-side cursor and encoded batch by batch, so
+    memory use does not grow with the export size.
+    """
+    if dataset not in DATASETS:
+        raise HTTPException(status_code=404, detail="Unknown dataset")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Format must be csv or ndjson")
     
+    filename = f"{dataset}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream_export(dataset, format, gzip, user_id, since, until),
+        media_type="application/gzip" if gzip else EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/events/summary")
+async def get_event_summary(
+    group_by: List[str] = Query([], description="Any of: " + ", ".join(GROUP_KEYS)),
+    format_used: List[str] = Query([]),
+    interaction_type: List[str] = Query([]),
+    difficulty_level: List[str] = Query([]),
+    subject: List[str] = Query([]),
+    learning_style: List[str] = Query([]),
+    user_id: List[int] = Query([]),
+    content_id: List[int] = Query([]),
+    since: Optional[date] = Query(None, description="First day (inclusive)"),
+    until: Optional[date] = Query(None, description="Last day (exclusive)"),
+    current_user: User = Depends(get_current_user)
+):
+    """Interaction counts, learners and durations grouped by any event dimension.
+    
+    Served from the columnar event store, not the primary database. Staff
+    see every learner's events; everyone else only their own.
+    """
+    unknown = [key for key in group_by if key not in GROUP_KEYS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot group by: {', '.join(unknown)}")
+    if not is_admin(current_user):
+        if any(requested != current_user.id for requested in user_id):
+            raise HTTPException(status_code=403, detail="Not allowed to read other users' events")
+        user_id = [current_user.id]
+    
+    await event_store.refresh()
+    filters = {
+        "format_used": format_used,
+        "interaction_type": interaction_type,
+        "difficulty_level": difficulty_level,
+        "subject": subject,
+        "learning_style": learning_style,
+        "user_id": user_id,
+        "content_id": content_id
+    }
+    rows = await asyncio.to_thread(event_store.query, group_by, filters, since, until)
     return {
-        "distribution": [
-            {
-                "learning_style": dist.learning_style,
-                "count": dist.count
-            }
-            for dist in distribution
-        ],
-        "total_assessed_users": sum(dist.count for dist in distribution)
+        "group_by": group_by,
+        "rows": rows,
+        "events_through_id": event_store.last_id
     }
+
+@router.get("/learning-styles/distribution")
+async def get_learning_style_distribution(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get distribution of learning styles across all users.
+    
+    Revalidated from the generation of the `users` cache tag, which every
+    write to learning styles bumps, so a 304 costs no query.
+    """
+    validators = check_conditional(
+        request,
+        etag=make_etag("learning-styles", *await response_cache.tag_validator("users")),
+        cache_control="public, max-age=60"
+    )
+    
+    async def build():
+        distribution = (await db.execute(select(
+            User.learning_style,
+            func.count(User.id).label('count')
+        ).where(
+            User.learning_style.isnot(None),
+            User.assessment_completed == True
+        ).group_by(User.learning_style))).all()
+        
+        return JSONResponse(content={
+            "distribution": [
+                {
+                    "learning_style": dist.learning_style,
+                    "count": dist.count
+                }
+                for dist in distribution
+            ],
+            "total_assessed_users": sum(dist.count for dist in distribution)
+        })
+    
+    cached = await response_cache.get_or_build(f"learning-styles:{validators['ETag']}", ["users"], build)
+    cached.headers.update(validators)
+    return cached
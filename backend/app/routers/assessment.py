@@ -1,105 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
-from app.database import get_db
-from app.models import User, AssessmentQuestion
-from app.schemas import AssessmentQuestion as AssessmentQuestionSchema, AssessmentSubmission, AssessmentResult
-from app.auth import get_current_user
+from app.database import get_async_db
+from app.models import User
+from app.schemas import AssessmentQuestion as AssessmentQuestionSchema, AssessmentSubmission, AssessmentResult, BulkImportResult
+from app.auth import get_current_user, get_admin_user, invalidate_principal
+from app.services.recommendations import invalidate_recommendations
+from app.services.assessment import question_cache
+from app.services.roster import import_answer_sheets
+from app.services.response_cache import invalidate_on_commit
+from app.core.streaming import iter_request_records
+from app.core.conditional import check_conditional
 
 router = APIRouter()
 
-# Pre-defined assessment questions based on the specification
-ASSESSMENT_QUESTIONS = [
-    {
-        "question_text": "When learning a new software, you prefer to:",
-        "visual_answer": "Watch a video tutorial.",
-        "auditory_answer": "Listen to a podcast explaining the features.",
-        "kinesthetic_answer": "Click around and try to figure it out yourself."
-    },
-    {
-        "question_text": "When you get directions to a new place, you're most likely to remember them by:",
-        "visual_answer": "Picturing a map in your head.",
-        "auditory_answer": "Hearing the directions repeated to you.",
-        "kinesthetic_answer": "Driving there once to get a feel for the route."
-    },
-    {
-        "question_text": "You're trying to learn a new song. You will:",
-        "visual_answer": "Read the sheet music.",
-        "auditory_answer": "Listen to the song repeatedly.",
-        "kinesthetic_answer": "Play the tune on an instrument."
-    },
-    {
-        "question_text": "When you read, you often find yourself:",
-        "visual_answer": "Picturing the scenes in your mind.",
-        "auditory_answer": "Reading out loud or mouthing the words.",
-        "kinesthetic_answer": "Pacing or fidgeting to stay engaged."
-    },
-    {
-        "question_text": "When a teacher or speaker presents a new idea, you're most engaged by:",
-        "visual_answer": "Diagrams, charts, and slides.",
-        "auditory_answer": "A clear, spoken explanation.",
-        "kinesthetic_answer": "Hands-on examples or group activities."
-    },
-    {
-        "question_text": "To remember a grocery list, you would:",
-        "visual_answer": "Visualize the items in your cart.",
-        "auditory_answer": "Repeat the list to yourself.",
-        "kinesthetic_answer": "Write it down."
-    },
-    {
-        "question_text": "When explaining something, you tend to:",
-        "visual_answer": "Draw a picture or a diagram.",
-        "auditory_answer": "Talk through the steps.",
-        "kinesthetic_answer": "Use your hands and body language."
-    },
-    {
-        "question_text": "In a classroom, you prefer to sit:",
-        "visual_answer": "Where you can clearly see the board and the instructor's gestures.",
-        "auditory_answer": "Anywhere you can hear well, even if you can't see the board.",
-        "kinesthetic_answer": "Where you can stand up or move around if needed."
-    },
-    {
-        "question_text": "Your favorite way to learn a new skill is by:",
-        "visual_answer": "Watching an expert perform it.",
-        "auditory_answer": "Being given detailed verbal instructions.",
-        "kinesthetic_answer": "Trying it out yourself with tools or materials."
-    },
-    {
-        "question_text": "When doing research, you prefer to get your information from:",
-        "visual_answer": "Infographics or well-designed websites.",
-        "auditory_answer": "Podcasts or radio documentaries.",
-        "kinesthetic_answer": "Interactive simulations or hands-on tutorials."
-    }
-]
-
 @router.get("/questions", response_model=List[AssessmentQuestionSchema])
-async def get_assessment_questions(db: Session = Depends(get_db)):
+async def get_assessment_questions(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Get all assessment questions for the learning style assessment."""
-    # Check if questions exist in database, if not create them
-    existing_questions = db.query(AssessmentQuestion).count()
-    if existing_questions == 0:
-        # Create questions in database
-        for i, question_data in enumerate(ASSESSMENT_QUESTIONS):
-            db_question = AssessmentQuestion(
-                id=i + 1,
-                question_text=question_data["question_text"],
-                visual_answer=question_data["visual_answer"],
-                auditory_answer=question_data["auditory_answer"],
-                kinesthetic_answer=question_data["kinesthetic_answer"]
-            )
-            db.add(db_question)
-        db.commit()
-    
-    # Return questions from database
-    questions = db.query(AssessmentQuestion).filter(AssessmentQuestion.is_active == True).all()
-    return questions
+    bundle = await question_cache.get(db)
+    headers = check_conditional(
+        request,
+        etag=bundle.etag,
+        cache_control=f"public, max-age={int(question_cache.refresh_interval)}"
+    )
+    return Response(content=bundle.body, media_type="application/json", headers=headers)
 
 @router.post("/submit", response_model=AssessmentResult)
 async def submit_assessment(
     submission: AssessmentSubmission,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Submit assessment answers and calculate learning style."""
     if len(submission.answers) != 10:
@@ -127,7 +58,10 @@ async def submit_assessment(
     current_user.assessment_completed = True
     current_user.assessment_score = scores
     
-    db.commit()
+    invalidate_on_commit(db, "users")
+    await db.commit()
+    invalidate_principal(current_user.id)
+    invalidate_recommendations(current_user.id)
     
     return AssessmentResult(
         learning_style=learning_style,
@@ -135,10 +69,26 @@ async def submit_assessment(
         confidence=confidence
     )
 
+@router.post("/bulk", response_model=BulkImportResult)
+async def bulk_submit_assessments(
+    request: Request,
+    admin: User = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Score answer sheets from paper sessions in bulk. Staff only.
+    
+    Each record names the learner (`user_id` or `email`) and gives their
+    `answers` in question order; CSV bodies (`text/csv`) put the answers in
+    one cell separated by `;`. All sheets are scored together and stored
+    with one bulk update.
+    """
+    records = iter_request_records(request.headers.get("content-type"), request.stream())
+    return await import_answer_sheets(db, records)
+
 @router.get("/result", response_model=AssessmentResult)
 async def get_assessment_result(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get the current user's assessment result."""
     if not current_user.assessment_completed:
@@ -162,13 +112,16 @@ async def get_assessment_result(
 @router.post("/reset")
 async def reset_assessment(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Reset the user's assessment to allow retaking."""
     current_user.learning_style = None
     current_user.assessment_completed = False
     current_user.assessment_score = None
     
-    db.commit()
+    invalidate_on_commit(db, "users")
+    await db.commit()
+    invalidate_principal(current_user.id)
+    invalidate_recommendations(current_user.id)
     
     return {"message": "Assessment reset successfully"}
@@ -1,163 +1,323 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, func
+from sqlalchemy.orm import defer
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+from datetime import datetime, timezone
 
-from app.database import get_db
+from app.database import get_async_db
 from app.models import User, Content, ProgressRecord, ContentInteraction
-from app.schemas import Content as ContentSchema, AdaptiveContentResponse, ProgressUpdate, InteractionCreate
+from app.schemas import Content as ContentSchema, ContentSummary, ContentSearchHit, AdaptiveContentResponse, AdaptiveBatchRequest, MAX_ADAPTIVE_BATCH, ProgressUpdate, InteractionCreate, BulkImportResult
 from app.auth import get_current_user
+from app.core.config import settings
+from app.core.pagination import paginate_ids
+from app.core.streaming import iter_json_records
+from app.core.conditional import check_conditional, make_etag
+from app.services.catalog import catalog_index
+from app.services.search import search_index
+from app.services.format_counts import get_content_format_counts, get_format_counts_for_contents, increment_format_counts
+from app.services.adaptive import decide_format, decide_for_contents
+from app.services.similarity import item_similarity
+from app.services.recommendations import recommendation_cache, invalidate_recommendations
+from app.services.progress import progress_coalescer, is_heartbeat, upsert_progress
+from app.services.ingestion import interaction_ingestor, ingest_interaction_stream, IngestionBackpressure
+from app.services.response_cache import response_cache
 
 router = APIRouter()
 
-@router.get("/", response_model=List[ContentSchema])
+# Fields a client may request through the sparse `fields=` projection
+SUMMARY_FIELDS = list(ContentSummary.model_fields)
+
+def parse_content_fields(fields: str):
+    """Map a comma separated `fields=` value onto Content columns (id always included)."""
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = sorted(set(requested) - set(SUMMARY_FIELDS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    if "id" not in requested:
+        requested.insert(0, "id")
+    return [getattr(Content, field) for field in requested]
+
+@router.get("/", response_model=List[ContentSummary])
 async def get_content_list(
+    request: Request,
     subject: Optional[str] = Query(None, description="Filter by subject"),
     difficulty: Optional[str] = Query(None, description="Filter by difficulty level"),
     content_type: Optional[str] = Query(None, description="Filter by content type"),
-    db: Session = Depends(get_db)
+    format: Optional[str] = Query(None, description="Filter by available format"),
+    limit: int = Query(50, ge=1, le=200, description="Page size"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma separated subset of fields to return"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a page of available content with optional filters.
+    
+    Pages are keyed on content id; when more results exist the cursor for
+    the next page is returned in the `X-Next-Cursor` header. Pages carry an
+    ETag derived from the catalog watermark, so revalidating an unchanged
+    page costs no query.
+    """
+    # Sparse projection: select only the requested columns, skip ORM hydration
+    columns = parse_content_fields(fields) if fields else None
+    # Filters are resolved against the in-memory catalog index
+    await catalog_index.refresh(db)
+    validators = check_conditional(
+        request,
+        etag=make_etag("content-list", catalog_index.row_versions, len(catalog_index), str(request.query_params)),
+        last_modified=catalog_index.last_changed_at,
+        cache_control=f"public, max-age={int(catalog_index.refresh_interval)}"
+    )
+    
+    async def build():
+        content_ids = catalog_index.query(
+            subject=subject,
+            difficulty=difficulty,
+            content_type=content_type,
+            format=format
+        )
+        page_ids, next_cursor = paginate_ids(content_ids, cursor, limit)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        if columns:
+            result = await db.execute(select(*columns).where(Content.id.in_(page_ids)).order_by(Content.id))
+            page = [dict(row._mapping) for row in result]
+        else:
+            result = await db.execute(
+                select(Content)
+                .options(defer(Content.text_content, raiseload=True))
+                .where(Content.id.in_(page_ids))
+                .order_by(Content.id)
+            )
+            page = [ContentSummary.model_validate(content) for content in result.scalars()]
+        return JSONResponse(content=jsonable_encoder(page), headers=headers)
+    
+    # The ETag covers the catalog state and every query parameter
+    cached = await response_cache.get_or_build(f"content-list:{validators['ETag']}", ["catalog"], build)
+    cached.headers.update(validators)
+    return cached
+
+@router.get("/search", response_model=List[ContentSearchHit])
+async def search_content(
+    response: Response,
+    q: str = Query(..., min_length=1, description="Search terms"),
+    limit: int = Query(20, ge=1, le=100, description="Page size"),
+    offset: int = Query(0, ge=0, description="Number of ranked results to skip"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get list of available content with optional filters."""
-    query = db.query(Content).filter(Content.is_active == True)
+    """Full-text search over title, description, tags, objectives and text.
     
-    if subject:
-        query = query.filter(Content.subject.ilike(f"%{subject}%"))
-    if difficulty:
-        query = query.filter(Content.difficulty_level == difficulty)
-    if content_type:
-        query = query.filter(Content.content_type == content_type)
+    Results are ranked by BM25 relevance; the total number of matches is
+    returned in the `X-Total-Count` header.
+    """
+    await search_index.refresh(db)
+    total, ranked = search_index.search(q, limit=limit, offset=offset)
+    response.headers["X-Total-Count"] = str(total)
+    if not ranked:
+        return []
     
-    return query.all()
+    scores = dict(ranked)
+    result = await db.execute(
+        select(Content)
+        .options(defer(Content.text_content, raiseload=True))
+        .where(Content.id.in_(scores))
+    )
+    rows = {content.id: content for content in result.scalars()}
+    return [
+        ContentSearchHit(**ContentSummary.model_validate(rows[content_id]).model_dump(), score=score)
+        for content_id, score in ranked
+        if content_id in rows
+    ]
 
 @router.get("/{content_id}", response_model=ContentSchema)
-async def get_content(content_id: int, db: Session = Depends(get_db)):
-    """Get specific content by ID."""
-    content = db.query(Content).filter(Content.id == content_id).first()
-    if not content:
+async def get_content(
+    content_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get specific content by ID (revalidate with If-None-Match / If-Modified-Since)."""
+    row = (await db.execute(
+        select(Content.id, Content.version, func.coalesce(Content.updated_at, Content.created_at).label("changed_at"))
+        .where(Content.id == content_id)
+    )).first()
+    if row is None:
         raise HTTPException(status_code=404, detail="Content not found")
-    return content
+    # Validators come from the version and timestamp alone, so a 304 never loads the row
+    validators = check_conditional(
+        request,
+        etag=make_etag("content", content_id, row.version),
+        last_modified=row.changed_at,
+        cache_control="public, no-cache"
+    )
+    
+    async def build():
+        content = await db.get(Content, content_id)
+        return JSONResponse(content=jsonable_encoder(ContentSchema.model_validate(content)))
+    
+    cached = await response_cache.get_or_build(
+        f"content:{content_id}:{validators['ETag']}", [f"content:{content_id}"], build
+    )
+    cached.headers.update(validators)
+    return cached
 
 @router.get("/{content_id}/adaptive", response_model=AdaptiveContentResponse)
 async def get_adaptive_content(
     content_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get content with adaptive format recommendations based on user's learning style."""
-    content = db.query(Content).filter(Content.id == content_id).first()
+    content = await db.get(Content, content_id)
     if not content:
         raise HTTPException(status_code=404, detail="Content not found")
     
-    # Determine recommended format based on learning style
-    learning_style = current_user.learning_style or "visual"  # Default to visual
-    
-    # Get user's interaction history with this content
-    interactions = db.query(ContentInteraction).filter(
-        ContentInteraction.user_id == current_user.id,
-        ContentInteraction.content_id == content_id
-    ).all()
-    
-    # Analyze format preferences from interaction history
-    format_usage = {"video": 0, "audio": 0, "text": 0, "interactive": 0}
-    for interaction in interactions:
-        if interaction.format_used in format_usage:
-            format_usage[interaction.format_used] += 1
-    
-    # Determine recommended format
-    if learning_style == "visual":
-        if content.video_url:
-            recommended_format = "video"
-        elif content.text_content:
-            recommended_format = "text"
-        else:
-            recommended_format = "audio"
-    elif learning_style == "auditory":
-        if content.audio_url:
-            recommended_format = "audio"
-        elif content.video_url:
-            recommended_format = "video"
-        else:
-            recommended_format = "text"
-    else:  # kinesthetic
-        if content.interactive_url:
-            recommended_format = "interactive"
-        elif content.video_url:
-            recommended_format = "video"
-        else:
-            recommended_format = "text"
-    
-    # Override with most used format if user has strong preference
-    most_used_format = max(format_usage, key=format_usage.get)
-    if format_usage[most_used_format] > 2:  # If used more than twice
-        recommended_format = most_used_format
-    
-    # Get alternative formats
-    alternative_formats = []
-    if content.video_url and recommended_format != "video":
-        alternative_formats.append("video")
-    if content.audio_url and recommended_format != "audio":
-        alternative_formats.append("audio")
-    if content.text_content and recommended_format != "text":
-        alternative_formats.append("text")
-    if content.interactive_url and recommended_format != "interactive":
-        alternative_formats.append("interactive")
-    
-    # Generate personalization reason
-    if learning_style == "visual":
-        reason = "Recommended based on your visual learning preference"
-    elif learning_style == "auditory":
-        reason = "Recommended based on your auditory learning preference"
-    else:
-        reason = "Recommended based on your kinesthetic learning preference"
-    
-    if format_usage[most_used_format] > 2:
-        reason += f" and your usage pattern (preferring {most_used_format} format)"
+    counts = await get_content_format_counts(db, current_user.id, content_id)
+    decision = decide_format(current_user.learning_style, content, counts)
     
     return AdaptiveContentResponse(
         content=content,
-        recommended_format=recommended_format,
-        alternative_formats=alternative_formats,
-        personalization_reason=reason
+        recommended_format=decision.recommended_format,
+        alternative_formats=decision.alternative_formats,
+        personalization_reason=decision.personalization_reason
+    )
+
+@router.get("/{content_id}/related", response_model=List[ContentSummary])
+async def get_related_content(
+    content_id: int,
+    limit: int = Query(10, ge=1, le=50, description="Number of related items"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Content that learners who finished this item also finished.
+    
+    Reads the precomputed item-item neighbor list, most similar first.
+    """
+    await catalog_index.refresh(db)
+    if content_id not in catalog_index and not await db.get(Content, content_id):
+        raise HTTPException(status_code=404, detail="Content not found")
+    await item_similarity.refresh(db)
+    
+    related_ids = [
+        related_id for related_id, _ in item_similarity.neighbors(content_id, settings.SIMILARITY_TOP_K)
+        if related_id in catalog_index
+    ][:limit]
+    if not related_ids:
+        return []
+    result = await db.execute(
+        select(Content).where(Content.id.in_(related_ids)).options(defer(Content.text_content, raiseload=True))
     )
+    contents = {content.id: content for content in result.scalars()}
+    return [contents[related_id] for related_id in related_ids if related_id in contents]
+
+@router.post("/adaptive/batch", response_model=List[AdaptiveContentResponse])
+async def get_adaptive_content_batch(
+    batch: AdaptiveBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Resolve adaptive formats for many content items (e.g. a course page) at once.
+    
+    Takes explicit `content_ids` or a `subject`; uses one content query and
+    one grouped counter query regardless of the number of items.
+    """
+    if batch.content_ids:
+        content_ids = list(dict.fromkeys(batch.content_ids))
+    elif batch.subject:
+        await catalog_index.refresh(db)
+        content_ids = catalog_index.query(subject=batch.subject)
+    else:
+        raise HTTPException(status_code=400, detail="Provide content_ids or subject")
+    if len(content_ids) > MAX_ADAPTIVE_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_ADAPTIVE_BATCH} items per batch")
+    
+    result = await db.execute(select(Content).where(Content.id.in_(content_ids)))
+    contents_by_id = {content.id: content for content in result.scalars()}
+    contents = [contents_by_id[cid] for cid in content_ids if cid in contents_by_id]
+    
+    counts = await get_format_counts_for_contents(db, current_user.id, contents_by_id)
+    decisions = decide_for_contents(current_user.learning_style, contents, counts)
+    
+    return [
+        AdaptiveContentResponse(
+            content=content,
+            recommended_format=decision.recommended_format,
+            alternative_formats=decision.alternative_formats,
+            personalization_reason=decision.personalization_reason
+        )
+        for content, decision in zip(contents, decisions)
+    ]
 
 @router.post("/{content_id}/interaction")
 async def record_content_interaction(
     content_id: int,
     interaction: InteractionCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Record user interaction with content."""
-    # Verify content exists
-    content = db.query(Content).filter(Content.id == content_id).first()
-    if not content:
+    """Record user interaction with content.
+    
+    With the ingestion buffer running the event is acknowledged once queued
+    and written by the background flusher in a batch.
+    """
+    # Verify content exists (catalog index first, database for rows it hasn't seen yet)
+    await catalog_index.refresh(db)
+    if content_id not in catalog_index and not await db.get(Content, content_id):
         raise HTTPException(status_code=404, detail="Content not found")
     
-    # Create interaction record
-    db_interaction = ContentInteraction(
-        user_id=current_user.id,
-        content_id=content_id,
-        interaction_type=interaction.interaction_type,
-        format_used=interaction.format_used,
-        duration_seconds=interaction.duration_seconds,
-        interaction_metadata=interaction.interaction_metadata
-    )
+    record = {
+        "user_id": current_user.id,
+        "content_id": content_id,
+        "interaction_type": interaction.interaction_type,
+        "format_used": interaction.format_used,
+        "duration_seconds": interaction.duration_seconds,
+        "interaction_metadata": interaction.interaction_metadata,
+        "timestamp": datetime.now(timezone.utc),
+    }
+    
+    if interaction_ingestor.running:
+        try:
+            await interaction_ingestor.submit(record)
+        except IngestionBackpressure:
+            raise HTTPException(
+                status_code=503,
+                detail="Interaction queue is full, retry shortly",
+                headers={"Retry-After": "1"}
+            )
+        return {"message": "Interaction recorded successfully"}
     
-    db.add(db_interaction)
-    db.commit()
+    # Create interaction record
+    db.add(ContentInteraction(**record))
+    await increment_format_counts(db, [(current_user.id, content_id, interaction.format_used)])
+    await db.commit()
     
     return {"message": "Interaction recorded successfully"}
 
+@router.post("/interactions/bulk", response_model=BulkImportResult)
+async def bulk_record_interactions(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Record many interactions from an NDJSON or JSON-array body.
+    
+    The body is parsed as it streams in; each record is an `InteractionCreate`.
+    Returns how many records were accepted plus the line number and reason
+    for each rejected one.
+    """
+    return await ingest_interaction_stream(db, current_user.id, iter_json_records(request.stream()))
+
 @router.get("/{content_id}/progress")
 async def get_content_progress(
     content_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get user's progress for specific content."""
-    progress = db.query(ProgressRecord).filter(
+    result = await db.execute(select(ProgressRecord).where(
         ProgressRecord.user_id == current_user.id,
         ProgressRecord.content_id == content_id
-    ).first()
+    ))
+    progress = result.scalars().first()
+    pending = progress_coalescer.pending(current_user.id, content_id)
     
     if not progress:
         return {
@@ -167,9 +327,13 @@ async def get_content_progress(
             "last_position": 0,
             "is_completed": False,
             "quiz_score": None,
-            "engagement_score": 0.0
+            "engagement_score": 0.0,
+            **(pending or {})
         }
     
+    if pending:
+        # Heartbeats not yet flushed are newer than the stored row
+        return {**{column.key: getattr(progress, column.key) for column in ProgressRecord.__table__.columns}, **pending}
     return progress
 
 @router.put("/{content_id}/progress")
@@ -177,74 +341,56 @@ async def update_content_progress(
     content_id: int,
     progress_update: ProgressUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Update user's progress for specific content."""
-    # Verify content exists
-    content = db.query(Content).filter(Content.id == content_id).first()
-    if not content:
-        raise HTTPException(status_code=404, detail="Content not found")
-    
-    # Get or create progress record
-    progress = db.query(ProgressRecord).filter(
-        ProgressRecord.user_id == current_user.id,
-        ProgressRecord.content_id == content_id
-    ).first()
+    """Update user's progress for specific content.
     
-    if not progress:
-        progress = ProgressRecord(
-            user_id=current_user.id,
-            content_id=content_id
-        )
-        db.add(progress)
+    Writes are a single upsert. With heartbeat coalescing enabled, position
+    and time updates are buffered and the merged pending state is returned.
+    """
+    await catalog_index.refresh(db)
+    if content_id not in catalog_index and not await db.get(Content, content_id):
+        raise HTTPException(status_code=404, detail="Content not found")
     
-    # Update progress fields
-    for field, value in progress_update.dict(exclude_unset=True).items():
-        setattr(progress, field, value)
+    fields = progress_update.dict(exclude_unset=True)
+    if progress_coalescer.running:
+        if is_heartbeat(fields):
+            state = progress_coalescer.merge(current_user.id, content_id, fields)
+            return {"user_id": current_user.id, "content_id": content_id, **state}
+        fields = {**await progress_coalescer.take(current_user.id, content_id), **fields}
     
-    db.commit()
-    db.refresh(progress)
+    progress = await upsert_progress(db, current_user.id, content_id, fields)
+    await db.commit()
+    if "is_completed" in fields:
+        invalidate_recommendations(current_user.id)
     
     return progress
 
-@router.get("/recommendations/personalized", response_model=List[ContentSchema])
+@router.get("/recommendations/personalized", response_model=List[ContentSummary])
 async def get_personalized_recommendations(
-    limit: int = Query(10, description="Number of recommendations"),
+    limit: int = Query(10, ge=1, le=100, description="Number of recommendations"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get personalized content recommendations based on learning style and progress."""
-    learning_style = current_user.learning_style or "visual"
-    
-    # Get user's completed content
-    completed_content_ids = db.query(ProgressRecord.content_id).filter(
-        ProgressRecord.user_id == current_user.id,
-        ProgressRecord.is_completed == True
-    ).all()
-    completed_ids = [cid[0] for cid in completed_content_ids]
-    
-    # Get content that matches learning style preferences
-    if learning_style == "visual":
-        # Prefer video content
-        query = db.query(Content).filter(
-            Content.is_active == True,
-            Content.video_url.isnot(None)
-        )
-    elif learning_style == "auditory":
-        # Prefer audio content
-        query = db.query(Content).filter(
-            Content.is_active == True,
-            Content.audio_url.isnot(None)
-        )
-    else:  # kinesthetic
-        # Prefer interactive content
-        query = db.query(Content).filter(
-            Content.is_active == True,
-            Content.interactive_url.isnot(None)
-        )
+    """Get personalized content recommendations based on learning style and progress.
     
-    # Exclude already completed content
-    if completed_ids:
-        query = query.filter(~Content.id.in_(completed_ids))
+    The active catalog is ranked by format fit for the learner's assessment
+    scores, subject and difficulty fit with their progress, popularity and
+    duration; completed content is excluded. Lists are cached per user
+    and invalidated on completion and profile changes.
+    """
+    ranked_ids = await recommendation_cache.get(
+        db,
+        current_user.id,
+        current_user.learning_style,
+        current_user.assessment_score,
+        limit
+    )
+    if not ranked_ids:
+        return []
     
-    return query.limit(limit).all()
+    result = await db.execute(
+        select(Content).where(Content.id.in_(ranked_ids)).options(defer(Content.text_content, raiseload=True))
+    )
+    contents = {content.id: content for content in result.scalars()}
+    return [contents[content_id] for content_id in ranked_ids if content_id in contents]
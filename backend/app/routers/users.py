@@ -1,40 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-import hashlib
-from jose import JWTError, jwt
-from datetime import datetime, timedelta
 
-from app.database import get_db
+from app.database import get_async_db
 from app.models import User
-from app.schemas import UserCreate, User as UserSchema, UserUpdate
-from app.core.config import settings
-from app.auth import get_current_user
+from app.schemas import UserCreate, User as UserSchema, UserUpdate, BulkImportResult, RefreshRequest, SessionTokens
+from app.core.passwords import password_hasher, needs_rehash, PasswordHashingBusy
+from app.auth import get_current_user, get_admin_user, invalidate_principal
+from app.services.recommendations import invalidate_recommendations
+from app.services.roster import import_roster
+from app.services.response_cache import invalidate_on_commit
+from app.services.sessions import (
+    open_session, rotate_refresh_token, revoke_session, decode_refresh_token, InvalidRefreshToken
+)
+from app.core.streaming import iter_request_records
+from app.core.conditional import check_conditional, make_etag
 
 router = APIRouter()
 
-def verify_password(plain_password, hashed_password):
-    return hashlib.sha256(plain_password.encode()).hexdigest() == hashed_password
-
-def get_password_hash(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def create_access_token(data: dict, expires_delta: timedelta = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many sign-ins in progress, retry shortly",
+        headers={"Retry-After": "1"}
+    )
 
 @router.post("/register", response_model=UserSchema)
-async def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if user already exists
-    db_user = db.query(User).filter(
+    result = await db.execute(select(User).where(
         (User.email == user.email) | (User.username == user.username)
-    ).first()
+    ))
+    db_user = result.scalars().first()
     if db_user:
         raise HTTPException(
             status_code=400,
@@ -42,54 +40,135 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except PasswordHashingBusy:
+        raise _hashing_busy()
     db_user = User(
         email=user.email,
         username=user.username,
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-@router.post("/login")
-async def login_user(email: str, password: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.hashed_password):
+@router.post("/bulk", response_model=BulkImportResult)
+async def bulk_register_users(
+    request: Request,
+    admin: User = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Create accounts for a whole roster from a CSV (`text/csv`, with an
+    `email,username,password` header) or NDJSON/JSON-array body. Staff only.
+    
+    Returns how many accounts were created plus the line number and reason
+    for each rejected record.
+    """
+    records = iter_request_records(request.headers.get("content-type"), request.stream())
+    return await import_roster(db, records)
+
+@router.post("/login", response_model=SessionTokens)
+async def login_user(email: str, password: str, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(User.email == email))
+    user = result.scalars().first()
+    if user is not None:
+        # Hand the connection back to the pool while the hash is checked
+        db.expunge(user)
+    await db.rollback()
+    try:
+        verified = user is not None and await password_hasher.verify(password, user.hashed_password)
+        if verified and needs_rehash(user.hashed_password):
+            # Upgrade legacy SHA-256 (or lower-cost) hashes transparently
+            user.hashed_password = await password_hasher.hash(password)
+            await db.execute(update(User).where(User.id == user.id).values(hashed_password=user.hashed_password))
+            await db.commit()
+    except PasswordHashingBusy:
+        raise _hashing_busy()
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer", "user": user}
+    tokens = await open_session(db, user)
+    return {**tokens, "user": user}
+
+@router.post("/refresh", response_model=SessionTokens)
+async def refresh_session(request: RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    """Exchange a refresh token for a new access/refresh pair without re-entering the password.
+    
+    Each refresh token works once; reusing one signs its session out.
+    """
+    try:
+        user, tokens = await rotate_refresh_token(db, request.refresh_token)
+    except InvalidRefreshToken:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return {**tokens, "user": user}
+
+@router.post("/logout")
+async def logout_user(request: RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    """Sign the session of a refresh token out; its access tokens stop working too."""
+    try:
+        payload = decode_refresh_token(request.refresh_token, verify_exp=False)
+    except InvalidRefreshToken:
+        raise HTTPException(status_code=400, detail="Invalid refresh token")
+    await revoke_session(db, payload["sid"])
+    invalidate_principal(int(payload["sub"]))
+    return {"message": "Signed out successfully"}
 
 @router.get("/me", response_model=UserSchema)
-async def get_current_user(current_user: User = Depends(get_current_user)):
+async def read_current_user(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """The caller's profile, read from the database: the cached principal
+    may predate an update made through another worker."""
+    cached_version = current_user.version
+    await db.refresh(current_user)
+    if current_user.version != cached_version:
+        invalidate_principal(current_user.id)
+    changed_at = current_user.updated_at or current_user.created_at
+    check_conditional(
+        request,
+        response,
+        etag=make_etag("user", current_user.id, current_user.version),
+        last_modified=changed_at,
+        cache_control="private, no-cache"
+    )
     return current_user
 
 @router.put("/me", response_model=UserSchema)
 async def update_user_profile(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
+    # Start from the stored row: the cached principal may predate an update
+    # made through another worker, and unchanged-looking fields would be skipped
+    await db.refresh(current_user)
     # Update user fields
     for field, value in user_update.dict(exclude_unset=True).items():
         setattr(current_user, field, value)
     
-    db.commit()
-    db.refresh(current_user)
+    invalidate_on_commit(db, "users")
+    await db.commit()
+    await db.refresh(current_user)
+    invalidate_principal(current_user.id)
+    invalidate_recommendations(current_user.id)
     return current_user
 
 @router.get("/{user_id}", response_model=UserSchema)
-async def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
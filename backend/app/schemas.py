@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
@@ -10,6 +10,9 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class UserUpdate(BaseModel):
     email: Optional[EmailStr] = None
     username: Optional[str] = None
@@ -26,6 +29,12 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+class SessionTokens(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str
+    user: User
+
 # Assessment Schemas
 class AssessmentAnswer(BaseModel):
     question_id: int
@@ -39,6 +48,12 @@ class AssessmentResult(BaseModel):
     scores: Dict[str, int]
     confidence: float
 
+class AnswerSheet(BaseModel):
+    """One learner's answers from a paper session, in question order."""
+    user_id: Optional[int] = None
+    email: Optional[EmailStr] = None
+    answers: List[str]
+
 class AssessmentQuestion(BaseModel):
     id: int
     question_text: str
@@ -76,12 +91,35 @@ class Content(ContentBase):
     class Config:
         from_attributes = True
 
+class ContentSummary(ContentBase):
+    """Listing view of content; never carries the (large) text body."""
+    id: int
+    content_type: str
+    video_url: Optional[str] = None
+    audio_url: Optional[str] = None
+    interactive_url: Optional[str] = None
+    is_active: bool
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class ContentSearchHit(ContentSummary):
+    score: float
+
 class AdaptiveContentResponse(BaseModel):
     content: Content
     recommended_format: str
     alternative_formats: List[str]
     personalization_reason: str
 
+# Items per adaptive batch request
+MAX_ADAPTIVE_BATCH = 200
+
+class AdaptiveBatchRequest(BaseModel):
+    content_ids: List[int] = Field(default=[], max_length=MAX_ADAPTIVE_BATCH)
+    subject: Optional[str] = None
+
 # Progress Schemas
 class ProgressRecord(BaseModel):
     id: int
@@ -116,6 +154,15 @@ class ContentInteraction(BaseModel):
 class InteractionCreate(ContentInteraction):
     content_id: int
 
+class BulkRecordError(BaseModel):
+    line: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    accepted: int
+    rejected: int
+    errors: List[BulkRecordError]
+
 # Analytics Schemas
 class UserAnalytics(BaseModel):
     user_id: int
@@ -133,3 +180,9 @@ class ContentAnalytics(BaseModel):
     average_engagement: float
     format_preferences: Dict[str, int]
     user_feedback: Dict[str, Any]
+    # Approximate, from the per-content sketches
+    unique_learners: int = 0
+    quiz_score_p50: Optional[float] = None
+    quiz_score_p90: Optional[float] = None
+    completion_minutes_p50: Optional[float] = None
+    completion_minutes_p90: Optional[float] = None
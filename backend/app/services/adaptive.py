@@ -0,0 +1,91 @@
+"""
+Adaptive format selection
+
+Pure functions deciding which format to recommend for a batch of content
+items, given the learner's style, which formats each item offers and how
+often the learner used each format. Single and batch endpoints share them.
+"""
+
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+FORMATS = ("video", "audio", "text", "interactive")
+FORMAT_INDEX = {fmt: i for i, fmt in enumerate(FORMATS)}
+
+# (preferred formats in order, fallback when neither is available) per style
+STYLE_PREFERENCES = {
+    "visual": (("video", "text"), "audio"),
+    "auditory": (("audio", "video"), "text"),
+    "kinesthetic": (("interactive", "video"), "text"),
+}
+
+# A format used more than this many times overrides the style preference
+STRONG_PREFERENCE_THRESHOLD = 2
+
+class FormatDecision(NamedTuple):
+    recommended_format: str
+    alternative_formats: List[str]
+    personalization_reason: str
+
+def normalize_style(learning_style: Optional[str]) -> str:
+    learning_style = learning_style or "visual"  # Default to visual
+    return learning_style if learning_style in ("visual", "auditory") else "kinesthetic"
+
+def availability_row(content) -> List[bool]:
+    """Which formats a Content row offers, in FORMATS order."""
+    return [
+        bool(content.video_url),
+        bool(content.audio_url),
+        bool(content.text_content),
+        bool(content.interactive_url),
+    ]
+
+def decide_formats(learning_style: Optional[str], available: np.ndarray, usage: np.ndarray) -> List[FormatDecision]:
+    """Recommend a format for each row.
+
+    `available` is an (n, 4) boolean matrix and `usage` an (n, 4) count
+    matrix, both with columns in FORMATS order.
+    """
+    style = normalize_style(learning_style)
+    available = np.asarray(available, dtype=bool).reshape(-1, len(FORMATS))
+    usage = np.asarray(usage, dtype=np.int64).reshape(-1, len(FORMATS))
+
+    (primary, secondary), fallback = STYLE_PREFERENCES[style]
+    recommended = np.full(len(available), FORMAT_INDEX[fallback])
+    recommended = np.where(available[:, FORMAT_INDEX[secondary]], FORMAT_INDEX[secondary], recommended)
+    recommended = np.where(available[:, FORMAT_INDEX[primary]], FORMAT_INDEX[primary], recommended)
+
+    # Override with most used format if user has strong preference
+    most_used = usage.argmax(axis=1)
+    strong = usage.max(axis=1) > STRONG_PREFERENCE_THRESHOLD
+    recommended = np.where(strong, most_used, recommended)
+
+    base_reason = f"Recommended based on your {style} learning preference"
+    decisions = []
+    for row, fmt_index in enumerate(recommended):
+        alternatives = [
+            fmt for i, fmt in enumerate(FORMATS)
+            if available[row, i] and i != fmt_index
+        ]
+        reason = base_reason
+        if strong[row]:
+            reason += f" and your usage pattern (preferring {FORMATS[most_used[row]]} format)"
+        decisions.append(FormatDecision(FORMATS[fmt_index], alternatives, reason))
+    return decisions
+
+def usage_row(counts: dict) -> List[int]:
+    """Per-format counts in FORMATS order; unknown formats are ignored."""
+    return [counts.get(fmt, 0) for fmt in FORMATS]
+
+def decide_format(learning_style: Optional[str], content, counts: dict) -> FormatDecision:
+    """Single-item convenience wrapper around `decide_formats`."""
+    return decide_formats(learning_style, [availability_row(content)], [usage_row(counts)])[0]
+
+def decide_for_contents(learning_style: Optional[str], contents: Sequence, counts_by_content: dict) -> List[FormatDecision]:
+    """Decide formats for many Content rows given {content_id: {format: count}}."""
+    if not contents:
+        return []
+    available = np.array([availability_row(content) for content in contents], dtype=bool)
+    usage = np.array([usage_row(counts_by_content.get(content.id, {})) for content in contents], dtype=np.int64)
+    return decide_formats(learning_style, available, usage)
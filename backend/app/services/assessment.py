@@ -0,0 +1,186 @@
+"""
+Assessment question bundle
+
+The question set is effectively static, but thousands of students fetch
+it at once at term start. It is seeded at startup (or, where startup
+seeding is skipped, as on Netlify, by the first bundle build that finds
+the table empty), and the active
+questions are held as an immutable bundle of pre-serialized JSON bytes
+with a strong ETag, so a request costs no database work and a repeat
+client gets a 304. The bundle is rebuilt at most once per
+`ASSESSMENT_BUNDLE_REFRESH_SECONDS`, and the ETag only changes when the
+questions do.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from pydantic import TypeAdapter
+from sqlalchemy import Engine, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database import dialect_insert
+from app.models import AssessmentQuestion
+from app.schemas import AssessmentQuestion as AssessmentQuestionSchema
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Pre-defined assessment questions based on the specification
+ASSESSMENT_QUESTIONS = [
+    {
+        "question_text": "When learning a new software, you prefer to:",
+        "visual_answer": "Watch a video tutorial.",
+        "auditory_answer": "Listen to a podcast explaining the features.",
+        "kinesthetic_answer": "Click around and try to figure it out yourself."
+    },
+    {
+        "question_text": "When you get directions to a new place, you're most likely to remember them by:",
+        "visual_answer": "Picturing a map in your head.",
+        "auditory_answer": "Hearing the directions repeated to you.",
+        "kinesthetic_answer": "Driving there once to get a feel for the route."
+    },
+    {
+        "question_text": "You're trying to learn a new song. You will:",
+        "visual_answer": "Read the sheet music.",
+        "auditory_answer": "Listen to the song repeatedly.",
+        "kinesthetic_answer": "Play the tune on an instrument."
+    },
+    {
+        "question_text": "When you read, you often find yourself:",
+        "visual_answer": "Picturing the scenes in your mind.",
+        "auditory_answer": "Reading out loud or mouthing the words.",
+        "kinesthetic_answer": "Pacing or fidgeting to stay engaged."
+    },
+    {
+        "question_text": "When a teacher or speaker presents a new idea, you're most engaged by:",
+        "visual_answer": "Diagrams, charts, and slides.",
+        "auditory_answer": "A clear, spoken explanation.",
+        "kinesthetic_answer": "Hands-on examples or group activities."
+    },
+    {
+        "question_text": "To remember a grocery list, you would:",
+        "visual_answer": "Visualize the items in your cart.",
+        "auditory_answer": "Repeat the list to yourself.",
+        "kinesthetic_answer": "Write it down."
+    },
+    {
+        "question_text": "When explaining something, you tend to:",
+        "visual_answer": "Draw a picture or a diagram.",
+        "auditory_answer": "Talk through the steps.",
+        "kinesthetic_answer": "Use your hands and body language."
+    },
+    {
+        "question_text": "In a classroom, you prefer to sit:",
+        "visual_answer": "Where you can clearly see the board and the instructor's gestures.",
+        "auditory_answer": "Anywhere you can hear well, even if you can't see the board.",
+        "kinesthetic_answer": "Where you can stand up or move around if needed."
+    },
+    {
+        "question_text": "Your favorite way to learn a new skill is by:",
+        "visual_answer": "Watching an expert perform it.",
+        "auditory_answer": "Being given detailed verbal instructions.",
+        "kinesthetic_answer": "Trying it out yourself with tools or materials."
+    },
+    {
+        "question_text": "When doing research, you prefer to get your information from:",
+        "visual_answer": "Infographics or well-designed websites.",
+        "auditory_answer": "Podcasts or radio documentaries.",
+        "kinesthetic_answer": "Interactive simulations or hands-on tutorials."
+    }
+]
+
+def seed_assessment_questions(bind: Engine) -> None:
+    """Insert the predefined questions into an empty question table."""
+    with Session(bind) as db:
+        if db.scalar(select(func.count()).select_from(AssessmentQuestion)):
+            return
+        for i, question_data in enumerate(ASSESSMENT_QUESTIONS):
+            db.add(AssessmentQuestion(id=i + 1, **question_data))
+        db.commit()
+    logger.info("Seeded %d assessment questions", len(ASSESSMENT_QUESTIONS))
+
+async def seed_assessment_questions_async(db: AsyncSession) -> None:
+    """Insert the predefined questions into an empty question table. Commits.
+
+    Safe to race: rows another worker inserted first are skipped.
+    """
+    if await db.scalar(select(func.count()).select_from(AssessmentQuestion)):
+        return
+    stmt = dialect_insert(AssessmentQuestion).on_conflict_do_nothing(index_elements=["id"])
+    await db.execute(stmt, [{"id": i + 1, **question_data} for i, question_data in enumerate(ASSESSMENT_QUESTIONS)])
+    await db.commit()
+    logger.info("Seeded %d assessment questions", len(ASSESSMENT_QUESTIONS))
+
+def score_answer_matrix(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Score answer sheets given as a (sheets x questions) matrix of indexes
+    into `settings.LEARNING_STYLES`.
+
+    Returns per-style counts (sheets x styles) and each sheet's primary
+    style index; ties go to the earlier style, as in `/assessment/submit`.
+    """
+    styles = np.arange(len(settings.LEARNING_STYLES))
+    scores = (matrix[:, :, None] == styles).sum(axis=1)
+    return scores, scores.argmax(axis=1)
+
+_questions_adapter = TypeAdapter(List[AssessmentQuestionSchema])
+
+class QuestionBundle(NamedTuple):
+    body: bytes
+    etag: str
+
+def build_bundle(questions: List[AssessmentQuestion]) -> QuestionBundle:
+    body = _questions_adapter.dump_json(
+        [AssessmentQuestionSchema.model_validate(question, from_attributes=True) for question in questions]
+    )
+    return QuestionBundle(body, '"%s"' % hashlib.sha256(body).hexdigest()[:32])
+
+class AssessmentQuestionCache:
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self.bundle: Optional[QuestionBundle] = None
+        self._lock = asyncio.Lock()
+        self._checked_at = 0.0
+        self.rebuilds = 0
+
+    async def get(self, db: AsyncSession) -> QuestionBundle:
+        if self.bundle is None or time.monotonic() - self._checked_at >= self.refresh_interval:
+            await self.refresh(db)
+        return self.bundle
+
+    async def refresh(self, db: AsyncSession, force: bool = False) -> None:
+        async with self._lock:
+            if not force and self.bundle is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return
+            active = select(AssessmentQuestion).where(AssessmentQuestion.is_active == True).order_by(AssessmentQuestion.id)
+            questions = (await db.scalars(active)).all()
+            if not questions and self.bundle is None:
+                # Deployments that skip startup seeding start with an empty table
+                await seed_assessment_questions_async(db)
+                questions = (await db.scalars(active)).all()
+            bundle = build_bundle(questions)
+            if self.bundle is None or bundle.etag != self.bundle.etag:
+                self.bundle = bundle
+                self.rebuilds += 1
+            self._checked_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        """Rebuild on the next request (call after editing questions)."""
+        self._checked_at = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "etag": self.bundle.etag if self.bundle else None,
+            "bytes": len(self.bundle.body) if self.bundle else 0,
+            "rebuilds": self.rebuilds,
+        }
+
+question_cache = AssessmentQuestionCache(refresh_interval=settings.ASSESSMENT_BUNDLE_REFRESH_SECONDS)
+
+metrics.register("assessment_questions", question_cache.stats)
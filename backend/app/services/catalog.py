@@ -0,0 +1,247 @@
+"""
+Process-local index of the content catalog
+
+Keeps posting lists (sets of content ids) per subject, difficulty level,
+content type and available format so listing filters are answered with set
+intersections instead of table scans. Indexes are refreshed incrementally
+from `Content.updated_at` / `Content.created_at`.
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Content
+from app.core.config import settings
+from app.services.response_cache import response_cache
+
+# Content column holding each deliverable format
+FORMAT_COLUMNS = {
+    "video": Content.video_url,
+    "audio": Content.audio_url,
+    "text": Content.text_content,
+    "interactive": Content.interactive_url,
+}
+
+class CatalogEntry(NamedTuple):
+    id: int
+    subject: str
+    difficulty_level: str
+    content_type: str
+    formats: frozenset
+    duration_minutes: int
+
+def _trigrams(value: str) -> Set[str]:
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+class ContentIndex:
+    """Base for in-memory indexes fed incrementally from the content table.
+
+    Subclasses declare the columns they need and how to upsert one row;
+    refresh only reads rows whose `updated_at`/`created_at` moved past the
+    last watermark, at most once per `refresh_interval` seconds.
+    """
+
+    def __init__(self, refresh_interval: float = 5.0):
+        self.refresh_interval = refresh_interval
+        self._lock = asyncio.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._watermark = None
+        self._loaded = False
+        self._checked_at = 0.0
+        self.version = 0
+        self._row_versions: Dict[int, int] = {}
+        # Sum of the row versions applied; any update, made by any worker, moves it
+        self.row_versions = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def last_changed_at(self):
+        """Newest `updated_at`/`created_at` applied so far (a cheap catalog validator)."""
+        return self._watermark
+
+    def invalidate(self) -> None:
+        """Force a full rebuild on the next refresh (e.g. after hard deletes)."""
+        self._reset()
+
+    def columns(self) -> list:
+        raise NotImplementedError
+
+    def _upsert(self, row) -> None:
+        raise NotImplementedError
+
+    def _changed(self, content_ids: List[int]) -> None:
+        """Called with rows updated or added after the initial build."""
+
+    def _is_fresh(self) -> bool:
+        return self.loaded and time.monotonic() - self._checked_at < self.refresh_interval
+
+    async def refresh(self, db: AsyncSession, force: bool = False) -> None:
+        """Apply rows created or updated since the last refresh."""
+        if not force and self._is_fresh():
+            return
+        async with self._lock:
+            if not force and self._is_fresh():
+                return
+            changed_at = func.coalesce(Content.updated_at, Content.created_at)
+            stmt = select(
+                Content.id, Content.is_active, Content.version, changed_at.label("changed_at"), *self.columns()
+            )
+            if self._watermark is not None:
+                # One second of slack: SQLite timestamps have second precision
+                stmt = stmt.where(changed_at >= self._watermark - timedelta(seconds=1))
+            rows = (await db.execute(stmt)).all()
+            if not self.loaded:
+                # Initial build can be large; keep it off the event loop.
+                # Readers wait on the lock until it completes.
+                await asyncio.to_thread(self.apply, rows)
+            else:
+                self.apply(rows)
+            self._checked_at = time.monotonic()
+
+    def apply(self, rows: Iterable) -> None:
+        """Upsert rows into the index; inactive rows are removed."""
+        changed = False
+        updated = []
+        for row in rows:
+            self._upsert(row)
+            previous = self._row_versions.get(row.id)
+            if previous != row.version:
+                updated.append(row.id)
+                self.row_versions += row.version - (previous or 0)
+                self._row_versions[row.id] = row.version
+            if row.changed_at is not None and (self._watermark is None or row.changed_at > self._watermark):
+                self._watermark = row.changed_at
+            changed = True
+        if updated and self._loaded:
+            self._changed(updated)
+        self._loaded = True
+        if changed:
+            self.version += 1
+
+class CatalogIndex(ContentIndex):
+    """Posting-list index over active content rows."""
+
+    def _reset(self) -> None:
+        super()._reset()
+        self._entries: Dict[int, CatalogEntry] = {}
+        self._by_subject: Dict[str, Set[int]] = defaultdict(set)
+        self._by_difficulty: Dict[str, Set[int]] = defaultdict(set)
+        self._by_type: Dict[str, Set[int]] = defaultdict(set)
+        self._by_format: Dict[str, Set[int]] = defaultdict(set)
+        # trigram -> lowercased subjects containing it, for substring filters
+        self._subject_trigrams: Dict[str, Set[str]] = defaultdict(set)
+
+    def _changed(self, content_ids: List[int]) -> None:
+        # Cached responses built from these rows (any worker may have edited them)
+        response_cache.invalidate("catalog", *(f"content:{content_id}" for content_id in content_ids))
+
+    def columns(self) -> list:
+        return [
+            Content.subject,
+            Content.difficulty_level,
+            Content.content_type,
+            Content.duration_minutes,
+            *[column.isnot(None).label(fmt) for fmt, column in FORMAT_COLUMNS.items()],
+        ]
+
+    def _upsert(self, row) -> None:
+        self._remove(row.id)
+        if row.is_active:
+            self._add(CatalogEntry(
+                id=row.id,
+                subject=row.subject or "",
+                difficulty_level=row.difficulty_level,
+                content_type=row.content_type,
+                formats=frozenset(fmt for fmt in FORMAT_COLUMNS if getattr(row, fmt)),
+                duration_minutes=row.duration_minutes or 0,
+            ))
+
+    def _add(self, entry: CatalogEntry) -> None:
+        self._entries[entry.id] = entry
+        subject = entry.subject.lower()
+        if not self._by_subject[subject]:
+            for trigram in _trigrams(subject):
+                self._subject_trigrams[trigram].add(subject)
+        self._by_subject[subject].add(entry.id)
+        self._by_difficulty[entry.difficulty_level].add(entry.id)
+        self._by_type[entry.content_type].add(entry.id)
+        for fmt in entry.formats:
+            self._by_format[fmt].add(entry.id)
+
+    def _remove(self, content_id: int) -> None:
+        entry = self._entries.pop(content_id, None)
+        if entry is None:
+            return
+        subject = entry.subject.lower()
+        self._by_subject[subject].discard(content_id)
+        if not self._by_subject[subject]:
+            del self._by_subject[subject]
+            for trigram in _trigrams(subject):
+                self._subject_trigrams[trigram].discard(subject)
+        self._by_difficulty[entry.difficulty_level].discard(content_id)
+        self._by_type[entry.content_type].discard(content_id)
+        for fmt in entry.formats:
+            self._by_format[fmt].discard(content_id)
+
+    def _subject_matches(self, needle: str) -> Set[int]:
+        """Ids whose subject contains `needle` (case-insensitive, like ILIKE '%x%')."""
+        needle = needle.lower()
+        if len(needle) >= 3:
+            trigrams = sorted(_trigrams(needle), key=lambda t: len(self._subject_trigrams.get(t, ())))
+            subjects = set(self._subject_trigrams.get(trigrams[0], ()))
+            for trigram in trigrams[1:]:
+                subjects &= self._subject_trigrams.get(trigram, set())
+        else:
+            subjects = self._by_subject.keys()
+        ids: Set[int] = set()
+        for subject in subjects:
+            if needle in subject:
+                ids |= self._by_subject[subject]
+        return ids
+
+    def query(self, subject: Optional[str] = None, difficulty: Optional[str] = None,
+              content_type: Optional[str] = None, format: Optional[str] = None) -> List[int]:
+        """Return matching active content ids in ascending order."""
+        postings = []
+        if subject:
+            postings.append(self._subject_matches(subject))
+        if difficulty:
+            postings.append(self._by_difficulty.get(difficulty, set()))
+        if content_type:
+            postings.append(self._by_type.get(content_type, set()))
+        if format:
+            postings.append(self._by_format.get(format, set()))
+        if not postings:
+            return sorted(self._entries)
+        postings.sort(key=len)
+        ids = set(postings[0])
+        for posting in postings[1:]:
+            if not ids:
+                break
+            ids &= posting
+        return sorted(ids)
+
+    def get(self, content_id: int) -> Optional[CatalogEntry]:
+        return self._entries.get(content_id)
+
+    def entries(self) -> List[CatalogEntry]:
+        return list(self._entries.values())
+
+    def __contains__(self, content_id: int) -> bool:
+        return content_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+catalog_index = CatalogIndex(refresh_interval=settings.CATALOG_REFRESH_SECONDS)
@@ -0,0 +1,439 @@
+"""
+Columnar interaction event store
+
+An append-only, on-disk copy of `content_interactions` for analytical
+queries, so format-mix, difficulty and learning-style breakdowns never scan
+the OLTP database. Each day is a partition directory holding one raw NumPy
+column file per field; string fields are dictionary-encoded to small
+integer codes, and content difficulty/subject and the learner's style are
+denormalized in at ingest time (as they were when the event was fed).
+
+Columns are appended first and the manifest (row counts, dictionaries and
+the id watermark) is replaced atomically afterwards; before feeding, column
+files are truncated back to the manifest, so a crash mid-append loses
+nothing that the next feed will not re-read. Readers memory-map each
+partition up to the row count of the manifest they started with.
+
+Every worker on a host shares `EVENT_STORE_PATH`. Feeding takes an
+exclusive `flock` on the store, re-reads the manifest and appends; a worker
+that finds the lock taken only reloads the manifest, leaving the feed to
+whoever holds it.
+
+Interaction ids are not committed in id order on Postgres, so ids inside
+the last `FEED_LOOKBACK` below the watermark that were missing when it
+advanced are kept in the manifest and appended once they show up.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import or_, select
+
+from app.database import AsyncSessionLocal
+from app.models import Content, ContentInteraction, User
+from app.core import metrics
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single worker feeds without locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = {
+    "id": np.int64,
+    "ts": np.int64,  # unix seconds
+    "user_id": np.int32,
+    "content_id": np.int32,
+    "duration_seconds": np.int32,
+}
+DICTIONARY_COLUMNS = ("format_used", "interaction_type", "difficulty_level", "subject", "learning_style")
+# Dictionary codes; stores written before this was recorded in the manifest use int16
+CODE_DTYPE = "int32"
+LEGACY_CODE_DTYPE = "int16"
+STORED_COLUMNS = tuple(COLUMNS) + DICTIONARY_COLUMNS
+ID_COLUMNS = ("user_id", "content_id")
+GROUP_KEYS = DICTIONARY_COLUMNS + ID_COLUMNS + ("day", "week")
+
+# Interactions read from the database per feed query
+FEED_BATCH = 50_000
+
+# Ids below the watermark that are still waited for
+FEED_LOOKBACK = 1000
+
+EPOCH = date(1970, 1, 1)
+
+def _unix_seconds(value) -> int:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        # SQLite stores naive UTC
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+def _epoch_day(day: date) -> int:
+    return (day - EPOCH).days
+
+class EventStore:
+    def __init__(self, path: str, refresh_interval: float):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._lock = asyncio.Lock()
+        self._checked_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._opened = False
+        self.last_id = 0
+        self._rows: Dict[int, int] = {}  # epoch day -> rows
+        self._dictionaries: Dict[str, List[str]] = {column: [] for column in DICTIONARY_COLUMNS}
+        self._codes: Dict[str, Dict[str, int]] = {column: {} for column in DICTIONARY_COLUMNS}
+        self._code_dtypes: Dict[str, str] = {column: CODE_DTYPE for column in DICTIONARY_COLUMNS}
+        self._pending: List[int] = []
+        self._lock_file = None
+        self.fed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.last_feed_ms = 0.0
+
+    # Storage
+
+    def _partition_dir(self, day: int) -> str:
+        return os.path.join(self.path, "partitions", (EPOCH + timedelta(days=day)).isoformat())
+
+    def _column_path(self, day: int, column: str) -> str:
+        return os.path.join(self._partition_dir(day), f"{column}.bin")
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, "manifest.json")
+
+    def _dtype(self, column: str) -> np.dtype:
+        return np.dtype(self._code_dtypes[column] if column in DICTIONARY_COLUMNS else COLUMNS[column])
+
+    def _load_manifest(self) -> None:
+        if not os.path.exists(self._manifest_path()):
+            return
+        with open(self._manifest_path()) as f:
+            manifest = json.load(f)
+        self.last_id = manifest["last_id"]
+        self._rows = {_epoch_day(date.fromisoformat(day)): rows for day, rows in manifest["rows"].items()}
+        self._pending = manifest.get("pending_ids", [])
+        code_dtypes = manifest.get("code_dtypes", {})
+        for column in DICTIONARY_COLUMNS:
+            values = manifest["dictionaries"].get(column, [])
+            self._dictionaries[column] = values
+            self._codes[column] = {value: code for code, value in enumerate(values)}
+            self._code_dtypes[column] = code_dtypes.get(column, LEGACY_CODE_DTYPE)
+
+    def open(self) -> None:
+        """Load the manifest, once, for reading."""
+        if self._opened:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        self._load_manifest()
+        self._opened = True
+
+    def _recover(self) -> None:
+        """Drop any column bytes written past the manifest by an interrupted append."""
+        for day, rows in self._rows.items():
+            for column in STORED_COLUMNS:
+                path = self._column_path(day, column)
+                size = rows * self._dtype(column).itemsize
+                if os.path.getsize(path) > size:
+                    os.truncate(path, size)
+
+    def _acquire_feed(self) -> bool:
+        """Take the store's feed lock and load its latest state.
+
+        Returns False, after reloading the manifest, when another worker is
+        feeding.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        self._opened = True
+        if fcntl is not None:
+            lock_file = open(os.path.join(self.path, ".lock"), "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                self._load_manifest()
+                return False
+            self._lock_file = lock_file
+        self._load_manifest()
+        self._recover()
+        return True
+
+    def _release_feed(self) -> None:
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _write_manifest(self) -> None:
+        manifest = {
+            "last_id": self.last_id,
+            "pending_ids": self._pending,
+            "rows": {(EPOCH + timedelta(days=day)).isoformat(): rows for day, rows in sorted(self._rows.items())},
+            "dictionaries": self._dictionaries,
+            "code_dtypes": self._code_dtypes,
+        }
+        tmp_path = f"{self._manifest_path()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path())
+
+    def _encode(self, column: str, values: Sequence[Optional[str]]) -> np.ndarray:
+        codes = self._codes[column]
+        dictionary = self._dictionaries[column]
+        dtype = self._dtype(column)
+        encoded = np.empty(len(values), dtype=dtype)
+        for i, value in enumerate(values):
+            value = value or "unknown"
+            code = codes.get(value)
+            if code is None:
+                if len(dictionary) > np.iinfo(dtype).max:
+                    raise OverflowError(
+                        f"{column} has more distinct values than {dtype} codes can hold; "
+                        f"rebuild the event store at {self.path}"
+                    )
+                code = codes[value] = len(dictionary)
+                dictionary.append(value)
+            encoded[i] = code
+        return encoded
+
+    def append(self, rows: list) -> int:
+        """Append feed rows (see `feed_statement`); returns rows appended.
+
+        `rows` must hold every visible interaction between the watermark and
+        its highest id (plus any pending ids): ids in that range it lacks
+        become pending. Call with the feed lock held.
+        """
+        if not rows:
+            return 0
+        ids, timestamps, users, contents, durations, formats, types, difficulties, subjects, styles = zip(*rows)
+        arrays = {
+            "id": np.asarray(ids, dtype=np.int64),
+            "ts": np.fromiter((_unix_seconds(ts) for ts in timestamps), dtype=np.int64, count=len(rows)),
+            "user_id": np.asarray(users, dtype=np.int32),
+            "content_id": np.asarray(contents, dtype=np.int32),
+            "duration_seconds": np.asarray([duration or 0 for duration in durations], dtype=np.int32),
+            "format_used": self._encode("format_used", formats),
+            "interaction_type": self._encode("interaction_type", types),
+            "difficulty_level": self._encode("difficulty_level", difficulties),
+            "subject": self._encode("subject", subjects),
+            "learning_style": self._encode("learning_style", styles),
+        }
+        days = arrays["ts"] // 86400
+        rows_by_day = dict(self._rows)
+        for day in np.unique(days).tolist():
+            selected = days == day
+            os.makedirs(self._partition_dir(day), exist_ok=True)
+            for column, values in arrays.items():
+                with open(self._column_path(day, column), "ab") as f:
+                    f.write(values[selected].tobytes())
+            rows_by_day[day] = rows_by_day.get(day, 0) + int(selected.sum())
+        self._rows = rows_by_day
+        previous_id = self.last_id
+        self.last_id = max(self.last_id, int(arrays["id"].max()))
+        seen = set(ids)
+        window_start = max(previous_id, self.last_id - FEED_LOOKBACK)
+        pending = {
+            source_id for source_id in self._pending
+            if source_id not in seen and source_id > self.last_id - FEED_LOOKBACK
+        }
+        pending.update(source_id for source_id in range(window_start + 1, self.last_id) if source_id not in seen)
+        self._pending = sorted(pending)
+        self._write_manifest()
+        return len(rows)
+
+    # Feeding
+
+    @property
+    def folded_id(self) -> int:
+        """Highest interaction id at or below which every row has been appended."""
+        return min(self.last_id, self._pending[0] - 1) if self._pending else self.last_id
+
+    def feed_statement(self, pending: bool = False):
+        """Interactions past the watermark (or the pending ones), with content and learner attributes."""
+        stmt = select(
+            ContentInteraction.id,
+            ContentInteraction.timestamp,
+            ContentInteraction.user_id,
+            ContentInteraction.content_id,
+            ContentInteraction.duration_seconds,
+            ContentInteraction.format_used,
+            ContentInteraction.interaction_type,
+            Content.difficulty_level,
+            Content.subject,
+            User.learning_style,
+        ).outerjoin(
+            Content, Content.id == ContentInteraction.content_id
+        ).outerjoin(
+            User, User.id == ContentInteraction.user_id
+        ).where(
+            ContentInteraction.id.in_(self._pending) if pending else ContentInteraction.id > self.last_id,
+            ContentInteraction.timestamp.isnot(None)
+        )
+        return stmt if pending else stmt.order_by(ContentInteraction.id).limit(FEED_BATCH)
+
+    async def refresh(self, force: bool = False) -> None:
+        """Append interactions recorded since the last refresh, at most once per interval."""
+        if not force and time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        async with self._lock:
+            if not force and time.monotonic() - self._checked_at < self.refresh_interval:
+                return
+            started = time.perf_counter()
+            try:
+                if await asyncio.to_thread(self._acquire_feed):
+                    try:
+                        async with AsyncSessionLocal() as db:
+                            if self._pending:
+                                rows = (await db.execute(self.feed_statement(pending=True))).all()
+                                self.fed += await asyncio.to_thread(self.append, rows)
+                            while True:
+                                rows = (await db.execute(self.feed_statement())).all()
+                                self.fed += await asyncio.to_thread(self.append, rows)
+                                if len(rows) < FEED_BATCH:
+                                    break
+                    finally:
+                        self._release_feed()
+                else:
+                    self.skipped += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Event store feed failed")
+            self.last_feed_ms = (time.perf_counter() - started) * 1000
+            self._checked_at = time.monotonic()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self.refresh(force=True)
+            await asyncio.sleep(self.refresh_interval)
+
+    # Querying
+
+    def _column(self, day: int, column: str, rows: int) -> np.ndarray:
+        return np.memmap(self._column_path(day, column), dtype=self._dtype(column), mode="r", shape=(rows,))
+
+    def query(self, group_by: Sequence[str] = (), filters: Optional[Dict[str, list]] = None,
+              since: Optional[date] = None, until: Optional[date] = None) -> List[dict]:
+        """Interaction counts, distinct learners and durations per group.
+
+        `filters` maps a dictionary or id column to the values to keep;
+        `since` is inclusive and `until` exclusive.
+        """
+        self.open()
+        filters = {column: values for column, values in (filters or {}).items() if values}
+        rows_by_day = self._rows
+        dictionaries = {column: list(values) for column, values in self._dictionaries.items()}
+        first = _epoch_day(since) if since else None
+        last = _epoch_day(until) if until else None
+
+        # Filter values to codes; values never seen match nothing
+        wanted = {}
+        for column, values in filters.items():
+            if column in DICTIONARY_COLUMNS:
+                codes = self._codes[column]
+                wanted[column] = np.asarray([codes[value] for value in values if value in codes], dtype=np.int64)
+            else:
+                wanted[column] = np.asarray(values, dtype=np.int64)
+
+        stored = [key for key in group_by if key in STORED_COLUMNS]
+        keys: Dict[str, list] = {key: [] for key in group_by}
+        users, durations = [], []
+        for day in sorted(rows_by_day):
+            if (first is not None and day < first) or (last is not None and day >= last):
+                continue
+            rows = rows_by_day[day]
+            mask = np.ones(rows, dtype=bool)
+            for column, values in wanted.items():
+                mask &= np.isin(self._column(day, column, rows), values)
+            matched = int(mask.sum())
+            if not matched:
+                continue
+            users.append(self._column(day, "user_id", rows)[mask])
+            durations.append(self._column(day, "duration_seconds", rows)[mask])
+            for key in stored:
+                keys[key].append(self._column(day, key, rows)[mask])
+            if "day" in keys:
+                keys["day"].append(np.full(matched, day, dtype=np.int64))
+            if "week" in keys:
+                # Weeks start on Monday; epoch day 0 was a Thursday
+                keys["week"].append(np.full(matched, day - (day + 3) % 7, dtype=np.int64))
+        if not users:
+            return []
+
+        users = np.concatenate(users)
+        durations = np.concatenate(durations).astype(np.float64)
+        # Factorize each key, then fold them into one int64 group code
+        levels, combined = [], np.zeros(len(users), dtype=np.int64)
+        for key in group_by:
+            values, codes = np.unique(np.concatenate(keys[key]), return_inverse=True)
+            levels.append(values)
+            combined = combined * len(values) + codes.reshape(-1)
+        group_codes, inverse = np.unique(combined, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        n = len(group_codes)
+        counts = np.bincount(inverse, minlength=n)
+        totals = np.bincount(inverse, weights=durations, minlength=n)
+        user_ids, user_codes = np.unique(users, return_inverse=True)
+        learner_groups = np.unique(inverse * len(user_ids) + user_codes.reshape(-1)) // len(user_ids)
+        learners = np.bincount(learner_groups, minlength=n)
+
+        # Unfold the group codes back into per-key values
+        positions = []
+        for values in reversed(levels):
+            positions.append(group_codes % len(values))
+            group_codes = group_codes // len(values)
+        positions.reverse()
+
+        results = []
+        for g in range(n):
+            row = {}
+            for k, key in enumerate(group_by):
+                value = int(levels[k][positions[k][g]])
+                if key in DICTIONARY_COLUMNS:
+                    row[key] = dictionaries[key][value]
+                elif key in ("day", "week"):
+                    row[key] = (EPOCH + timedelta(days=value)).isoformat()
+                else:
+                    row[key] = value
+            row["interactions"] = int(counts[g])
+            row["learners"] = int(learners[g])
+            row["total_duration_seconds"] = int(totals[g])
+            row["avg_duration_seconds"] = float(totals[g] / counts[g])
+            results.append(row)
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "rows": sum(self._rows.values()),
+            "partitions": len(self._rows),
+            "last_id": self.last_id,
+            "pending_ids": len(self._pending),
+            "fed": self.fed,
+            "skipped_feeds": self.skipped,
+            "failed": self.failed,
+            "last_feed_ms": round(self.last_feed_ms, 3),
+        }
+
+event_store = EventStore(path=settings.EVENT_STORE_PATH, refresh_interval=settings.EVENT_STORE_REFRESH_SECONDS)
+
+metrics.register("event_store", event_store.stats)
@@ -0,0 +1,129 @@
+"""
+Approximate per-content analytics
+
+Unique learners (HyperLogLog, overall and per day) and the distributions
+of quiz scores and of time spent by the time an item was completed (KLL)
+are kept per content item. They are not touched on the write path: the
+rollup compactor folds new rows into them in the same transaction as the
+daily rollups, so every source row counts once, and reading them costs
+the same however long the history is.
+
+They therefore trail writes by up to `ROLLUP_COMPACT_INTERVAL_SECONDS`
+(30s by default), plus the interaction / progress write-behind flush when
+buffering is enabled.
+"""
+
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Optional, Set, Tuple, List
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import dialect_insert
+from app.models import ContentSketch, ContentDailySketch
+from app.core.sketches import HyperLogLog, KLLSketch
+from app.services.response_cache import invalidate_on_commit
+
+# Keys per sketch lookup query
+SKETCH_CHUNK = 500
+
+class SketchUpdates:
+    """Values collected during one compaction, applied with `apply_sketch_updates`."""
+
+    def __init__(self):
+        self.learners: Dict[int, Set[int]] = defaultdict(set)
+        self.daily_learners: Dict[Tuple[int, date], Set[int]] = defaultdict(set)
+        self.quiz_scores: Dict[int, List[float]] = defaultdict(list)
+        self.completion_minutes: Dict[int, List[float]] = defaultdict(list)
+
+    def add_learner(self, content_id: int, day: date, user_id: int) -> None:
+        self.learners[content_id].add(user_id)
+        self.daily_learners[(content_id, day)].add(user_id)
+
+async def apply_sketch_updates(db: AsyncSession, updates: SketchUpdates) -> None:
+    """Merge collected values into the stored sketches. Does not commit."""
+    content_ids = sorted(set(updates.learners) | set(updates.quiz_scores) | set(updates.completion_minutes))
+    invalidate_on_commit(db, *(f"content-activity:{content_id}" for content_id in content_ids))
+    existing = {}
+    for i in range(0, len(content_ids), SKETCH_CHUNK):
+        for sketch in await db.scalars(select(ContentSketch).where(
+            ContentSketch.content_id.in_(content_ids[i:i + SKETCH_CHUNK])
+        )):
+            existing[sketch.content_id] = sketch
+
+    rows = []
+    for content_id in content_ids:
+        stored = existing.get(content_id)
+        row = {
+            "content_id": content_id,
+            "learners": stored.learners if stored else None,
+            "quiz_scores": stored.quiz_scores if stored else None,
+            "completion_minutes": stored.completion_minutes if stored else None,
+        }
+        if content_id in updates.learners:
+            learners = HyperLogLog.from_bytes(row["learners"])
+            learners.add(updates.learners[content_id])
+            row["learners"] = learners.to_bytes()
+        for column, values in (("quiz_scores", updates.quiz_scores), ("completion_minutes", updates.completion_minutes)):
+            if content_id in values:
+                sketch = KLLSketch.from_bytes(row[column])
+                sketch.add(values[content_id])
+                row[column] = sketch.to_bytes()
+        rows.append(row)
+    if rows:
+        stmt = dialect_insert(ContentSketch)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=["content_id"],
+            set_={column: stmt.excluded[column] for column in ("learners", "quiz_scores", "completion_minutes")},
+        ), rows)
+
+    keys = list(updates.daily_learners)
+    daily = {}
+    for i in range(0, len(keys), SKETCH_CHUNK):
+        for sketch in await db.scalars(select(ContentDailySketch).where(
+            tuple_(ContentDailySketch.content_id, ContentDailySketch.day).in_(keys[i:i + SKETCH_CHUNK])
+        )):
+            daily[(sketch.content_id, sketch.day)] = sketch.learners
+    rows = []
+    for (content_id, day), user_ids in updates.daily_learners.items():
+        learners = HyperLogLog.from_bytes(daily.get((content_id, day)))
+        learners.add(user_ids)
+        rows.append({"content_id": content_id, "day": day, "learners": learners.to_bytes()})
+    if rows:
+        stmt = dialect_insert(ContentDailySketch)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=["content_id", "day"],
+            set_={"learners": stmt.excluded.learners},
+        ), rows)
+
+def _quantile(data: Optional[bytes], q: float) -> Optional[float]:
+    value = KLLSketch.from_bytes(data).quantile(q)
+    return round(value, 2) if value is not None else None
+
+async def get_content_sketch_summary(db: AsyncSession, content_id: int) -> dict:
+    """Unique learners and quiz-score / completion-time percentiles for one item."""
+    sketch = await db.get(ContentSketch, content_id)
+    if sketch is None:
+        return {
+            "unique_learners": 0,
+            "quiz_score_p50": None,
+            "quiz_score_p90": None,
+            "completion_minutes_p50": None,
+            "completion_minutes_p90": None,
+        }
+    return {
+        "unique_learners": HyperLogLog.from_bytes(sketch.learners).count(),
+        "quiz_score_p50": _quantile(sketch.quiz_scores, 0.5),
+        "quiz_score_p90": _quantile(sketch.quiz_scores, 0.9),
+        "completion_minutes_p50": _quantile(sketch.completion_minutes, 0.5),
+        "completion_minutes_p90": _quantile(sketch.completion_minutes, 0.9),
+    }
+
+async def get_daily_unique_learners(db: AsyncSession, content_id: int, since: date) -> Dict[date, int]:
+    """Approximate distinct learners per day for one item, from `since` on."""
+    sketches = await db.execute(select(ContentDailySketch.day, ContentDailySketch.learners).where(
+        ContentDailySketch.content_id == content_id,
+        ContentDailySketch.day >= since
+    ))
+    return {day: HyperLogLog.from_bytes(learners).count() for day, learners in sketches}
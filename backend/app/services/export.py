@@ -0,0 +1,145 @@
+"""
+Streaming data export
+
+Dumps `content_interactions` and `progress_records` as CSV or NDJSON with
+server-side cursors: rows are fetched, encoded and (optionally) gzipped
+one batch at a time, so memory stays flat regardless of export size. The
+API streams with an async session; the CLI uses the sync engine.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from typing import AsyncIterator, BinaryIO, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.database import AsyncSessionLocal
+from app.models import ContentInteraction, ProgressRecord
+
+EXPORT_BATCH_SIZE = 5000
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+class ExportDataset(NamedTuple):
+    model: type
+    columns: list
+    changed_at: object  # column expression the time-range filter applies to
+
+DATASETS = {
+    "interactions": ExportDataset(
+        ContentInteraction,
+        [
+            ContentInteraction.id,
+            ContentInteraction.user_id,
+            ContentInteraction.content_id,
+            ContentInteraction.interaction_type,
+            ContentInteraction.format_used,
+            ContentInteraction.timestamp,
+            ContentInteraction.duration_seconds,
+            ContentInteraction.interaction_metadata,
+        ],
+        ContentInteraction.timestamp,
+    ),
+    "progress": ExportDataset(
+        ProgressRecord,
+        [column for column in ProgressRecord.__table__.columns],
+        func.coalesce(ProgressRecord.updated_at, ProgressRecord.created_at),
+    ),
+}
+
+def export_statement(dataset: str, user_id: Optional[int] = None,
+                     since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """SELECT for one dataset in id order, with optional user and time-range filters."""
+    spec = DATASETS[dataset]
+    stmt = select(*spec.columns).order_by(spec.model.id)
+    if user_id is not None:
+        stmt = stmt.where(spec.model.user_id == user_id)
+    if since is not None:
+        stmt = stmt.where(spec.changed_at >= since)
+    if until is not None:
+        stmt = stmt.where(spec.changed_at < until)
+    return stmt.execution_options(yield_per=EXPORT_BATCH_SIZE, stream_results=True)
+
+def column_names(dataset: str) -> List[str]:
+    return [column.key for column in DATASETS[dataset].columns]
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def encode_header(names: List[str], fmt: str) -> bytes:
+    if fmt != "csv":
+        return b""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(names)
+    return buffer.getvalue().encode()
+
+def encode_rows(rows: Iterable, names: List[str], fmt: str) -> bytes:
+    """Encode one batch of rows as CSV lines or NDJSON records."""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([_csv_value(value) for value in row] for row in rows)
+        return buffer.getvalue().encode()
+    return "".join(
+        json.dumps(dict(zip(names, row)), default=_json_default) + "\n" for row in rows
+    ).encode()
+
+def gzip_compressor():
+    # wbits=31 writes a gzip header and trailer
+    return zlib.compressobj(6, zlib.DEFLATED, 31)
+
+async def stream_export(dataset: str, fmt: str, compress: bool = False, user_id: Optional[int] = None,
+                        since: Optional[datetime] = None, until: Optional[datetime] = None) -> AsyncIterator[bytes]:
+    """Yield the encoded (and optionally gzipped) export one batch at a time.
+
+    Uses its own session so the cursor outlives the request's dependencies.
+    """
+    names = column_names(dataset)
+    compressor = gzip_compressor() if compress else None
+
+    def emit(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor else data
+
+    header = emit(encode_header(names, fmt))
+    if header:
+        yield header
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(export_statement(dataset, user_id, since, until))
+        async for rows in result.partitions():
+            chunk = emit(encode_rows(rows, names, fmt))
+            if chunk:
+                yield chunk
+    if compressor:
+        yield compressor.flush()
+
+def write_export(db: Session, out: BinaryIO, dataset: str, fmt: str, compress: bool = False,
+                 user_id: Optional[int] = None, since: Optional[datetime] = None,
+                 until: Optional[datetime] = None) -> int:
+    """Write an export to a binary file object; returns the number of rows written."""
+    names = column_names(dataset)
+    compressor = gzip_compressor() if compress else None
+    count = 0
+
+    def emit(data: bytes) -> None:
+        out.write(compressor.compress(data) if compressor else data)
+
+    emit(encode_header(names, fmt))
+    for rows in db.execute(export_statement(dataset, user_id, since, until)).partitions():
+        emit(encode_rows(rows, names, fmt))
+        count += len(rows)
+    if compressor:
+        out.write(compressor.flush())
+    return count
@@ -0,0 +1,123 @@
+"""
+Materialized format-usage counters
+
+`content_format_counts` and `user_format_counts` hold how many interactions
+a user recorded per format, so the adaptive endpoint reads a handful of
+rows instead of scanning the user's full interaction history. Counters are
+bumped in the same transaction as the interaction insert.
+"""
+
+from collections import Counter
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import delete, func, insert, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database import dialect_insert
+from app.models import ContentInteraction, ContentFormatCount, UserFormatCount, InteractionMonthlySummary
+from app.services.response_cache import invalidate_on_commit
+
+async def increment_format_counts(db: AsyncSession, events: Iterable[Tuple[int, int, str]]) -> None:
+    """Add interactions, given as (user_id, content_id, format_used), to the counters.
+
+    Does not commit; callers commit together with the interaction rows.
+    """
+    per_content = Counter(events)
+    if not per_content:
+        return
+    per_user: Counter = Counter()
+    for (user_id, _, format_used), count in per_content.items():
+        per_user[(user_id, format_used)] += count
+    # Every interaction write passes through here; cached analytics follow it
+    invalidate_on_commit(db, *{f"content-activity:{content_id}" for _, content_id, _ in per_content})
+
+    stmt = dialect_insert(ContentFormatCount)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "content_id", "format_used"],
+        set_={"count": ContentFormatCount.count + stmt.excluded["count"]},
+    )
+    await db.execute(stmt, [
+        {"user_id": user_id, "content_id": content_id, "format_used": format_used, "count": count}
+        for (user_id, content_id, format_used), count in per_content.items()
+    ])
+
+    stmt = dialect_insert(UserFormatCount)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "format_used"],
+        set_={"count": UserFormatCount.count + stmt.excluded["count"]},
+    )
+    await db.execute(stmt, [
+        {"user_id": user_id, "format_used": format_used, "count": count}
+        for (user_id, format_used), count in per_user.items()
+    ])
+
+async def get_content_format_counts(db: AsyncSession, user_id: int, content_id: int) -> Dict[str, int]:
+    """Per-format interaction counts for one user on one piece of content."""
+    result = await db.execute(select(ContentFormatCount.format_used, ContentFormatCount.count).where(
+        ContentFormatCount.user_id == user_id,
+        ContentFormatCount.content_id == content_id
+    ))
+    return {row.format_used: row.count for row in result}
+
+async def get_format_counts_for_contents(db: AsyncSession, user_id: int, content_ids: Iterable[int]) -> Dict[int, Dict[str, int]]:
+    """Per-format counts for one user over many content items, in one query."""
+    result = await db.execute(select(
+        ContentFormatCount.content_id,
+        ContentFormatCount.format_used,
+        ContentFormatCount.count
+    ).where(
+        ContentFormatCount.user_id == user_id,
+        ContentFormatCount.content_id.in_(list(content_ids))
+    ))
+    counts: Dict[int, Dict[str, int]] = {}
+    for row in result:
+        counts.setdefault(row.content_id, {})[row.format_used] = row.count
+    return counts
+
+async def get_user_format_counts(db: AsyncSession, user_id: int) -> Dict[str, int]:
+    """Per-format interaction counts for one user across all content."""
+    result = await db.execute(select(UserFormatCount.format_used, UserFormatCount.count).where(
+        UserFormatCount.user_id == user_id
+    ))
+    return {row.format_used: row.count for row in result}
+
+def backfill_format_counts(db: Session) -> None:
+    """Rebuild both counter tables from the raw content_interactions rows
+    and the monthly summaries of compacted history."""
+    events = union_all(
+        select(
+            ContentInteraction.user_id,
+            ContentInteraction.content_id,
+            ContentInteraction.format_used,
+            func.count(ContentInteraction.id).label("count")
+        ).group_by(ContentInteraction.user_id, ContentInteraction.content_id, ContentInteraction.format_used),
+        select(
+            InteractionMonthlySummary.user_id,
+            InteractionMonthlySummary.content_id,
+            InteractionMonthlySummary.format_used,
+            func.sum(InteractionMonthlySummary.count).label("count")
+        ).group_by(
+            InteractionMonthlySummary.user_id, InteractionMonthlySummary.content_id, InteractionMonthlySummary.format_used
+        )
+    ).subquery()
+    db.execute(delete(ContentFormatCount))
+    db.execute(delete(UserFormatCount))
+    db.execute(insert(ContentFormatCount).from_select(
+        ["user_id", "content_id", "format_used", "count"],
+        select(
+            events.c.user_id,
+            events.c.content_id,
+            events.c.format_used,
+            func.sum(events.c.count)
+        ).group_by(events.c.user_id, events.c.content_id, events.c.format_used)
+    ))
+    db.execute(insert(UserFormatCount).from_select(
+        ["user_id", "format_used", "count"],
+        select(
+            ContentFormatCount.user_id,
+            ContentFormatCount.format_used,
+            func.sum(ContentFormatCount.count)
+        ).group_by(ContentFormatCount.user_id, ContentFormatCount.format_used)
+    ))
+    db.commit()
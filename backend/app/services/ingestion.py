@@ -0,0 +1,268 @@
+"""
+Buffered interaction ingestion
+
+Interaction events are acknowledged as soon as they are queued. A
+background flusher bulk-inserts them in batches (by size or every
+`flush_interval_ms`) and bumps the format counters in the same
+transaction, so the hot write path no longer pays one commit per event.
+A batch that fails to commit is retried with exponential backoff and then
+written row by row, so only the rows that cannot be stored are dropped.
+Bulk uploads from offline clients are streamed straight into chunked
+inserts by `ingest_interaction_stream`.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.models import Content, ContentInteraction
+from app.schemas import InteractionCreate
+from app.core import metrics
+from app.core.config import settings
+from app.core.streaming import RecordError
+from app.services.catalog import catalog_index
+from app.services.format_counts import increment_format_counts
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# Rows per executemany batch for bulk uploads
+BULK_INSERT_CHUNK = 1000
+MAX_REPORTED_ERRORS = 1000
+
+class IngestionBackpressure(Exception):
+    """Raised when the queue stays full for longer than the enqueue timeout."""
+
+class InteractionIngestor:
+    def __init__(self, max_queue: int, batch_size: int, flush_interval_ms: int, enqueue_timeout: float,
+                 flush_attempts: int = 3, retry_delay: float = 0.2):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.enqueue_timeout = enqueue_timeout
+        self.flush_attempts = max(1, flush_attempts)
+        self.retry_delay = retry_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._accepting = False
+        self.enqueued = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.failed = 0
+        self.retries = 0
+        self.row_fallbacks = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+        self.last_lag_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._accepting
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._accepting = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop accepting events and wait until everything queued is flushed."""
+        if self._task is None:
+            return
+        self._accepting = False
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def submit(self, record: dict) -> None:
+        """Queue one interaction row; waits up to `enqueue_timeout` when full."""
+        record["_enqueued_at"] = time.monotonic()
+        try:
+            await asyncio.wait_for(self._queue.put(record), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise IngestionBackpressure()
+        self.enqueued += 1
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _write(self, rows: List[dict]) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(ContentInteraction), rows)
+            await increment_format_counts(
+                db, [(row["user_id"], row["content_id"], row["format_used"]) for row in rows]
+            )
+            await db.commit()
+
+    async def _flush(self, batch: List[dict]) -> None:
+        oldest = min(record.pop("_enqueued_at") for record in batch)
+        started = time.perf_counter()
+        written = len(batch)
+        for attempt in range(self.flush_attempts):
+            try:
+                await self._write(batch)
+                break
+            except Exception:
+                if attempt + 1 == self.flush_attempts:
+                    logger.exception("Failed to flush %d interactions, writing them one by one", len(batch))
+                    written = await self._write_rows(batch)
+                    break
+                # Transient errors (e.g. a locked database) usually clear quickly
+                self.retries += 1
+                await asyncio.sleep(self.retry_delay * 2 ** attempt)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.flushed += written
+        self.batches += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+        self.last_lag_ms = (time.monotonic() - oldest) * 1000
+
+    async def _write_rows(self, batch: List[dict]) -> int:
+        """Isolate the rows that cannot be stored; returns how many were written."""
+        self.row_fallbacks += 1
+        written = 0
+        for row in batch:
+            try:
+                await self._write([row])
+                written += 1
+            except Exception:
+                self.failed += 1
+                logger.warning(
+                    "Dropping interaction for user %s on content %s", row["user_id"], row["content_id"], exc_info=True
+                )
+        return written
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_capacity": self.max_queue,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "row_fallbacks": self.row_fallbacks,
+            "batches": self.batches,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "avg_flush_ms": round(self.total_flush_ms / self.batches, 3) if self.batches else 0.0,
+            "last_enqueue_to_commit_ms": round(self.last_lag_ms, 3),
+        }
+
+async def ingest_interaction_stream(db: AsyncSession, user_id: int, records: AsyncIterator) -> dict:
+    """Validate and insert a stream of (record number, object) interaction records.
+
+    Rows are inserted in chunked executemany batches; content ids are checked
+    against the catalog index, with one query per chunk for ids it doesn't know.
+    """
+    await catalog_index.refresh(db)
+    known_ids: Set[int] = set()
+    missing_ids: Set[int] = set()
+    pending: List[Tuple[int, dict]] = []
+    summary = {"accepted": 0, "rejected": 0, "errors": []}
+    now = datetime.now(timezone.utc)
+
+    def reject(number: int, error: str) -> None:
+        summary["rejected"] += 1
+        if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+            summary["errors"].append({"line": number, "error": error})
+
+    async def flush() -> None:
+        unknown = {
+            row["content_id"] for _, row in pending
+            if row["content_id"] not in catalog_index and row["content_id"] not in known_ids
+        } - missing_ids
+        if unknown:
+            found = set((await db.execute(select(Content.id).where(Content.id.in_(unknown)))).scalars())
+            known_ids.update(found)
+            missing_ids.update(unknown - found)
+        rows = []
+        for number, row in pending:
+            if row["content_id"] in missing_ids:
+                reject(number, "Content not found")
+            else:
+                rows.append(row)
+        pending.clear()
+        if rows:
+            await db.execute(insert(ContentInteraction), rows)
+            await increment_format_counts(db, [(row["user_id"], row["content_id"], row["format_used"]) for row in rows])
+            await db.commit()
+            summary["accepted"] += len(rows)
+
+    async for number, value in records:
+        if isinstance(value, RecordError):
+            reject(number, str(value))
+            continue
+        try:
+            interaction = InteractionCreate.model_validate(value)
+        except ValidationError as exc:
+            error = exc.errors()[0]
+            location = ".".join(str(part) for part in error["loc"])
+            reject(number, f"{location}: {error['msg']}" if location else error["msg"])
+            continue
+        pending.append((number, {
+            "user_id": user_id,
+            "content_id": interaction.content_id,
+            "interaction_type": interaction.interaction_type,
+            "format_used": interaction.format_used,
+            "duration_seconds": interaction.duration_seconds,
+            "interaction_metadata": interaction.interaction_metadata,
+            "timestamp": now,
+        }))
+        if len(pending) >= BULK_INSERT_CHUNK:
+            await flush()
+    if pending:
+        await flush()
+    summary["errors"].sort(key=lambda error: error["line"])
+    return summary
+
+interaction_ingestor = InteractionIngestor(
+    max_queue=settings.INTERACTION_QUEUE_SIZE,
+    batch_size=settings.INTERACTION_BATCH_SIZE,
+    flush_interval_ms=settings.INTERACTION_FLUSH_INTERVAL_MS,
+    enqueue_timeout=settings.INTERACTION_ENQUEUE_TIMEOUT_SECONDS,
+    flush_attempts=settings.INTERACTION_FLUSH_ATTEMPTS,
+    retry_delay=settings.INTERACTION_FLUSH_RETRY_SECONDS,
+)
+
+metrics.register("interaction_ingestion", interaction_ingestor.stats)
@@ -0,0 +1,79 @@
+"""
+Startup and shutdown hooks shared by the API entrypoints
+"""
+
+import asyncio
+import logging
+from typing import List
+
+from app.database import AsyncSessionLocal, async_engine
+from app.core.config import settings
+from app.services.catalog import catalog_index
+from app.services.search import search_index
+from app.services.ranking import ranking_engine
+from app.services.similarity import item_similarity
+from app.services.recommendations import recommendation_cache
+from app.services.rollups import rollup_compactor
+from app.services.columnar import event_store
+from app.services.retention import interaction_retention
+from app.services.assessment import question_cache
+from app.services.ingestion import interaction_ingestor
+from app.services.progress import progress_coalescer
+from app.services.sessions import revocation_list
+
+logger = logging.getLogger(__name__)
+
+_background_tasks: List[asyncio.Task] = []
+
+async def warm_content_indexes():
+    """Build the in-memory content indexes and question bundle before the first request needs them."""
+    try:
+        async with AsyncSessionLocal() as db:
+            await catalog_index.refresh(db, force=True)
+            await search_index.refresh(db, force=True)
+            await ranking_engine.refresh(db)
+            await question_cache.refresh(db, force=True)
+    except Exception:
+        logger.exception("Failed to warm content indexes")
+
+async def warm_item_similarity():
+    """Load the persisted item-item matrix and catch up on newer interactions."""
+    try:
+        await item_similarity.restore()
+        async with AsyncSessionLocal() as db:
+            await item_similarity.refresh(db, force=True)
+    except Exception:
+        logger.exception("Failed to warm item similarity index")
+
+async def start_background_services():
+    await revocation_list.start()
+    if settings.INTERACTION_BUFFER_ENABLED:
+        await interaction_ingestor.start()
+    if settings.PROGRESS_COALESCE_ENABLED:
+        await progress_coalescer.start()
+    await rollup_compactor.start()
+    await event_store.start()
+    if settings.INTERACTION_RETENTION_DAYS > 0:
+        await interaction_retention.start()
+    _background_tasks.append(asyncio.create_task(warm_content_indexes()))
+    _background_tasks.append(asyncio.create_task(warm_item_similarity()))
+
+async def stop_background_services():
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    _background_tasks.clear()
+    await recommendation_cache.stop()
+    await revocation_list.stop()
+    await interaction_retention.stop()
+    # Drain buffered writes before the engine goes away
+    await interaction_ingestor.stop()
+    await progress_coalescer.stop()
+    await rollup_compactor.stop()
+    await event_store.stop()
+    if item_similarity.pairs:
+        try:
+            await asyncio.to_thread(item_similarity.save)
+        except Exception:
+            logger.exception("Failed to persist item similarity index")
+    await async_engine.dispose()
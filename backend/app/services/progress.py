@@ -0,0 +1,197 @@
+"""
+Progress writes
+
+Progress is stored as one row per (user, content), written with a single
+`INSERT ... ON CONFLICT DO UPDATE`. When `PROGRESS_COALESCE_ENABLED` is set,
+player heartbeats (position, time spent, completion percentage) are merged
+in memory per (user, content) and flushed every
+`PROGRESS_FLUSH_INTERVAL_SECONDS`, so database writes no longer scale with
+heartbeat frequency. Completion and quiz updates always write through,
+after any flush already carrying older state for the same pair has
+landed, so the batch can never overwrite them.
+"""
+
+import asyncio
+import logging
+from itertools import groupby
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database import AsyncSessionLocal, dialect_insert
+from app.models import ProgressRecord
+from app.core import metrics
+from app.core.config import settings
+from app.services.response_cache import invalidate_on_commit
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_FIELDS = frozenset({"completion_percentage", "time_spent_minutes", "last_position"})
+
+def is_heartbeat(fields: dict) -> bool:
+    return bool(fields) and fields.keys() <= HEARTBEAT_FIELDS
+
+def _upsert_statement(columns):
+    stmt = dialect_insert(ProgressRecord)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "content_id"],
+        set_={**{column: stmt.excluded[column] for column in columns}, "updated_at": func.now()},
+    )
+
+def _row_columns(row: dict) -> tuple:
+    return tuple(sorted(row))
+
+async def upsert_progress(db: AsyncSession, user_id: int, content_id: int, fields: dict) -> ProgressRecord:
+    """Create or update one progress row in a single statement. Does not commit."""
+    stmt = _upsert_statement(fields).values(user_id=user_id, content_id=content_id, **fields)
+    invalidate_on_commit(db, f"content-activity:{content_id}")
+    result = await db.scalars(stmt.returning(ProgressRecord), execution_options={"populate_existing": True})
+    return result.one()
+
+async def upsert_progress_batch(db: AsyncSession, updates: Dict[Tuple[int, int], dict]) -> None:
+    """Upsert many (user_id, content_id) -> fields updates. Does not commit.
+
+    Rows are grouped by the set of fields they touch so each group is one
+    executemany.
+    """
+    rows = sorted(
+        ({"user_id": user_id, "content_id": content_id, **fields} for (user_id, content_id), fields in updates.items()),
+        key=_row_columns,
+    )
+    invalidate_on_commit(db, *{f"content-activity:{content_id}" for _, content_id in updates})
+    for columns, group in groupby(rows, key=_row_columns):
+        fields = [column for column in columns if column not in ("user_id", "content_id")]
+        await db.execute(_upsert_statement(fields), list(group))
+
+class ProgressCoalescer:
+    """Write-behind buffer holding the latest heartbeat state per (user, content)."""
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._pending: Dict[Tuple[int, int], dict] = {}
+        # Keys of the batch currently being written, held under _flush_lock
+        self._inflight: Set[Tuple[int, int]] = set()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.merged = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the periodic flush and write out whatever is still pending."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+
+    def merge(self, user_id: int, content_id: int, fields: dict) -> dict:
+        """Fold a heartbeat into the pending state and return the merged fields."""
+        state = self._pending.setdefault((user_id, content_id), {})
+        state.update(fields)
+        self.merged += 1
+        return dict(state)
+
+    def pending(self, user_id: int, content_id: int) -> Optional[dict]:
+        state = self._pending.get((user_id, content_id))
+        return dict(state) if state is not None else None
+
+    async def take(self, user_id: int, content_id: int) -> dict:
+        """Remove and return the pending state so a write-through can include it.
+
+        If a flush is writing this pair, wait for it: its older state must
+        commit before the write-through, not after.
+        """
+        key = (user_id, content_id)
+        if key in self._inflight:
+            async with self._flush_lock:
+                pass
+        return self._pending.pop(key, {})
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            updates, self._pending = self._pending, {}
+            self._inflight = set(updates)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await upsert_progress_batch(db, updates)
+                    await db.commit()
+            except Exception:
+                self.failed += len(updates)
+                logger.exception("Failed to flush %d progress updates", len(updates))
+                # Keep the state for the next attempt; anything merged since wins
+                for key, fields in updates.items():
+                    self._pending[key] = {**fields, **self._pending.get(key, {})}
+                return
+            finally:
+                self._inflight = set()
+            self.written += len(updates)
+            self.flushes += 1
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "pending": len(self._pending),
+            "merged": self.merged,
+            "written": self.written,
+            "failed": self.failed,
+            "flushes": self.flushes,
+        }
+
+def _progress_unique_index():
+    return next(index for index in ProgressRecord.__table__.indexes if index.unique)
+
+def has_progress_unique_index(bind: Engine) -> bool:
+    name = _progress_unique_index().name
+    return any(existing["name"] == name for existing in inspect(bind).get_indexes(ProgressRecord.__tablename__))
+
+def ensure_progress_unique_index(bind: Engine) -> None:
+    """Add the (user, content) unique index to databases created before it existed.
+
+    Duplicate rows left by racing inserts are removed first, keeping the
+    most recently updated row per pair. This is a one-off migration run by
+    `scripts/init_db.py`, not at app startup.
+    """
+    index = _progress_unique_index()
+    if has_progress_unique_index(bind):
+        return
+    ranked = select(
+        ProgressRecord.id,
+        func.row_number().over(
+            partition_by=(ProgressRecord.user_id, ProgressRecord.content_id),
+            order_by=(
+                func.coalesce(ProgressRecord.updated_at, ProgressRecord.created_at).desc().nulls_last(),
+                ProgressRecord.id.desc(),
+            ),
+        ).label("rank"),
+    ).subquery()
+    stale = select(ranked.c.id).where(ranked.c.rank > 1)
+    with Session(bind) as db:
+        removed = db.execute(delete(ProgressRecord).where(ProgressRecord.id.in_(stale))).rowcount
+        db.commit()
+    index.create(bind=bind)
+    logger.info("Created %s after removing %d duplicate progress rows", index.name, removed)
+
+progress_coalescer = ProgressCoalescer(flush_interval=settings.PROGRESS_FLUSH_INTERVAL_SECONDS)
+
+metrics.register("progress_coalescer", progress_coalescer.stats)
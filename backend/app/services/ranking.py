@@ -0,0 +1,182 @@
+"""
+Personalized recommendation ranking
+
+Keeps NumPy feature columns for the active catalog (format availability
+bitmask, difficulty, duration, subject code and popularity), rebuilt
+whenever the catalog index changes. A user's candidates are scored in one
+vectorized pass: per-user weights are computed for the few distinct
+feature values (16 format masks, 3 difficulty levels, each subject) and
+gathered per item, and the top k is taken with `argpartition`.
+"""
+
+import asyncio
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import ContentFormatCount
+from app.core.config import settings
+from app.services.adaptive import FORMATS, STYLE_PREFERENCES, normalize_style
+from app.services.catalog import CatalogEntry, CatalogIndex, catalog_index
+
+STYLES = tuple(STYLE_PREFERENCES)
+DIFFICULTY_LEVELS = {"beginner": 0, "intermediate": 1, "advanced": 2}
+
+# Relative weight of each score component
+WEIGHTS = {
+    "format": 0.45,
+    "subject": 0.2,
+    "difficulty": 0.15,
+    "popularity": 0.1,
+    "duration": 0.05,
+    "in_progress": 0.05,
+}
+
+def _style_format_affinity() -> np.ndarray:
+    """(styles, formats) matrix: 1 for the primary format, .5 secondary, .25 fallback."""
+    affinity = np.zeros((len(STYLES), len(FORMATS)))
+    for i, style in enumerate(STYLES):
+        (primary, secondary), fallback = STYLE_PREFERENCES[style]
+        affinity[i, FORMATS.index(primary)] = 1.0
+        affinity[i, FORMATS.index(secondary)] = 0.5
+        affinity[i, FORMATS.index(fallback)] = 0.25
+    return affinity
+
+STYLE_FORMAT_AFFINITY = _style_format_affinity()
+
+def style_vector(learning_style: Optional[str], assessment_score: Optional[Dict[str, int]]) -> np.ndarray:
+    """Normalized weight per style, from assessment scores when available."""
+    if assessment_score:
+        scores = np.array([max(assessment_score.get(style, 0), 0) for style in STYLES], dtype=float)
+        if scores.sum() > 0:
+            return scores / scores.sum()
+    vector = np.zeros(len(STYLES))
+    vector[STYLES.index(normalize_style(learning_style))] = 1.0
+    return vector
+
+class CatalogFeatures(NamedTuple):
+    ids: np.ndarray            # sorted content ids
+    format_masks: np.ndarray   # bit i set when FORMATS[i] is available
+    difficulty: np.ndarray     # DIFFICULTY_LEVELS ordinal
+    duration: np.ndarray
+    subject_codes: np.ndarray  # index into `subjects`
+    subjects: List[str]
+    static_score: np.ndarray   # user-independent popularity + duration part
+
+def build_features(entries: List[CatalogEntry], popularity: Dict[int, int]) -> CatalogFeatures:
+    entries = sorted(entries, key=lambda entry: entry.id)
+    n = len(entries)
+    ids = np.fromiter((entry.id for entry in entries), dtype=np.int64, count=n)
+    format_masks = np.fromiter(
+        (sum(1 << bit for bit, fmt in enumerate(FORMATS) if fmt in entry.formats) for entry in entries),
+        dtype=np.uint8, count=n
+    )
+    difficulty = np.fromiter(
+        (DIFFICULTY_LEVELS.get(entry.difficulty_level, 1) for entry in entries), dtype=np.int8, count=n
+    )
+    duration = np.fromiter((entry.duration_minutes for entry in entries), dtype=np.float32, count=n)
+    subjects, codes = np.unique([entry.subject.lower() for entry in entries] or [""], return_inverse=True)
+    return CatalogFeatures(
+        ids=ids,
+        format_masks=format_masks,
+        difficulty=difficulty,
+        duration=duration,
+        subject_codes=codes[:n].astype(np.int32),
+        subjects=subjects.tolist(),
+        static_score=_static_score(ids, duration, popularity),
+    )
+
+def _static_score(ids: np.ndarray, duration: np.ndarray, popularity: Dict[int, int]) -> np.ndarray:
+    counts = np.fromiter((popularity.get(int(i), 0) for i in ids), dtype=np.float32, count=len(ids))
+    peak = np.log1p(counts.max()) if len(counts) else 0.0
+    normalized = np.log1p(counts) / peak if peak > 0 else counts
+    return (
+        WEIGHTS["popularity"] * normalized
+        + WEIGHTS["duration"] * (1.0 - np.minimum(duration, 120.0) / 120.0)
+    ).astype(np.float32)
+
+class RankingEngine:
+    def __init__(self, catalog: CatalogIndex, popularity_refresh: float):
+        self.catalog = catalog
+        self.popularity_refresh = popularity_refresh
+        self._lock = asyncio.Lock()
+        self._catalog_version = -1
+        self._popularity: Dict[int, int] = {}
+        self._popularity_checked_at: Optional[float] = None
+        self.features = build_features([], {})
+
+    async def refresh(self, db: AsyncSession) -> None:
+        await self.catalog.refresh(db)
+        now = time.monotonic()
+        popularity_stale = (
+            self._popularity_checked_at is None or now - self._popularity_checked_at >= self.popularity_refresh
+        )
+        if not popularity_stale and self.catalog.version == self._catalog_version:
+            return
+        async with self._lock:
+            if popularity_stale:
+                result = await db.execute(
+                    select(ContentFormatCount.content_id, func.sum(ContentFormatCount.count))
+                    .group_by(ContentFormatCount.content_id)
+                )
+                self._popularity = {content_id: total for content_id, total in result}
+                self._popularity_checked_at = now
+            version = self.catalog.version
+            if version != self._catalog_version:
+                # Build off the event loop and swap in whole; readers keep the old snapshot
+                self.features = await asyncio.to_thread(build_features, self.catalog.entries(), self._popularity)
+                self._catalog_version = version
+            else:
+                features = self.features
+                self.features = features._replace(
+                    static_score=_static_score(features.ids, features.duration, self._popularity)
+                )
+
+    def rank(self, styles: np.ndarray, completed: Iterable[int], in_progress: Iterable[int], limit: int) -> List[int]:
+        """Return up to `limit` content ids, best first, excluding completed ones."""
+        features = self.features
+        n = len(features.ids)
+        if n == 0 or limit <= 0:
+            return []
+        completed_rows = _positions(features.ids, completed)
+        started_rows = _positions(features.ids, in_progress)
+        history_rows = np.concatenate([completed_rows, started_rows])
+
+        # Best format fit per availability mask, for this learner's style mix
+        format_weights = styles @ STYLE_FORMAT_AFFINITY
+        mask_bits = (np.arange(16)[:, None] >> np.arange(len(FORMATS))) & 1
+        format_table = WEIGHTS["format"] * (mask_bits * format_weights).max(axis=1)
+
+        # Aim one level above the hardest completed item
+        target = min(int(features.difficulty[completed_rows].max()) + 1, 2) if len(completed_rows) else 0
+        difficulty_table = WEIGHTS["difficulty"] * (1.0 - np.abs(np.arange(3) - target) / 2.0)
+
+        score = features.static_score + format_table.astype(np.float32)[features.format_masks]
+        score += difficulty_table.astype(np.float32)[features.difficulty]
+
+        # Subjects the learner has engaged with, as a weighted one-hot lookup
+        if len(history_rows):
+            subject_weights = np.bincount(features.subject_codes[history_rows], minlength=len(features.subjects))
+            subject_table = WEIGHTS["subject"] * subject_weights / subject_weights.max()
+            score += subject_table.astype(np.float32)[features.subject_codes]
+
+        score[started_rows] += WEIGHTS["in_progress"]
+        score[completed_rows] = -np.inf
+        k = min(limit, n - len(completed_rows))
+        if k <= 0:
+            return []
+        top = np.argpartition(-score, k - 1)[:k]
+        top = top[np.lexsort((features.ids[top], -score[top]))]
+        return features.ids[top].tolist()
+
+def _positions(ids: np.ndarray, content_ids: Iterable[int]) -> np.ndarray:
+    """Row positions in the sorted `ids` array of the given ids that are present."""
+    content_ids = np.unique(np.fromiter(content_ids, dtype=np.int64))
+    found = np.searchsorted(ids, content_ids)
+    found = found[found < len(ids)]
+    return found[np.isin(ids[found], content_ids)]
+
+ranking_engine = RankingEngine(catalog_index, popularity_refresh=settings.RANKING_POPULARITY_REFRESH_SECONDS)
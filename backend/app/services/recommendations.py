@@ -0,0 +1,140 @@
+"""
+Per-user recommendation lists
+
+Ranked lists are cached per user. They only change when the user
+completes content, their learning profile changes or the catalog changes:
+
+- completion, profile and assessment changes call
+  `invalidate_recommendations`, and the next request recomputes;
+- an entry older than `ttl`, or computed against an older catalog version,
+  is still served for up to `stale_ttl` more seconds while a background
+  task recomputes it (stale-while-revalidate).
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.models import ProgressRecord
+from app.core import metrics
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.catalog import catalog_index
+from app.services.ranking import ranking_engine, style_vector
+
+logger = logging.getLogger(__name__)
+
+async def rank_for_user(db: AsyncSession, user_id: int, learning_style: Optional[str],
+                        assessment_score: Optional[Dict[str, int]], limit: int) -> List[int]:
+    """Rank the active catalog for one user, excluding completed content."""
+    result = await db.execute(select(ProgressRecord.content_id, ProgressRecord.is_completed).where(
+        ProgressRecord.user_id == user_id
+    ))
+    completed_ids, started_ids = [], []
+    for content_id, is_completed in result:
+        (completed_ids if is_completed else started_ids).append(content_id)
+
+    await ranking_engine.refresh(db)
+    return ranking_engine.rank(style_vector(learning_style, assessment_score), completed_ids, started_ids, limit)
+
+class CachedRecommendations(NamedTuple):
+    content_ids: List[int]
+    computed_at: float
+    catalog_version: int
+
+class RecommendationCache:
+    def __init__(self, maxsize: int, ttl: float, stale_ttl: float, depth: int):
+        self.ttl = ttl
+        self.depth = depth
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl + stale_ttl)
+        # user_id -> time of the last invalidation, so a computation that
+        # started before it does not store an outdated list
+        self._invalidated = TTLCache(maxsize=maxsize, ttl=ttl + stale_ttl)
+        self._refreshing: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.stale_served = 0
+        self.background_refreshes = 0
+        self.invalidations = 0
+
+    async def get(self, db: AsyncSession, user_id: int, learning_style: Optional[str],
+                  assessment_score: Optional[Dict[str, int]], limit: int) -> List[int]:
+        """Ranked content ids for the user, from cache when possible."""
+        if limit > self.depth:
+            return await rank_for_user(db, user_id, learning_style, assessment_score, limit)
+
+        await catalog_index.refresh(db)
+        entry = self._entries.get(user_id)
+        if entry is None:
+            entry = await self._compute(db, user_id, learning_style, assessment_score)
+        elif time.monotonic() - entry.computed_at >= self.ttl or entry.catalog_version != catalog_index.version:
+            self.stale_served += 1
+            self._schedule_refresh(user_id, learning_style, assessment_score)
+        # Content deactivated since the list was computed is skipped
+        return [content_id for content_id in entry.content_ids if content_id in catalog_index][:limit]
+
+    def invalidate(self, user_id: int) -> None:
+        self._invalidated.set(user_id, time.monotonic())
+        self._entries.pop(user_id)
+        self.invalidations += 1
+
+    async def _compute(self, db: AsyncSession, user_id: int, learning_style: Optional[str],
+                       assessment_score: Optional[Dict[str, int]]) -> CachedRecommendations:
+        started = time.monotonic()
+        version = catalog_index.version
+        content_ids = await rank_for_user(db, user_id, learning_style, assessment_score, self.depth)
+        entry = CachedRecommendations(content_ids, started, version)
+        invalidated_at = self._invalidated.get(user_id)
+        if invalidated_at is None or invalidated_at < started:
+            self._entries.set(user_id, entry)
+        return entry
+
+    def _schedule_refresh(self, user_id: int, learning_style: Optional[str],
+                          assessment_score: Optional[Dict[str, int]]) -> None:
+        if user_id in self._refreshing:
+            return
+        self._refreshing.add(user_id)
+        task = asyncio.create_task(self._refresh(user_id, learning_style, assessment_score))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, user_id: int, learning_style: Optional[str],
+                       assessment_score: Optional[Dict[str, int]]) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await self._compute(db, user_id, learning_style, assessment_score)
+            self.background_refreshes += 1
+        except Exception:
+            logger.exception("Background recommendation refresh failed for user %s", user_id)
+        finally:
+            self._refreshing.discard(user_id)
+
+    async def stop(self) -> None:
+        """Wait for in-flight background refreshes."""
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            **self._entries.stats(),
+            "stale_served": self.stale_served,
+            "background_refreshes": self.background_refreshes,
+            "refreshing": len(self._refreshing),
+            "invalidations": self.invalidations,
+        }
+
+recommendation_cache = RecommendationCache(
+    maxsize=settings.RECOMMENDATION_CACHE_SIZE,
+    ttl=settings.RECOMMENDATION_CACHE_TTL_SECONDS,
+    stale_ttl=settings.RECOMMENDATION_STALE_SECONDS,
+    depth=settings.RECOMMENDATION_CACHE_DEPTH,
+)
+
+metrics.register("recommendation_cache", recommendation_cache.stats)
+
+def invalidate_recommendations(user_id: int) -> None:
+    """Drop a user's cached recommendations after their progress or profile changes."""
+    recommendation_cache.invalidate(user_id)
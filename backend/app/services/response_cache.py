@@ -0,0 +1,324 @@
+"""
+Shared response cache
+
+Caller-independent read endpoints (content items and pages, content
+analytics, the learning-style distribution) store their encoded response
+bytes here, keyed by route and parameters and tagged with the entities
+they were built from (`content:42`, `content-activity:42`, `catalog`,
+`users`). The in-process tier is an LRU bounded by total body bytes.
+
+Tags carry generation numbers. An entry remembers the generations of its
+tags as read before the response was built, and stops being served once
+any of them moves, so a write that lands while a response is being built
+can never be cached over. Writes bump tags through `invalidate`, or
+`invalidate_on_commit` from inside a transaction so nothing is dropped
+before the data it depends on is visible.
+
+When `RESPONSE_CACHE_PATH` is set, entries and tag generations are also
+kept in a SQLite file shared by every worker on the host, so one worker's
+write invalidates everyone's copies and a miss in memory can be served
+from disk. All disk work runs on one background thread, in submission
+order, so the event loop never waits on SQLite and a process always reads
+its own invalidations.
+
+`content:{id}` and `catalog` are invalidated by the catalog index when it
+sees a content row's version move (app.services.catalog).
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Iterable, NamedTuple, Optional, Set, Tuple
+
+from fastapi import Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Session.info key holding tags to invalidate once the transaction commits
+PENDING_TAGS = "response_cache_tags"
+
+# Sets between sweeps of expired / over-budget rows in the shared tier
+DISK_SWEEP_EVERY = 200
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    media_type: str
+    headers: Dict[str, str]
+    tags: Tuple[str, ...]
+    generations: Tuple[int, ...]
+    expires_at: float
+
+    def to_response(self) -> Response:
+        return Response(content=self.body, media_type=self.media_type, headers=self.headers)
+
+class ResponseCache:
+    """Byte-bounded LRU of encoded responses with generation-tagged invalidation."""
+
+    def __init__(self, max_bytes: int, ttl: float, path: str = "", disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._keys_by_tag: Dict[str, Set[str]] = defaultdict(set)
+        self._generations: Dict[str, int] = defaultdict(int)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_executor: Optional[ThreadPoolExecutor] = None
+        self._disk_sets = 0
+        # Distinguishes generation numbers across restarts / wiped cache files
+        self.epoch = uuid.uuid4().hex
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.invalidations = 0
+        if path:
+            self._open_disk(path)
+
+    def _open_disk(self, path: str) -> None:
+        self._disk_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache-disk")
+        self._disk = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._disk.execute("PRAGMA journal_mode=WAL")
+        self._disk.execute("PRAGMA synchronous=NORMAL")
+        self._disk.execute(
+            "CREATE TABLE IF NOT EXISTS tag_generations (tag TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+        )
+        self._disk.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, body BLOB NOT NULL, "
+            "media_type TEXT NOT NULL, headers TEXT NOT NULL, tags TEXT NOT NULL, "
+            "generations TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._disk.execute("CREATE TABLE IF NOT EXISTS cache_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._disk.execute("INSERT OR IGNORE INTO cache_meta VALUES ('epoch', ?)", (self.epoch,))
+        self.epoch = self._disk.execute("SELECT value FROM cache_meta WHERE key = 'epoch'").fetchone()[0]
+
+    async def _off_loop(self, fn, *args):
+        """Run `fn` on the disk thread when there is a shared tier, inline otherwise."""
+        if self._disk_executor is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._disk_executor, fn, *args)
+
+    # Tag generations
+
+    def generations(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        """Current generations of `tags`; reads the shared tier, so call it on the disk thread."""
+        tags = tuple(tags)
+        if self._disk is None:
+            return tuple(self._generations[tag] for tag in tags)
+        rows = dict(self._disk.execute(
+            f"SELECT tag, generation FROM tag_generations WHERE tag IN ({','.join('?' * len(tags))})", tags
+        ).fetchall()) if tags else {}
+        return tuple(rows.get(tag, 0) for tag in tags)
+
+    async def tag_validator(self, tag: str) -> Tuple[str, int, int]:
+        """ETag parts that move whenever `tag` is invalidated, without querying the database.
+
+        Without a shared tier other workers' writes never reach this process,
+        so the parts also roll over once per TTL, as the cached bodies do.
+        """
+        generation, = await self._off_loop(self.generations, (tag,))
+        return self.epoch, generation, int(time.time() // self.ttl)
+
+    def invalidate(self, *tags: str) -> None:
+        """Stop serving every entry tagged with any of `tags`.
+
+        In-process copies are dropped at once; the shared tier is bumped on
+        the disk thread, ahead of any lookup submitted after this call.
+        """
+        if not tags:
+            return
+        with self._lock:
+            self.invalidations += 1
+            for tag in tags:
+                self._generations[tag] += 1
+                for key in self._keys_by_tag.pop(tag, set()):
+                    self._drop(key)
+        if self._disk_executor is not None:
+            self._disk_executor.submit(self._bump_disk, tags)
+
+    def _bump_disk(self, tags: Tuple[str, ...]) -> None:
+        try:
+            self._disk.executemany(
+                "INSERT INTO tag_generations (tag, generation) VALUES (?, 1) "
+                "ON CONFLICT(tag) DO UPDATE SET generation = generation + 1",
+                [(tag,) for tag in tags]
+            )
+        except Exception:
+            logger.exception("Failed to invalidate shared cached responses")
+
+    # Entries
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def _remember(self, key: str, entry: CachedResponse) -> None:
+        self._drop(key)
+        if len(entry.body) > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += len(entry.body)
+        for tag in entry.tags:
+            self._keys_by_tag[tag].add(key)
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _load_disk(self, key: str) -> Optional[CachedResponse]:
+        row = self._disk.execute(
+            "SELECT body, media_type, headers, tags, generations, expires_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        body, media_type, headers, tags, generations, expires_at = row
+        return CachedResponse(
+            bytes(body), media_type, json.loads(headers), tuple(json.loads(tags)),
+            tuple(json.loads(generations)), expires_at
+        )
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Look `key` up; with a shared tier, call it on the disk thread."""
+        with self._lock:
+            entry = self._entries.get(key)
+        from_disk = False
+        if entry is None and self._disk is not None:
+            entry = self._load_disk(key)
+            from_disk = entry is not None
+        if entry is None:
+            self.misses += 1
+            return None
+        current = self.generations(entry.tags)
+        with self._lock:
+            if entry.expires_at <= time.time() or current != entry.generations:
+                self._drop(key)
+                self.stale += 1
+                self.misses += 1
+                return None
+            if from_disk:
+                self._remember(key, entry)
+                self.disk_hits += 1
+            else:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                self.hits += 1
+            return entry
+
+    def set(self, key: str, response: Response, tags: Iterable[str], generations: Tuple[int, ...],
+            ttl: Optional[float] = None) -> None:
+        """Store a rendered response under the tag generations read before it was built.
+
+        With a shared tier, call it on the disk thread.
+        """
+        tags = tuple(tags)
+        headers = {
+            name: value for name, value in response.headers.items()
+            if name not in ("content-length", "content-type")
+        }
+        entry = CachedResponse(
+            bytes(response.body), response.media_type or "application/json", headers, tags, generations,
+            time.time() + (self.ttl if ttl is None else ttl)
+        )
+        with self._lock:
+            self._remember(key, entry)
+        if self._disk is not None:
+            self._disk.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, entry.body, entry.media_type, json.dumps(headers), json.dumps(tags),
+                 json.dumps(generations), entry.expires_at)
+            )
+            self._disk_sets += 1
+            if self._disk_sets % DISK_SWEEP_EVERY == 0:
+                self._sweep_disk()
+
+    def _sweep_disk(self) -> None:
+        self._disk.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        stored = self._disk.execute("SELECT COALESCE(SUM(LENGTH(body)), 0), COUNT(*) FROM responses").fetchone()
+        if stored[0] > self.disk_max_bytes:
+            # Drop the quarter of rows closest to expiry
+            self._disk.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY expires_at LIMIT ?)",
+                (max(1, stored[1] // 4),)
+            )
+
+    async def get_or_build(self, key: str, tags: Iterable[str], build: Callable[[], Awaitable[Response]],
+                           ttl: Optional[float] = None) -> Response:
+        """Serve `key` from the cache, or build, store and return it."""
+        tags = tuple(tags)
+        entry = await self._off_loop(self.get, key)
+        if entry is not None:
+            return entry.to_response()
+        generations = await self._off_loop(self.generations, tags)
+        response = await build()
+        if 200 <= response.status_code < 300:
+            await self._off_loop(self.set, key, response, tags, generations, ttl)
+        return response
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self._bytes = 0
+        if self._disk_executor is not None:
+            self._disk_executor.submit(self._disk.execute, "DELETE FROM responses").result()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "shared": self._disk is not None,
+        }
+
+response_cache = ResponseCache(
+    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+    ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+    path=settings.RESPONSE_CACHE_PATH,
+    disk_max_bytes=settings.RESPONSE_CACHE_DISK_MAX_BYTES,
+)
+
+metrics.register("response_cache", response_cache.stats)
+
+def invalidate_on_commit(db, *tags: str) -> None:
+    """Invalidate `tags` once the session's current transaction commits (sync or async session)."""
+    db.info.setdefault(PENDING_TAGS, set()).update(tags)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    tags = session.info.pop(PENDING_TAGS, None)
+    if tags:
+        try:
+            response_cache.invalidate(*tags)
+        except Exception:
+            logger.exception("Failed to invalidate cached responses")
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session: Session) -> None:
+    session.info.pop(PENDING_TAGS, None)
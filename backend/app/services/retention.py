@@ -0,0 +1,171 @@
+"""
+Interaction history retention
+
+Keeps `content_interactions` small by compacting whole months older than
+`INTERACTION_RETENTION_DAYS` into `interaction_monthly_summaries` (counts
+and durations per user, content, format and interaction type) and
+deleting the raw rows. Readers that need all-time totals add the summary
+to what is left in the raw table.
+
+Rows are removed with DELETE ... RETURNING and summarized from what the
+delete returned, in the same transaction, so concurrent runs cannot count
+a row twice. Rows are only removed once every incremental consumer of the
+raw table (daily rollups, event store) has read them.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal, dialect_insert
+from app.models import ContentInteraction, InteractionMonthlySummary
+from app.core import metrics
+from app.core.config import settings
+from app.services.rollups import folded_interaction_id, rollup_compactor
+from app.services.columnar import event_store
+
+logger = logging.getLogger(__name__)
+
+# Ids per DELETE ... RETURNING batch (one transaction each)
+RETENTION_BATCH = 20_000
+
+def retention_cutoff(horizon_days: int, now: Optional[datetime] = None) -> datetime:
+    """Start of the month containing `now - horizon_days`; earlier months are compacted."""
+    horizon = (now or datetime.utcnow()) - timedelta(days=horizon_days)
+    return datetime(horizon.year, horizon.month, 1)
+
+def _month(value) -> date:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return date(value.year, value.month, 1)
+
+async def compact_interaction_history(db: AsyncSession, cutoff: datetime, safe_id: int) -> int:
+    """Move interactions before `cutoff` (and with id <= `safe_id`) into the
+    monthly summaries. Commits per batch; returns the number of rows removed."""
+    removed = 0
+    lowest, highest = (await db.execute(select(
+        func.min(ContentInteraction.id), func.max(ContentInteraction.id)
+    ).where(
+        ContentInteraction.timestamp < cutoff,
+        ContentInteraction.id <= safe_id
+    ))).one()
+    if lowest is None:
+        return 0
+    for start in range(lowest, highest + 1, RETENTION_BATCH):
+        rows = (await db.execute(delete(ContentInteraction).where(
+            ContentInteraction.id >= start,
+            ContentInteraction.id < min(start + RETENTION_BATCH, highest + 1),
+            ContentInteraction.timestamp < cutoff
+        ).returning(
+            ContentInteraction.user_id,
+            ContentInteraction.content_id,
+            ContentInteraction.timestamp,
+            ContentInteraction.format_used,
+            ContentInteraction.interaction_type,
+            ContentInteraction.duration_seconds
+        ))).all()
+        if not rows:
+            continue
+        counts: Dict[Tuple, int] = Counter()
+        durations: Dict[Tuple, int] = Counter()
+        for row in rows:
+            key = (row.user_id, row.content_id, _month(row.timestamp), row.format_used, row.interaction_type)
+            counts[key] += 1
+            durations[key] += row.duration_seconds or 0
+        stmt = dialect_insert(InteractionMonthlySummary)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "content_id", "month", "format_used", "interaction_type"],
+            set_={
+                "count": InteractionMonthlySummary.count + stmt.excluded.count,
+                "duration_seconds": InteractionMonthlySummary.duration_seconds + stmt.excluded.duration_seconds,
+            },
+        ), [
+            {
+                "user_id": user_id,
+                "content_id": content_id,
+                "month": month,
+                "format_used": format_used,
+                "interaction_type": interaction_type,
+                "count": count,
+                "duration_seconds": durations[(user_id, content_id, month, format_used, interaction_type)],
+            }
+            for (user_id, content_id, month, format_used, interaction_type), count in counts.items()
+        ])
+        await db.commit()
+        removed += len(rows)
+    return removed
+
+class InteractionRetention:
+    """Runs `compact_interaction_history` periodically once consumers have caught up."""
+
+    def __init__(self, horizon_days: int, interval: float):
+        self.horizon_days = horizon_days
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.removed = 0
+        self.failed = 0
+        self.last_run_ms = 0.0
+
+    async def _safe_id(self, db: AsyncSession) -> int:
+        """Highest interaction id every incremental consumer has already read."""
+        await rollup_compactor.refresh(force=True)
+        await event_store.refresh(force=True)
+        return min(await folded_interaction_id(db), event_store.folded_id)
+
+    async def run(self) -> int:
+        async with self._lock:
+            started = time.perf_counter()
+            removed = 0
+            try:
+                async with AsyncSessionLocal() as db:
+                    safe_id = await self._safe_id(db)
+                    removed = await compact_interaction_history(db, retention_cutoff(self.horizon_days), safe_id)
+                self.removed += removed
+                self.runs += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Interaction retention failed")
+            self.last_run_ms = (time.perf_counter() - started) * 1000
+            return removed
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run()
+
+    def stats(self) -> dict:
+        return {
+            "horizon_days": self.horizon_days,
+            "runs": self.runs,
+            "removed": self.removed,
+            "failed": self.failed,
+            "last_run_ms": round(self.last_run_ms, 3),
+        }
+
+interaction_retention = InteractionRetention(
+    horizon_days=settings.INTERACTION_RETENTION_DAYS,
+    interval=settings.INTERACTION_RETENTION_INTERVAL_SECONDS,
+)
+
+metrics.register("interaction_retention", interaction_retention.stats)
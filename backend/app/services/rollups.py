@@ -0,0 +1,358 @@
+"""
+Daily activity rollups
+
+`user_daily_activity` and `content_daily_activity` hold per-day activity,
+minutes, completions, average completion and per-format interaction
+counts, so trend queries read one row per day instead of scanning events.
+The same pass feeds the per-content sketches (app.services.content_sketches).
+
+A compactor folds new rows into them incrementally: progress records
+changed since the last run (diffed against the last state folded per
+record, so a day keeps its history when the record moves on) and
+interactions past the last folded id. The watermarks advance in the same
+transaction as the increments, with a compare-and-set so concurrent
+workers cannot fold the same rows twice.
+
+Interaction ids are not committed in id order on Postgres, so ids inside
+the last `INTERACTION_LOOKBACK` below the watermark that were missing when
+it advanced are kept in `rollup_pending_ids` and folded once they show up.
+Deleting a pending id claims it, so it is counted exactly once. Ids still
+missing once they fall out of the window are treated as rolled back.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal, dialect_insert
+from app.models import (
+    ContentInteraction, ProgressRecord, UserDailyActivity, ContentDailyActivity,
+    ProgressRollupSnapshot, RollupWatermark, RollupPendingId
+)
+from app.core import metrics
+from app.core.config import settings
+from app.services.adaptive import FORMATS
+from app.services.content_sketches import SketchUpdates, apply_sketch_updates
+
+logger = logging.getLogger(__name__)
+
+FORMAT_COUNTERS = {fmt: f"{fmt}_interactions" for fmt in FORMATS}
+ROLLUP_COUNTERS = ("activities", "minutes", "completions", "completion_sum", "interactions", *FORMAT_COUNTERS.values())
+
+PROGRESS_SOURCE = "progress_records"
+INTERACTION_SOURCE = "content_interactions"
+
+# Keys per snapshot lookup query
+SNAPSHOT_CHUNK = 500
+
+# Progress records are re-read this far behind the watermark, so a change
+# committed late with an earlier timestamp is still folded; records already
+# folded in that state are skipped by the snapshot diff
+PROGRESS_LOOKBACK = timedelta(seconds=60)
+
+# Ids below the interaction watermark that are still waited for
+INTERACTION_LOOKBACK = 1000
+
+class RollupConflict(Exception):
+    """Another worker advanced a watermark first; this run is rolled back."""
+
+def _as_day(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+async def compact_rollups(db: AsyncSession) -> int:
+    """Fold progress and interaction rows newer than the watermarks. Commits.
+
+    Returns the number of source rows folded.
+    """
+    if db.bind.dialect.name == "postgresql":
+        # One snapshot for the whole pass, so the ids found present are
+        # exactly the ones counted
+        await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    marks = {mark.name: mark for mark in (await db.scalars(select(RollupWatermark))).all()}
+    per_user: Dict[Tuple[int, date], Counter] = defaultdict(Counter)
+    per_content: Dict[Tuple[int, date], Counter] = defaultdict(Counter)
+    sketches = SketchUpdates()
+
+    # Progress: diff each changed record against the state last folded for it
+    progress_mark = marks.get(PROGRESS_SOURCE)
+    last_changed_at = progress_mark.last_changed_at if progress_mark else None
+    changed_at = func.coalesce(ProgressRecord.updated_at, ProgressRecord.created_at)
+    stmt = select(
+        ProgressRecord.user_id,
+        ProgressRecord.content_id,
+        ProgressRecord.completion_percentage,
+        ProgressRecord.time_spent_minutes,
+        ProgressRecord.is_completed,
+        ProgressRecord.quiz_score,
+        changed_at.label("changed_at")
+    )
+    if last_changed_at is not None:
+        stmt = stmt.where(changed_at >= last_changed_at - PROGRESS_LOOKBACK)
+    rows = (await db.execute(stmt)).all()
+
+    keys = [(row.user_id, row.content_id) for row in rows]
+    folded = {}
+    for i in range(0, len(keys), SNAPSHOT_CHUNK):
+        snapshots = await db.scalars(select(ProgressRollupSnapshot).where(
+            tuple_(ProgressRollupSnapshot.user_id, ProgressRollupSnapshot.content_id).in_(keys[i:i + SNAPSHOT_CHUNK])
+        ))
+        for snapshot in snapshots:
+            folded[(snapshot.user_id, snapshot.content_id)] = (
+                snapshot.day, snapshot.completion_percentage, snapshot.time_spent_minutes, snapshot.is_completed,
+                snapshot.quiz_score
+            )
+
+    new_snapshots = []
+    for row in rows:
+        if row.changed_at is None:
+            continue
+        state = (
+            _as_day(row.changed_at), row.completion_percentage or 0.0, row.time_spent_minutes or 0,
+            bool(row.is_completed), row.quiz_score
+        )
+        previous = folded.get((row.user_id, row.content_id))
+        if previous == state:
+            continue
+        day, completion, minutes, completed, quiz_score = state
+        previous_day, previous_completion, previous_minutes, previous_completed, previous_quiz_score = (
+            previous or (None, 0.0, 0, False, None)
+        )
+        delta = Counter({
+            "minutes": max(minutes - previous_minutes, 0),
+            "completions": int(completed and not previous_completed),
+        })
+        if previous_day != day:
+            delta["activities"] = 1
+            delta["completion_sum"] = completion
+        else:
+            # Same item again that day: keep only its latest completion
+            delta["completion_sum"] = completion - previous_completion
+        per_user[(row.user_id, day)].update(delta)
+        per_content[(row.content_id, day)].update(delta)
+        sketches.add_learner(row.content_id, day, row.user_id)
+        if quiz_score is not None and quiz_score != previous_quiz_score:
+            sketches.quiz_scores[row.content_id].append(quiz_score)
+        if delta["completions"]:
+            sketches.completion_minutes[row.content_id].append(minutes)
+        new_snapshots.append({
+            "user_id": row.user_id,
+            "content_id": row.content_id,
+            "day": day,
+            "completion_percentage": completion,
+            "time_spent_minutes": minutes,
+            "is_completed": completed,
+            "quiz_score": quiz_score,
+        })
+        if last_changed_at is None or row.changed_at > last_changed_at:
+            last_changed_at = row.changed_at
+
+    # Interactions: count everything past the id watermark, plus pending ids
+    interaction_mark = marks.get(INTERACTION_SOURCE)
+    last_id = interaction_mark.last_id if interaction_mark else 0
+    pending_ids = set((await db.scalars(select(RollupPendingId.source_id).where(
+        RollupPendingId.name == INTERACTION_SOURCE
+    ))).all())
+    unseen = ContentInteraction.id > last_id
+    if pending_ids:
+        unseen = or_(unseen, ContentInteraction.id.in_(pending_ids))
+    interaction_day = func.date(ContentInteraction.timestamp)
+    groups = (await db.execute(select(
+        ContentInteraction.user_id,
+        ContentInteraction.content_id,
+        ContentInteraction.format_used,
+        interaction_day.label("day"),
+        func.count(ContentInteraction.id).label("count"),
+        func.max(ContentInteraction.id).label("last_id")
+    ).where(
+        unseen
+    ).group_by(
+        ContentInteraction.user_id, ContentInteraction.content_id, ContentInteraction.format_used, interaction_day
+    ))).all()
+    interactions = 0
+    new_last_id = last_id
+    for group in groups:
+        new_last_id = max(new_last_id, group.last_id)
+        interactions += group.count
+        if group.day is None:
+            continue
+        day = _as_day(group.day)
+        delta = Counter({"interactions": group.count})
+        if group.format_used in FORMAT_COUNTERS:
+            delta[FORMAT_COUNTERS[group.format_used]] = group.count
+        per_user[(group.user_id, day)].update(delta)
+        per_content[(group.content_id, day)].update(delta)
+        sketches.add_learner(group.content_id, day, group.user_id)
+
+    if not new_snapshots and not groups:
+        return 0
+
+    if groups:
+        # Which ids in the window behind the new watermark are still missing
+        window_start = max(last_id, new_last_id - INTERACTION_LOOKBACK)
+        present = set((await db.scalars(select(ContentInteraction.id).where(or_(
+            ContentInteraction.id.in_(pending_ids),
+            and_(ContentInteraction.id > window_start, ContentInteraction.id <= new_last_id)
+        )))).all()) if pending_ids or new_last_id > window_start else set()
+        still_pending = {
+            source_id for source_id in pending_ids - present if source_id > new_last_id - INTERACTION_LOOKBACK
+        }
+        still_pending.update(
+            source_id for source_id in range(window_start + 1, new_last_id) if source_id not in present
+        )
+        await _replace_pending(db, INTERACTION_SOURCE, pending_ids, still_pending)
+
+    await _increment(db, UserDailyActivity, "user_id", per_user)
+    await _increment(db, ContentDailyActivity, "content_id", per_content)
+    await apply_sketch_updates(db, sketches)
+    if new_snapshots:
+        stmt = dialect_insert(ProgressRollupSnapshot)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "content_id"],
+            set_={
+                column: stmt.excluded[column]
+                for column in ("day", "completion_percentage", "time_spent_minutes", "is_completed", "quiz_score")
+            },
+        ), new_snapshots)
+        await _advance(db, progress_mark, PROGRESS_SOURCE, last_changed_at=last_changed_at)
+    if groups:
+        await _advance(db, interaction_mark, INTERACTION_SOURCE, last_id=new_last_id)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise RollupConflict()
+    return len(new_snapshots) + interactions
+
+async def _increment(db: AsyncSession, model, key: str, increments: Dict[Tuple[int, date], Counter]) -> None:
+    if not increments:
+        return
+    stmt = dialect_insert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key, "day"],
+        set_={column: getattr(model, column) + stmt.excluded[column] for column in ROLLUP_COUNTERS},
+    )
+    await db.execute(stmt, [
+        {key: owner_id, "day": day, **{column: delta.get(column, 0) for column in ROLLUP_COUNTERS}}
+        for (owner_id, day), delta in increments.items()
+    ])
+
+async def _replace_pending(db: AsyncSession, name: str, previous: set, current: set) -> None:
+    """Swap the pending ids of a source; removing one this run did not see is a conflict."""
+    resolved = previous - current
+    if resolved:
+        result = await db.execute(delete(RollupPendingId).where(
+            RollupPendingId.name == name,
+            RollupPendingId.source_id.in_(resolved)
+        ))
+        if result.rowcount != len(resolved):
+            await db.rollback()
+            raise RollupConflict()
+    added = current - previous
+    if added:
+        await db.execute(dialect_insert(RollupPendingId), [{"name": name, "source_id": source_id} for source_id in added])
+
+async def folded_interaction_id(db: AsyncSession) -> int:
+    """Highest interaction id at or below which every row has been folded."""
+    last_id = await db.scalar(select(RollupWatermark.last_id).where(RollupWatermark.name == INTERACTION_SOURCE))
+    lowest_pending = await db.scalar(select(func.min(RollupPendingId.source_id)).where(
+        RollupPendingId.name == INTERACTION_SOURCE
+    ))
+    if lowest_pending is not None:
+        return min(last_id or 0, lowest_pending - 1)
+    return last_id or 0
+
+async def _advance(db: AsyncSession, mark: Optional[RollupWatermark], name: str, **values) -> None:
+    if mark is None:
+        # A concurrent first run inserting the same name fails at commit
+        await db.execute(dialect_insert(RollupWatermark).values(name=name, **values))
+        return
+    current = {column: getattr(mark, column) for column in values}
+    conditions = [
+        getattr(RollupWatermark, column).is_(None) if value is None else getattr(RollupWatermark, column) == value
+        for column, value in current.items()
+    ]
+    result = await db.execute(
+        update(RollupWatermark).where(RollupWatermark.name == name, *conditions).values(**values),
+        execution_options={"synchronize_session": False}
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        raise RollupConflict()
+
+class RollupCompactor:
+    """Runs `compact_rollups` from a background task every interval.
+
+    Request handlers only read the rollup tables; they never wait on a
+    catch-up compaction.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._checked_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.folded = 0
+        self.conflicts = 0
+        self.failed = 0
+        self.last_run_ms = 0.0
+
+    async def refresh(self, force: bool = False) -> None:
+        if not force and time.monotonic() - self._checked_at < self.interval:
+            return
+        async with self._lock:
+            if not force and time.monotonic() - self._checked_at < self.interval:
+                return
+            started = time.perf_counter()
+            try:
+                async with AsyncSessionLocal() as db:
+                    self.folded += await compact_rollups(db)
+                self.runs += 1
+            except RollupConflict:
+                self.conflicts += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Rollup compaction failed")
+            self.last_run_ms = (time.perf_counter() - started) * 1000
+            self._checked_at = time.monotonic()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.refresh(force=True)
+
+    async def _run(self) -> None:
+        while True:
+            await self.refresh(force=True)
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "folded": self.folded,
+            "conflicts": self.conflicts,
+            "failed": self.failed,
+            "last_run_ms": round(self.last_run_ms, 3),
+        }
+
+rollup_compactor = RollupCompactor(interval=settings.ROLLUP_COMPACT_INTERVAL_SECONDS)
+
+metrics.register("rollups", rollup_compactor.stats)
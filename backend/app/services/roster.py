@@ -0,0 +1,199 @@
+"""
+Bulk roster provisioning
+
+Whole cohorts are created from one CSV or NDJSON upload: each chunk of
+records is checked against existing emails and usernames with a single
+set-based query, passwords are hashed on the password worker pool, and accounts
+are inserted with one executemany. Answer sheets from paper sessions are
+scored together as a NumPy answer matrix and written back in one bulk
+UPDATE per chunk.
+"""
+
+from typing import AsyncIterator, Dict, List, Set, Tuple
+
+import numpy as np
+from pydantic import ValidationError
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import dialect_insert
+from app.models import User
+from app.schemas import UserCreate, AnswerSheet
+from app.auth import invalidate_principal
+from app.services.response_cache import invalidate_on_commit
+from app.core.config import settings
+from app.core.passwords import password_hasher
+from app.core.streaming import RecordError
+from app.services.assessment import score_answer_matrix
+from app.services.recommendations import invalidate_recommendations
+
+# Records per dedupe query / insert / update
+ROSTER_CHUNK = 1000
+MAX_REPORTED_ERRORS = 1000
+
+class _Summary:
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.errors: List[dict] = []
+
+    def reject(self, number: int, error: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": number, "error": error})
+
+    def result(self) -> dict:
+        self.errors.sort(key=lambda error: error["line"])
+        return {"accepted": self.accepted, "rejected": self.rejected, "errors": self.errors}
+
+def _validation_message(exc: ValidationError) -> str:
+    error = exc.errors()[0]
+    location = ".".join(str(part) for part in error["loc"])
+    return f"{location}: {error['msg']}" if location else error["msg"]
+
+async def import_roster(db: AsyncSession, records: AsyncIterator) -> dict:
+    """Create accounts from a stream of (record number, object) `UserCreate` records."""
+    summary = _Summary()
+    seen_emails: Set[str] = set()
+    seen_usernames: Set[str] = set()
+    pending: List[Tuple[int, UserCreate]] = []
+
+    async def flush() -> None:
+        emails = [user.email for _, user in pending]
+        usernames = [user.username for _, user in pending]
+        taken = (await db.execute(select(User.email, User.username).where(
+            or_(User.email.in_(emails), User.username.in_(usernames))
+        ))).all()
+        taken_emails = {row.email for row in taken}
+        taken_usernames = {row.username for row in taken}
+        accepted = []
+        for number, user in pending:
+            if user.email in taken_emails or user.username in taken_usernames:
+                summary.reject(number, "Email or username already registered")
+            else:
+                accepted.append((number, user))
+        pending.clear()
+        if not accepted:
+            return
+        hashes = await password_hasher.hash_many([user.password for _, user in accepted])
+        # Accounts registered concurrently since the check are skipped, not failed
+        inserted = set((await db.execute(
+            dialect_insert(User).on_conflict_do_nothing().returning(User.email),
+            [
+                {
+                    "email": user.email,
+                    "username": user.username,
+                    "hashed_password": hashed,
+                    "is_active": True,
+                    "assessment_completed": False,
+                }
+                for (_, user), hashed in zip(accepted, hashes)
+            ]
+        )).scalars())
+        await db.commit()
+        for number, user in accepted:
+            if user.email in inserted:
+                summary.accepted += 1
+            else:
+                summary.reject(number, "Email or username already registered")
+
+    async for number, value in records:
+        if isinstance(value, RecordError):
+            summary.reject(number, str(value))
+            continue
+        try:
+            user = UserCreate.model_validate(value)
+        except ValidationError as exc:
+            summary.reject(number, _validation_message(exc))
+            continue
+        if user.email in seen_emails or user.username in seen_usernames:
+            summary.reject(number, "Duplicate email or username in upload")
+            continue
+        seen_emails.add(user.email)
+        seen_usernames.add(user.username)
+        pending.append((number, user))
+        if len(pending) >= ROSTER_CHUNK:
+            await flush()
+    if pending:
+        await flush()
+    return summary.result()
+
+async def import_answer_sheets(db: AsyncSession, records: AsyncIterator) -> dict:
+    """Score a stream of (record number, object) `AnswerSheet` records and
+    store each learner's style and scores.
+
+    `answers` may also be one string separated by `;`, `|` or spaces (CSV).
+    """
+    summary = _Summary()
+    styles = settings.LEARNING_STYLES
+    codes = {style: code for code, style in enumerate(styles)}
+    questions = settings.ASSESSMENT_QUESTIONS_COUNT
+    pending: List[Tuple[int, AnswerSheet, List[int]]] = []
+
+    async def flush() -> None:
+        user_ids = {sheet.user_id for _, sheet, _ in pending if sheet.user_id is not None}
+        emails = {sheet.email for _, sheet, _ in pending if sheet.user_id is None}
+        found = (await db.execute(select(User.id, User.email).where(
+            or_(User.id.in_(user_ids), User.email.in_(emails))
+        ))).all()
+        known_ids = {row.id for row in found}
+        ids_by_email: Dict[str, int] = {row.email: row.id for row in found}
+        sheets, owners = [], []
+        for number, sheet, answers in pending:
+            user_id = sheet.user_id if sheet.user_id is not None else ids_by_email.get(sheet.email)
+            if user_id is None or user_id not in known_ids:
+                summary.reject(number, "User not found")
+                continue
+            sheets.append(answers)
+            owners.append(user_id)
+        pending.clear()
+        if not sheets:
+            return
+        scores, primary = score_answer_matrix(np.asarray(sheets, dtype=np.int8))
+        await db.execute(update(User), [
+            {
+                "id": user_id,
+                "learning_style": styles[style],
+                "assessment_completed": True,
+                "assessment_score": dict(zip(styles, counts)),
+            }
+            for user_id, style, counts in zip(owners, primary.tolist(), scores.tolist())
+        ])
+        invalidate_on_commit(db, "users")
+        await db.commit()
+        for user_id in owners:
+            invalidate_principal(user_id)
+            invalidate_recommendations(user_id)
+        summary.accepted += len(owners)
+
+    async for number, value in records:
+        if isinstance(value, RecordError):
+            summary.reject(number, str(value))
+            continue
+        if isinstance(value, dict):
+            # CSV rows: blank cells are missing values, answers are one cell
+            value = {key: item for key, item in value.items() if item != ""}
+            if isinstance(value.get("answers"), str):
+                value["answers"] = value["answers"].replace("|", ";").replace(" ", ";").split(";")
+        try:
+            sheet = AnswerSheet.model_validate(value)
+        except ValidationError as exc:
+            summary.reject(number, _validation_message(exc))
+            continue
+        if sheet.user_id is None and sheet.email is None:
+            summary.reject(number, "Either user_id or email is required")
+            continue
+        answers = [answer.strip() for answer in sheet.answers if answer.strip()]
+        if len(answers) != questions:
+            summary.reject(number, f"Assessment must have exactly {questions} answers")
+            continue
+        invalid = next((answer for answer in answers if answer not in codes), None)
+        if invalid is not None:
+            summary.reject(number, f"Invalid answer: {invalid}")
+            continue
+        pending.append((number, sheet, [codes[answer] for answer in answers]))
+        if len(pending) >= ROSTER_CHUNK:
+            await flush()
+    if pending:
+        await flush()
+    return summary.result()
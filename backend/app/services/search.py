@@ -0,0 +1,148 @@
+"""
+Full-text search over the content catalog
+
+An in-process BM25 inverted index over title, description, tags, learning
+objectives and text body. It works the same on SQLite and Postgres and is
+kept current by the incremental refresh shared with the catalog index.
+"""
+
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.models import Content
+from app.core.config import settings
+from app.services.catalog import ContentIndex
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the this to was were will with".split()
+)
+
+# Per-field term frequency weights (BM25F-style)
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "tags": 2.0,
+    "learning_objectives": 1.5,
+    "description": 1.5,
+    "text_content": 1.0,
+}
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+def _field_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(item) for item in value)
+    return str(value)
+
+class SearchIndex(ContentIndex):
+    """BM25 ranked inverted index over active content."""
+
+    k1 = 1.2
+    b = 0.75
+
+    def _reset(self) -> None:
+        super()._reset()
+        # term -> {content_id: weighted term frequency}
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._doc_terms: Dict[int, Dict[str, float]] = {}
+        self._doc_length: Dict[int, float] = {}
+        self._total_length = 0.0
+        # term -> (content ids, term frequencies, doc lengths) arrays, rebuilt lazily
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def columns(self) -> list:
+        return [getattr(Content, field) for field in FIELD_WEIGHTS]
+
+    def _upsert(self, row) -> None:
+        self._remove(row.id)
+        if not row.is_active:
+            return
+        terms: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token, count in Counter(TOKEN_RE.findall(_field_text(getattr(row, field)).lower())).items():
+                terms[token] = terms.get(token, 0.0) + count * weight
+        for stopword in STOPWORDS.intersection(terms):
+            del terms[stopword]
+        if not terms:
+            return
+        postings, content_id = self._postings, row.id
+        for term, frequency in terms.items():
+            postings[term][content_id] = frequency
+        if self._arrays:
+            for term in terms:
+                self._arrays.pop(term, None)
+        self._doc_terms[content_id] = terms
+        length = sum(terms.values())
+        self._doc_length[content_id] = length
+        self._total_length += length
+
+    def _remove(self, content_id: int) -> None:
+        terms = self._doc_terms.pop(content_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self._postings[term]
+            posting.pop(content_id, None)
+            self._arrays.pop(term, None)
+            if not posting:
+                del self._postings[term]
+        self._total_length -= self._doc_length.pop(content_id)
+
+    def _term_arrays(self, term: str):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            posting = self._postings[term]
+            ids = np.fromiter(posting.keys(), dtype=np.int64, count=len(posting))
+            frequencies = np.fromiter(posting.values(), dtype=np.float64, count=len(posting))
+            lengths = np.fromiter((self._doc_length[i] for i in posting), dtype=np.float64, count=len(posting))
+            arrays = self._arrays[term] = (ids, frequencies, lengths)
+        return arrays
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> Tuple[int, List[Tuple[int, float]]]:
+        """Rank documents for `query`; returns (total matches, [(content_id, score)] page)."""
+        terms = [term for term in set(tokenize(query)) if term in self._postings]
+        documents = len(self._doc_length)
+        if not terms or not documents:
+            return 0, []
+        average_length = self._total_length / documents
+        
+        # Score each query term's posting list in one vectorized pass, then
+        # sum the per-term contributions per document
+        all_ids, all_scores = [], []
+        for term in terms:
+            ids, frequencies, lengths = self._term_arrays(term)
+            idf = math.log(1 + (documents - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths / average_length)
+            all_ids.append(ids)
+            all_scores.append(idf * frequencies * (self.k1 + 1) / (frequencies + norm))
+        ids = np.concatenate(all_ids)
+        scores = np.concatenate(all_scores)
+        if len(terms) > 1:
+            ids, inverse = np.unique(ids, return_inverse=True)
+            scores = np.bincount(inverse, weights=scores)
+        
+        total = len(ids)
+        wanted = min(offset + limit, total)
+        if wanted <= offset:
+            return total, []
+        if wanted < total:
+            top = np.argpartition(-scores, wanted - 1)[:wanted]
+        else:
+            top = np.arange(total)
+        # Highest score first, ties by ascending id
+        order = top[np.lexsort((ids[top], -scores[top]))]
+        page = order[offset:wanted]
+        return total, [(int(ids[i]), float(scores[i])) for i in page]
+
+    def __len__(self) -> int:
+        return len(self._doc_length)
+
+search_index = SearchIndex(refresh_interval=settings.CATALOG_REFRESH_SECONDS)
@@ -0,0 +1,250 @@
+"""
+Sign-in sessions: refresh tokens and revocation
+
+Login opens a session and returns a short-lived access token plus a
+refresh token, both carrying the session id (`sid`). Exchanging a refresh
+token at `/users/refresh` marks it used and issues a new pair (rotation),
+so renewing costs a signature check and two small writes instead of a
+password verification. Presenting an already-used refresh token signs the
+whole session out, since it was most likely copied. Logout revokes the
+session as well.
+
+Revoked session ids are kept in a Bloom filter, so every request can check
+its token in constant time without touching the database. The filter never
+misses a revoked session; a hit is confirmed against `refresh_tokens`
+before anything is rejected. Each process picks up revocations made by
+others every `REVOCATION_REFRESH_SECONDS`.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from jose import JWTError, jwt
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.models import RefreshToken, User
+from app.core import metrics
+from app.core.config import settings
+from app.core.sketches import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+# Revocations are re-read with this much overlap, so one committed late
+# with an earlier timestamp is not missed
+REVOCATION_OVERLAP = timedelta(seconds=60)
+
+class InvalidRefreshToken(Exception):
+    """Refresh token is malformed, expired, rotated or signed out."""
+
+def create_access_token(data: dict, expires_delta: timedelta = None):
+    to_encode = data.copy()
+    if expires_delta:
+        expire = datetime.utcnow() + expires_delta
+    else:
+        expire = datetime.utcnow() + timedelta(minutes=15)
+    to_encode.update({"exp": expire})
+    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    return encoded_jwt
+
+def _issue_tokens(db: AsyncSession, user: User, session_id: str) -> dict:
+    """New access/refresh pair for a session; adds the refresh row without committing."""
+    jti = uuid.uuid4().hex
+    expires_at = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    db.add(RefreshToken(jti=jti, session_id=session_id, user_id=user.id, expires_at=expires_at))
+    refresh_token = jwt.encode(
+        {"sub": str(user.id), "sid": session_id, "jti": jti, "typ": "refresh", "exp": expires_at},
+        settings.SECRET_KEY, algorithm=settings.ALGORITHM
+    )
+    access_token = create_access_token(
+        data={"sub": user.email, "sid": session_id},
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+async def open_session(db: AsyncSession, user: User) -> dict:
+    """Start a session for a freshly authenticated user."""
+    tokens = _issue_tokens(db, user, uuid.uuid4().hex)
+    await db.commit()
+    return tokens
+
+def decode_refresh_token(token: str, verify_exp: bool = True) -> dict:
+    try:
+        payload = jwt.decode(
+            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM],
+            options={"verify_exp": verify_exp}
+        )
+    except JWTError:
+        raise InvalidRefreshToken()
+    if payload.get("typ") != "refresh" or not payload.get("sid") or not payload.get("jti"):
+        raise InvalidRefreshToken()
+    return payload
+
+async def rotate_refresh_token(db: AsyncSession, token: str) -> Tuple[User, dict]:
+    """Exchange a refresh token for a new pair; the old one stops working."""
+    payload = decode_refresh_token(token)
+    session_id = payload["sid"]
+    if await revocation_list.is_revoked(db, session_id):
+        raise InvalidRefreshToken()
+
+    now = datetime.utcnow()
+    # Only one caller can move a token from unused to used
+    claimed = (await db.execute(update(RefreshToken).where(
+        RefreshToken.jti == payload["jti"],
+        RefreshToken.used_at.is_(None),
+        RefreshToken.revoked_at.is_(None),
+        RefreshToken.expires_at > now
+    ).values(used_at=now).returning(RefreshToken.user_id))).first()
+    if claimed is None:
+        await db.rollback()
+        stored = await db.get(RefreshToken, payload["jti"])
+        if stored is not None and stored.used_at is not None and stored.revoked_at is None:
+            logger.warning("Refresh token reused, signing out session %s", session_id)
+            await revoke_session(db, session_id)
+        raise InvalidRefreshToken()
+
+    user = await db.get(User, claimed.user_id)
+    if user is None:
+        await db.rollback()
+        raise InvalidRefreshToken()
+    tokens = _issue_tokens(db, user, session_id)
+    await db.commit()
+    return user, tokens
+
+async def revoke_session(db: AsyncSession, session_id: str) -> None:
+    """Sign a session out everywhere. Commits."""
+    await db.execute(update(RefreshToken).where(
+        RefreshToken.session_id == session_id,
+        RefreshToken.revoked_at.is_(None)
+    ).values(revoked_at=datetime.utcnow()))
+    await db.commit()
+    revocation_list.add(session_id)
+
+class RevocationList:
+    """Bloom filter of revoked session ids, confirmed against the database on a hit."""
+
+    def __init__(self, capacity: int, error_rate: float, interval: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.interval = interval
+        self._filter = BloomFilter(capacity, error_rate)
+        self._since: Optional[datetime] = None
+        self._rebuild = True
+        self._added_during_rebuild: Optional[list] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.checks = 0
+        self.confirmed = 0
+        self.false_positives = 0
+        self.reloads = 0
+        self.last_refresh_ms = 0.0
+
+    def might_be_revoked(self, session_id: str) -> bool:
+        """Constant-time check; False means the session is certainly live."""
+        self.checks += 1
+        return session_id in self._filter
+
+    def add(self, session_id: str) -> None:
+        if session_id not in self._filter:
+            self._filter.add(session_id)
+        if self._added_during_rebuild is not None:
+            self._added_during_rebuild.append(session_id)
+        if self._filter.count > self.capacity:
+            # Past capacity the error rate climbs; rebuild from live sessions
+            self._rebuild = True
+
+    async def is_revoked(self, db: AsyncSession, session_id: str) -> bool:
+        if not self.might_be_revoked(session_id):
+            return False
+        revoked = await db.scalar(select(RefreshToken.jti).where(
+            RefreshToken.session_id == session_id,
+            RefreshToken.revoked_at.is_not(None)
+        ).limit(1))
+        if revoked is None:
+            self.false_positives += 1
+            return False
+        self.confirmed += 1
+        return True
+
+    async def refresh(self) -> None:
+        async with self._lock:
+            started = time.perf_counter()
+            now = datetime.utcnow()
+            async with AsyncSessionLocal() as db:
+                if self._rebuild:
+                    self._added_during_rebuild = []
+                    try:
+                        # Expired tokens can no longer be used either way
+                        await db.execute(delete(RefreshToken).where(RefreshToken.expires_at <= now))
+                        await db.commit()
+                        rows = await db.execute(select(RefreshToken.session_id).where(
+                            RefreshToken.revoked_at.is_not(None)
+                        ).distinct())
+                        revoked = BloomFilter(self.capacity, self.error_rate)
+                        for (session_id,) in rows:
+                            revoked.add(session_id)
+                        # Sessions signed out here while loading stay revoked
+                        for session_id in self._added_during_rebuild:
+                            if session_id not in revoked:
+                                revoked.add(session_id)
+                        self._filter = revoked
+                    finally:
+                        self._added_during_rebuild = None
+                    self._rebuild = False
+                    self.reloads += 1
+                else:
+                    rows = await db.execute(select(RefreshToken.session_id).where(
+                        RefreshToken.revoked_at >= self._since - REVOCATION_OVERLAP
+                    ).distinct())
+                    for (session_id,) in rows:
+                        self.add(session_id)
+            self._since = now
+            self.last_refresh_ms = (time.perf_counter() - started) * 1000
+
+    async def start(self) -> None:
+        if self._task is None:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Failed to load revoked sessions")
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Failed to refresh revoked sessions")
+
+    def stats(self) -> dict:
+        return {
+            "revoked_sessions": self._filter.count,
+            "capacity": self.capacity,
+            "filter_bytes": int(self._filter.bits.nbytes),
+            "checks": self.checks,
+            "confirmed": self.confirmed,
+            "false_positives": self.false_positives,
+            "reloads": self.reloads,
+            "last_refresh_ms": round(self.last_refresh_ms, 3),
+        }
+
+revocation_list = RevocationList(
+    capacity=settings.REVOCATION_FILTER_CAPACITY,
+    error_rate=settings.REVOCATION_FILTER_ERROR_RATE,
+    interval=settings.REVOCATION_REFRESH_SECONDS,
+)
+
+metrics.register("session_revocation", revocation_list.stats)
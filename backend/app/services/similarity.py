@@ -0,0 +1,289 @@
+"""
+Item-item collaborative filtering
+
+Counts, for every pair of content items, how many learners finished
+both (a completed progress record), and keeps the top-k cosine neighbors
+of each item precomputed for "learners who finished this also finished"
+lookups. Interactions and unfinished progress are not counted.
+
+Co-occurrence counts live in a CSR matrix plus a small dict-of-rows delta
+for pairs seen since the last compaction. Completions are read from the
+database by a watermark on the time the progress row last changed (rows
+are completed by updating them, so their ids say nothing about when) and
+applied incrementally: a new pair only touches the rows of items that user
+already had. The matrix, per-user item sets and watermark are persisted
+with `np.savez_compressed`.
+"""
+
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import ProgressRecord
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Re-read this far behind the watermark so completions committed late with
+# an earlier timestamp are not missed; applying a pair twice is a no-op.
+COMPLETION_OVERLAP = timedelta(seconds=60)
+
+# Apply batches larger than this off the event loop
+THREAD_APPLY_ROWS = 1000
+
+# Bumped when what the saved matrix counts changes; older files are rebuilt
+INDEX_FORMAT = 2
+
+def _changed_at():
+    return func.coalesce(ProgressRecord.updated_at, ProgressRecord.created_at)
+
+# Fold the delta into the CSR arrays once it holds this many entries
+COMPACT_THRESHOLD = 100_000
+
+class ItemSimilarityIndex:
+    def __init__(self, top_k: int, refresh_interval: float, path: Optional[str] = None):
+        self.top_k = top_k
+        self.refresh_interval = refresh_interval
+        self.path = path
+        self._lock = asyncio.Lock()
+        self._checked_at = 0.0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._item_ids: List[int] = []
+        self._positions: Dict[int, int] = {}
+        self._item_counts: List[int] = []  # learners per item
+        self._user_items: Dict[int, Set[int]] = defaultdict(set)
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._data = np.zeros(0, dtype=np.int32)
+        self._delta: Dict[int, Dict[int, int]] = defaultdict(dict)
+        self._delta_size = 0
+        self._dirty: Set[int] = set()
+        self._neighbors: Dict[int, Tuple[Tuple[int, ...], Tuple[float, ...]]] = {}
+        self.completed_watermark: Optional[datetime] = None
+        self.pairs = 0
+
+    # Incremental updates
+
+    def _position(self, content_id: int) -> int:
+        position = self._positions.get(content_id)
+        if position is None:
+            position = len(self._item_ids)
+            self._positions[content_id] = position
+            self._item_ids.append(content_id)
+            self._item_counts.append(0)
+        return position
+
+    def apply_pairs(self, pairs: Iterable[Tuple[int, int]]) -> None:
+        """Record that each (user_id, content_id) learner finished the item."""
+        for user_id, content_id in pairs:
+            item = self._position(content_id)
+            seen = self._user_items[user_id]
+            if item in seen:
+                continue
+            for other in seen:
+                row = self._delta[item]
+                row[other] = row.get(other, 0) + 1
+                row = self._delta[other]
+                row[item] = row.get(item, 0) + 1
+                self._dirty.add(other)
+            self._delta_size += 2 * len(seen)
+            seen.add(item)
+            self._item_counts[item] += 1
+            self._dirty.add(item)
+            self.pairs += 1
+        if self._delta_size >= COMPACT_THRESHOLD:
+            self.compact()
+
+    def compact(self) -> None:
+        """Fold the delta rows into the CSR arrays."""
+        n = len(self._item_ids)
+        base_rows = np.repeat(np.arange(len(self._indptr) - 1), np.diff(self._indptr))
+        delta_rows, delta_cols, delta_counts = [], [], []
+        for row, columns in self._delta.items():
+            delta_rows.extend([row] * len(columns))
+            delta_cols.extend(columns.keys())
+            delta_counts.extend(columns.values())
+        rows = np.concatenate([base_rows, np.asarray(delta_rows, dtype=np.int64)])
+        cols = np.concatenate([self._indices.astype(np.int64), np.asarray(delta_cols, dtype=np.int64)])
+        counts = np.concatenate([self._data, np.asarray(delta_counts, dtype=np.int32)])
+        keys, inverse = np.unique(rows * max(n, 1) + cols, return_inverse=True)
+        self._data = np.bincount(inverse, weights=counts).astype(np.int32)
+        self._indices = (keys % max(n, 1)).astype(np.int32)
+        self._indptr = np.searchsorted(keys // max(n, 1), np.arange(n + 1)).astype(np.int64)
+        self._delta.clear()
+        self._delta_size = 0
+
+    def _row(self, item: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Co-occurrence counts of one item as (column positions, counts)."""
+        if item + 1 < len(self._indptr):
+            start, end = self._indptr[item], self._indptr[item + 1]
+            columns, counts = self._indices[start:end], self._data[start:end]
+        else:
+            columns, counts = self._indices[:0], self._data[:0]
+        delta = self._delta.get(item)
+        if delta:
+            columns = np.concatenate([columns, np.fromiter(delta.keys(), dtype=np.int32, count=len(delta))])
+            counts = np.concatenate([counts, np.fromiter(delta.values(), dtype=np.int32, count=len(delta))])
+            columns, inverse = np.unique(columns, return_inverse=True)
+            counts = np.bincount(inverse, weights=counts)
+        return columns, counts
+
+    def _update_neighbors(self) -> None:
+        """Recompute top-k neighbor lists for rows touched since the last call."""
+        item_counts = np.asarray(self._item_counts, dtype=np.float64)
+        item_ids = np.asarray(self._item_ids, dtype=np.int64)
+        for item in self._dirty:
+            columns, counts = self._row(item)
+            if not len(columns):
+                self._neighbors.pop(self._item_ids[item], None)
+                continue
+            scores = counts / np.sqrt(item_counts[item] * item_counts[columns])
+            k = min(self.top_k, len(scores))
+            # Everything tied with the k-th score competes, so ties break by id
+            cutoff = -np.partition(-scores, k - 1)[k - 1]
+            top = np.flatnonzero(scores >= cutoff)
+            top = top[np.lexsort((item_ids[columns[top]], -scores[top]))][:k]
+            self._neighbors[self._item_ids[item]] = (
+                tuple(item_ids[columns[top]].tolist()),
+                tuple(np.round(scores[top], 6).tolist()),
+            )
+        self._dirty.clear()
+
+    # Reading
+
+    def neighbors(self, content_id: int, limit: int) -> List[Tuple[int, float]]:
+        """Precomputed (content_id, cosine similarity) neighbors, best first."""
+        ids, scores = self._neighbors.get(content_id, ((), ()))
+        return list(zip(ids[:limit], scores[:limit]))
+
+    # Database sync
+
+    def pending_statement(self):
+        """Select returning (user_id, content_id, changed at) completions past the watermark."""
+        changed_at = _changed_at()
+        stmt = select(ProgressRecord.user_id, ProgressRecord.content_id, changed_at).where(
+            ProgressRecord.is_completed.is_(True)
+        )
+        if self.completed_watermark is not None:
+            stmt = stmt.where(changed_at > self.completed_watermark - COMPLETION_OVERLAP)
+        return stmt
+
+    def apply_rows(self, rows: list) -> None:
+        """Apply the results of `pending_statement` and advance the watermark."""
+        self.apply_pairs((row[0], row[1]) for row in rows)
+        changed = [row[2] for row in rows if row[2] is not None]
+        if changed:
+            latest = max(changed)
+            if self.completed_watermark is None or latest > self.completed_watermark:
+                self.completed_watermark = latest
+        self._update_neighbors()
+
+    async def refresh(self, db: AsyncSession, force: bool = False) -> None:
+        """Apply pairs recorded since the last refresh."""
+        if not force and time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        async with self._lock:
+            if not force and time.monotonic() - self._checked_at < self.refresh_interval:
+                return
+            rows = (await db.execute(self.pending_statement())).all()
+            if len(rows) > THREAD_APPLY_ROWS:
+                await asyncio.to_thread(self.apply_rows, rows)
+            else:
+                self.apply_rows(rows)
+            self._checked_at = time.monotonic()
+
+    # Persistence
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.path
+        self.compact()
+        users = np.fromiter(self._user_items.keys(), dtype=np.int64, count=len(self._user_items))
+        user_indptr = np.zeros(len(users) + 1, dtype=np.int64)
+        user_indptr[1:] = np.cumsum([len(items) for items in self._user_items.values()])
+        user_items = np.fromiter(
+            (item for items in self._user_items.values() for item in items), dtype=np.int32, count=int(user_indptr[-1])
+        )
+        # A temp file of our own, so workers saving at once never interleave
+        tmp = tempfile.NamedTemporaryFile(
+            dir=os.path.dirname(os.path.abspath(path)), prefix=f"{os.path.basename(path)}.", suffix=".tmp", delete=False
+        )
+        try:
+            with tmp:
+                np.savez_compressed(
+                    tmp,
+                    item_ids=np.asarray(self._item_ids, dtype=np.int64),
+                    item_counts=np.asarray(self._item_counts, dtype=np.int32),
+                    indptr=self._indptr,
+                    indices=self._indices,
+                    data=self._data,
+                    users=users,
+                    user_indptr=user_indptr,
+                    user_items=user_items,
+                    format=np.array(INDEX_FORMAT),
+                    completed_watermark=np.array(
+                        self.completed_watermark.isoformat() if self.completed_watermark else ""
+                    ),
+                )
+            os.replace(tmp.name, path)
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+
+    def load(self, path: Optional[str] = None) -> bool:
+        """Load a saved index; returns False when there is no usable file to load."""
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return False
+        with np.load(path) as saved:
+            if "format" not in saved or int(saved["format"]) != INDEX_FORMAT:
+                logger.info("Ignoring item similarity index in an older format: %s", path)
+                return False
+            self._reset()
+            self._item_ids = saved["item_ids"].tolist()
+            self._positions = {content_id: i for i, content_id in enumerate(self._item_ids)}
+            self._item_counts = saved["item_counts"].tolist()
+            self._indptr, self._indices, self._data = saved["indptr"], saved["indices"], saved["data"]
+            user_indptr, user_items = saved["user_indptr"], saved["user_items"]
+            for i, user_id in enumerate(saved["users"].tolist()):
+                self._user_items[user_id] = set(user_items[user_indptr[i]:user_indptr[i + 1]].tolist())
+            watermark = str(saved["completed_watermark"])
+            self.completed_watermark = datetime.fromisoformat(watermark) if watermark else None
+        self.pairs = int(user_indptr[-1])
+        self._dirty = set(range(len(self._item_ids)))
+        self._update_neighbors()
+        return True
+
+    async def restore(self) -> bool:
+        """`load` off the event loop, before any refresh applies new pairs."""
+        async with self._lock:
+            return await asyncio.to_thread(self.load)
+
+    def stats(self) -> dict:
+        return {
+            "items": len(self._item_ids),
+            "users": len(self._user_items),
+            "pairs": self.pairs,
+            "nonzeros": int(len(self._data)),
+            "delta_entries": self._delta_size,
+            "completed_watermark": self.completed_watermark.isoformat() if self.completed_watermark else None,
+        }
+
+item_similarity = ItemSimilarityIndex(
+    top_k=settings.SIMILARITY_TOP_K,
+    refresh_interval=settings.SIMILARITY_REFRESH_SECONDS,
+    path=settings.SIMILARITY_INDEX_PATH,
+)
+
+metrics.register("item_similarity", item_similarity.stats)
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Backfill script for IAEF format-usage counters
+Rebuilds content_format_counts and user_format_counts from content_interactions
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.database import engine, Base, SessionLocal
+from app.services.format_counts import backfill_format_counts
+
+def main():
+    """Main backfill function"""
+    print("Backfilling format-usage counters...")
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        backfill_format_counts(db)
+        print("✅ Format-usage counters rebuilt from content_interactions")
+    except Exception as e:
+        print(f"❌ Error during backfill: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the IAEF API
+Fires batches of concurrent requests at a running server and reports
+throughput and latency for each in-flight level
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+DEFAULT_PATHS = [
+    "/api/v1/content/",
+    "/api/v1/content/1/adaptive",
+    "/api/v1/analytics/dashboard/overview",
+    "/api/v1/content/recommendations/personalized",
+]
+
+async def login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    """Log in one of the sample users and return a bearer token"""
+    response = await client.post("/api/v1/users/login", params={"email": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+async def run_level(client: httpx.AsyncClient, paths, headers, concurrency: int, total: int):
+    """Issue `total` requests keeping `concurrency` of them in flight"""
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(paths[i % len(paths)], headers=headers)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": p99 * 1000,
+    }
+
+async def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", default="alex@example.com")
+    parser.add_argument("--password", default="password123")
+    parser.add_argument("--levels", default="1,4,16,64", help="Comma separated in-flight request counts")
+    parser.add_argument("--requests", type=int, default=400, help="Requests per level")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=max(int(level) for level in args.levels.split(",")))
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        token = await login(client, args.email, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        print(f"{'in-flight':>10} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8}")
+        for level in args.levels.split(","):
+            result = await run_level(client, DEFAULT_PATHS, headers, int(level), args.requests)
+            print(
+                f"{result['concurrency']:>10} {result['throughput_rps']:>10.1f} "
+                f"{result['p50_ms']:>10.1f} {result['p99_ms']:>10.1f} {result['errors']:>8}"
+            )
+
+if __name__ == "__main__":
+    asyncio.run(main())
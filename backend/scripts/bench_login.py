@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Login storm benchmark for the IAEF API
+Fires concurrent logins at a running server while probing /health, and
+reports login throughput and latency next to the probe latency, which
+stays low as long as password hashing is kept off the event loop
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+async def run_level(client: httpx.AsyncClient, email: str, password: str, concurrency: int, total: int):
+    """Issue `total` logins keeping `concurrency` in flight, probing /health meanwhile"""
+    latencies, probes = [], []
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    done = asyncio.Event()
+
+    async def login():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/api/v1/users/login", params={"email": email, "password": password})
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    async def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            await client.get("/health")
+            probes.append(time.perf_counter() - started)
+            await asyncio.sleep(0.01)
+
+    prober = asyncio.create_task(probe())
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await prober
+
+    return {
+        "concurrency": concurrency,
+        "logins_per_s": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "probe_p50_ms": statistics.median(probes) * 1000 if probes else 0.0,
+        "probe_p99_ms": percentile(probes, 0.99) * 1000,
+        "statuses": statuses,
+    }
+
+async def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", default="alex@example.com")
+    parser.add_argument("--password", default="password123")
+    parser.add_argument("--levels", default="1,8,32,128", help="Comma separated in-flight login counts")
+    parser.add_argument("--requests", type=int, default=200, help="Logins per level")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=max(int(level) for level in args.levels.split(",")) + 1)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        print(f"{'in-flight':>10} {'logins/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'probe p50':>10} {'probe p99':>10}  statuses")
+        for level in args.levels.split(","):
+            result = await run_level(client, args.email, args.password, int(level), args.requests)
+            print(
+                f"{result['concurrency']:>10} {result['logins_per_s']:>10.1f} {result['p50_ms']:>10.1f} "
+                f"{result['p99_ms']:>10.1f} {result['probe_p50_ms']:>10.1f} {result['probe_p99_ms']:>10.1f}  "
+                f"{result['statuses']}"
+            )
+
+if __name__ == "__main__":
+    asyncio.run(main())
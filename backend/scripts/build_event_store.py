@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Feed script for the IAEF columnar event store
+Appends content interactions newer than the store's watermark; --full
+deletes the store first and rebuilds it from the whole table
+"""
+
+import sys
+import os
+import shutil
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.database import async_engine
+from app.services.columnar import event_store
+
+async def run():
+    try:
+        await event_store.refresh(force=True)
+    finally:
+        await async_engine.dispose()
+
+def main():
+    """Main feed function"""
+    if "--full" in sys.argv and os.path.exists(event_store.path):
+        print(f"Removing {event_store.path}...")
+        shutil.rmtree(event_store.path)
+    print("Feeding the columnar event store...")
+    asyncio.run(run())
+    stats = event_store.stats()
+    if stats["failed"]:
+        print("❌ Feed failed; see the log above")
+    else:
+        print(f"✅ Appended {stats['fed']} interactions ({stats['rows']} rows in {stats['partitions']} day partitions)")
+
+if __name__ == "__main__":
+    main()
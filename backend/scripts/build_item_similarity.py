@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Builder script for the IAEF item-item similarity matrix
+Applies progress completions newer than the saved
+matrix (or all of them with --full) and writes it back to disk
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.database import SessionLocal
+from app.core.config import settings
+from app.services.similarity import item_similarity
+
+def main():
+    """Main build function"""
+    full = "--full" in sys.argv[1:]
+    if not full and item_similarity.load():
+        print(f"Updating item similarity matrix from {settings.SIMILARITY_INDEX_PATH}...")
+    else:
+        print("Building item similarity matrix from scratch...")
+    db = SessionLocal()
+    try:
+        item_similarity.apply_rows(db.execute(item_similarity.pending_statement()).all())
+        item_similarity.save()
+        stats = item_similarity.stats()
+        print(f"✅ {stats['items']} items, {stats['users']} learners, {stats['nonzeros']} co-occurrences saved")
+    except Exception as e:
+        print(f"❌ Error during build: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Retention script for IAEF raw interaction history
+Compacts content_interactions older than the retention horizon into
+interaction_monthly_summaries and deletes the raw rows
+
+Usage: python scripts/compact_interactions.py [--horizon-days N]
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.database import engine, Base, async_engine
+from app.core.config import settings
+from app.services.retention import InteractionRetention, retention_cutoff
+
+async def run(retention: InteractionRetention) -> int:
+    try:
+        return await retention.run()
+    finally:
+        await async_engine.dispose()
+
+def main():
+    """Main retention function"""
+    parser = argparse.ArgumentParser(description="Compact old IAEF interactions into monthly summaries")
+    parser.add_argument("--horizon-days", type=int, default=settings.INTERACTION_RETENTION_DAYS,
+                        help="keep raw interactions this many days (default: INTERACTION_RETENTION_DAYS)")
+    args = parser.parse_args()
+    if args.horizon_days <= 0:
+        print("⚠️ Retention is disabled; pass --horizon-days or set INTERACTION_RETENTION_DAYS")
+        return
+
+    Base.metadata.create_all(bind=engine)
+    print(f"Compacting interactions before {retention_cutoff(args.horizon_days):%Y-%m-%d}...")
+    retention = InteractionRetention(horizon_days=args.horizon_days, interval=0)
+    removed = asyncio.run(run(retention))
+    if retention.failed:
+        print("❌ Retention failed; see the log above")
+    else:
+        print(f"✅ Compacted {removed} interactions into monthly summaries")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Compaction script for IAEF daily activity rollups
+Folds progress records and content interactions that are newer than the
+rollup watermarks into user_daily_activity and content_daily_activity
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.database import engine, Base, AsyncSessionLocal, async_engine
+from app.services.rollups import compact_rollups, RollupConflict
+
+async def run():
+    try:
+        async with AsyncSessionLocal() as db:
+            return await compact_rollups(db)
+    finally:
+        await async_engine.dispose()
+
+def main():
+    """Main compaction function"""
+    print("Compacting daily activity rollups...")
+    Base.metadata.create_all(bind=engine)
+    try:
+        folded = asyncio.run(run())
+        print(f"✅ Folded {folded} rows into the daily rollups")
+    except RollupConflict:
+        print("⚠️ Another process advanced the rollups first; nothing folded")
+    except Exception as e:
+        print(f"❌ Error during compaction: {e}")
+
+if __name__ == "__main__":
+    main()
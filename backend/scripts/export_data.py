@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Export script for IAEF research data
+Streams content_interactions or progress_records to CSV or NDJSON
+(optionally gzipped) without loading the tables into memory
+
+Usage: python scripts/export_data.py interactions --format csv --gzip -o interactions.csv.gz
+"""
+
+import sys
+import os
+import argparse
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.database import SessionLocal
+from app.services.export import DATASETS, EXPORT_FORMATS, write_export
+
+def main():
+    """Main export function"""
+    parser = argparse.ArgumentParser(description="Export IAEF interactions or progress records")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output")
+    parser.add_argument("--user-id", type=int, help="only this user's rows")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="rows at or after this ISO time")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="rows before this ISO time")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args()
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    db = SessionLocal()
+    try:
+        count = write_export(db, out, args.dataset, args.format, args.gzip, args.user_id, args.since, args.until)
+        print(f"✅ Exported {count} {args.dataset} rows", file=sys.stderr)
+    except Exception as e:
+        print(f"❌ Error during export: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        db.close()
+        if args.output:
+            out.close()
+
+if __name__ == "__main__":
+    main()
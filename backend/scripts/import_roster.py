@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Roster import script for IAEF
+Creates accounts from a CSV (email,username,password) or NDJSON roster, or
+with --answers scores a file of paper assessment answer sheets
+
+Usage: python scripts/import_roster.py roster.csv
+       python scripts/import_roster.py answers.csv --answers
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.database import engine, Base, AsyncSessionLocal, async_engine
+from app.models import ensure_version_columns
+from app.core.streaming import iter_request_records
+from app.services.roster import import_roster, import_answer_sheets
+
+CHUNK_BYTES = 64 * 1024
+
+async def read_chunks(path: str):
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_BYTES):
+            yield chunk
+
+async def run(path: str, answers: bool) -> dict:
+    content_type = "text/csv" if path.lower().endswith(".csv") else "application/x-ndjson"
+    records = iter_request_records(content_type, read_chunks(path))
+    try:
+        async with AsyncSessionLocal() as db:
+            if answers:
+                return await import_answer_sheets(db, records)
+            return await import_roster(db, records)
+    finally:
+        await async_engine.dispose()
+
+def main():
+    """Main import function"""
+    parser = argparse.ArgumentParser(description="Import an IAEF roster or assessment answer sheets")
+    parser.add_argument("path", help="CSV or NDJSON file")
+    parser.add_argument("--answers", action="store_true", help="the file holds answer sheets, not accounts")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    ensure_version_columns(engine)
+    try:
+        result = asyncio.run(run(args.path, args.answers))
+    except Exception as e:
+        print(f"❌ Error during import: {e}")
+        sys.exit(1)
+    kind = "answer sheets" if args.answers else "accounts"
+    print(f"✅ Imported {result['accepted']} {kind}, rejected {result['rejected']}")
+    for error in result["errors"][:20]:
+        print(f"  line {error['line']}: {error['error']}")
+    if result["rejected"] > 20:
+        print(f"  ... and {result['rejected'] - 20} more")
+
+if __name__ == "__main__":
+    main()
@@ -10,9 +10,11 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from sqlalchemy.orm import sessionmaker
 from app.database import engine, Base
-from app.models import User, AssessmentQuestion, Content
+from app.models import User, AssessmentQuestion, Content, ensure_version_columns
 from app.core.config import settings
-import hashlib
+from app.services.assessment import seed_assessment_questions
+from app.services.progress import ensure_progress_unique_index
+from app.core.passwords import get_password_hash
 
 # Create tables
 Base.metadata.create_all(bind=engine)
@@ -21,10 +23,6 @@ Base.metadata.create_all(bind=engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 db = SessionLocal()
 
-# Simple password hashing for demo
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
-
 def create_sample_users():
     """Create sample users for testing"""
     print("Creating sample users...")
@@ -65,7 +63,7 @@ def create_sample_users():
         user = User(
             email=user_data["email"],
             username=user_data["username"],
-            hashed_password=hash_password(user_data["password"]),
+            hashed_password=get_password_hash(user_data["password"]),
             learning_style=user_data["learning_style"],
             assessment_completed=user_data["assessment_completed"],
             assessment_score=user_data["assessment_score"]
@@ -195,8 +193,11 @@ def main():
     print(f"Database URL: {settings.DATABASE_URL}")
     
     try:
+        ensure_version_columns(engine)
+        ensure_progress_unique_index(engine)
         create_sample_users()
         create_sample_content()
+        seed_assessment_questions(engine)
         print("\n✅ Database initialization completed successfully!")
         print("\nSample users created:")
         print("- alex@example.com / alex_student (Visual Learner)")
@@ -0,0 +1,89 @@
+"""
+Statement counts for the analytics endpoints
+
+The analytics routes answer from combined conditional aggregates, one scan
+of `progress_records` / `content_interactions` per request. These tests
+count the statements a warm request executes so a regression back to one
+query per figure fails here.
+"""
+
+import os
+import tempfile
+from datetime import timedelta
+
+_db_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'query_counts.db')}"
+# Keep the background rollup compaction from running during the measured requests
+os.environ["ROLLUP_COMPACT_INTERVAL_SECONDS"] = "3600"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.main import app
+from app.database import SessionLocal, async_engine
+from app.models import User, Content, ProgressRecord, ContentInteraction
+from app.services.response_cache import response_cache
+from app.services.sessions import create_access_token
+
+class StatementCounter:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+@pytest.fixture(scope="module")
+def client():
+    with SessionLocal() as db:
+        user = User(email="counts@example.com", username="counts", hashed_password="x", learning_style="visual")
+        content = Content(title="Counts", content_type="video", subject="Testing", difficulty_level="beginner")
+        db.add_all([user, content])
+        db.flush()
+        db.add(ProgressRecord(user_id=user.id, content_id=content.id, completion_percentage=100,
+                              time_spent_minutes=12, is_completed=True, quiz_score=80, engagement_score=0.5))
+        db.add(ContentInteraction(user_id=user.id, content_id=content.id, interaction_type="view", format_used="video"))
+        db.commit()
+        user_id, content_id = user.id, content.id
+    token = create_access_token({"sub": "counts@example.com"}, expires_delta=timedelta(minutes=5))
+    test_client = TestClient(app)
+    test_client.headers["Authorization"] = f"Bearer {token}"
+    test_client.ids = (user_id, content_id)
+    yield test_client
+    test_client.close()
+
+def count_statements(client, path):
+    # Warm up lazily loaded indexes and the principal cache, then measure
+    assert client.get(path).status_code == 200
+    response_cache.clear()
+    counter = StatementCounter()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", counter)
+    try:
+        assert client.get(path).status_code == 200
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", counter)
+    return counter.statements
+
+def scans(statements, table):
+    return sum(f"FROM {table}" in statement for statement in statements)
+
+def test_user_analytics_statements(client):
+    user_id, _ = client.ids
+    statements = count_statements(client, f"/api/v1/analytics/user/{user_id}")
+    # User, progress totals, format counters, daily rollups
+    assert len(statements) == 4, statements
+    assert scans(statements, "progress_records") == 1
+
+def test_content_analytics_statements(client):
+    _, content_id = client.ids
+    statements = count_statements(client, f"/api/v1/analytics/content/{content_id}")
+    # Content, interactions, archived summaries, progress, sketches
+    assert len(statements) == 5, statements
+    assert scans(statements, "progress_records") == 1
+    assert scans(statements, "content_interactions") == 1
+
+def test_dashboard_overview_statements(client):
+    statements = count_statements(client, "/api/v1/analytics/dashboard/overview")
+    # Progress totals, daily rollups, format counters
+    assert len(statements) == 3, statements
+    assert scans(statements, "progress_records") == 1
@@ -0,0 +1,46 @@
+"""
+Sign-in responses
+
+Login and refresh return the signed-in user alongside the tokens; only the
+public profile fields may be serialized.
+"""
+
+import os
+import tempfile
+
+_db_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'sessions.db')}"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+@pytest.fixture(scope="module")
+def client():
+    test_client = TestClient(app)
+    response = test_client.post("/api/v1/users/register", json={
+        "email": "sessions@example.com", "username": "sessions", "password": "password123"
+    })
+    assert response.status_code == 200, response.text
+    yield test_client
+    test_client.close()
+
+def assert_public_user(body):
+    assert set(body) == {"access_token", "refresh_token", "token_type", "user"}
+    assert body["user"]["email"] == "sessions@example.com"
+    assert "hashed_password" not in body["user"]
+    assert "version" not in body["user"]
+
+def test_login_hides_password_hash(client):
+    response = client.post("/api/v1/users/login", params={"email": "sessions@example.com", "password": "password123"})
+    assert response.status_code == 200, response.text
+    assert_public_user(response.json())
+
+def test_refresh_hides_password_hash(client):
+    tokens = client.post("/api/v1/users/login", params={
+        "email": "sessions@example.com", "password": "password123"
+    }).json()
+    response = client.post("/api/v1/users/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200, response.text
+    assert_public_user(response.json())